@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Audio2Score command line
+
+    python3 audio2score.py batch INPUT [INPUT ...] -o OUTPUT_DIR [-j WORKERS] [-f FORMAT ...]
+                                 [--grid DIVISOR ...] [--tolerance QUARTERS] [--modulations]
+                                 [--engine BACKEND] [--runtime RUNTIME] [--threads N]
+                                 [--inter-op-threads N] [--pack-files N]
+
+INPUT can be a directory (searched recursively), a glob pattern or a file.
+Without a subcommand the GUI is started. The conversion diagnostics
+(stage timings, tempo, key...) are printed for the GUI's single job; in
+batch mode, where every worker would print them, only warnings are shown
+and the timings go to the manifest.
+"""
+
+import argparse
+import json
+import logging
+import sys
+
+from exporters import DEFAULT_FORMATS, EXPORT_FORMATS
+from instrument_recognition import AUTO_INSTRUMENT
+from quantize import DEFAULT_DIVISORS
+from backends import DEFAULT_BACKEND, available_backends
+from pipeline import SUPPORTED_INSTRUMENTS
+from transcription import RUNTIMES
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="audio2score", description="Audio2Score")
+    subparsers = parser.add_subparsers(dest="command")
+
+    batch = subparsers.add_parser("batch", help="transcribe many files without the GUI")
+    batch.add_argument("inputs", nargs="+", help="directories, glob patterns or audio files")
+    batch.add_argument("-o", "--output-dir", required=True, help="where scores and the manifest are written")
+    batch.add_argument("-j", "--workers", type=int, default=None,
+                       help="worker processes (default: one per CPU core)")
+    batch.add_argument("-i", "--instrument", default="Pianoforte",
+                       choices=[AUTO_INSTRUMENT] + list(SUPPORTED_INSTRUMENTS),
+                       help=f"instrument of every file, or {AUTO_INSTRUMENT} to recognize it per file")
+    batch.add_argument("--manifest", default=None,
+                       help="JSON lines manifest (default: OUTPUT_DIR/manifest.jsonl)")
+    batch.add_argument("--cache-dir", default=None,
+                       help="reuse transcriptions cached in this directory")
+    batch.add_argument("-f", "--formats", nargs="+", default=list(DEFAULT_FORMATS),
+                       choices=list(EXPORT_FORMATS), help="export formats (default: midi musicxml pdf png)")
+    batch.add_argument("--grid", nargs="+", type=int, default=list(DEFAULT_DIVISORS), metavar="DIVISOR",
+                       help="quantization grid, as subdivisions of a quarter note (default: 4 3)")
+    batch.add_argument("--tolerance", type=float, default=None, metavar="QUARTERS",
+                       help="snap to the first grid whose nearest point is this close "
+                            "(default: nearest point of any grid)")
+    batch.add_argument("--modulations", action="store_true",
+                       help="follow key changes instead of one key for the whole piece")
+    batch.add_argument("--engine", default=DEFAULT_BACKEND, choices=list(available_backends()),
+                       help="transcription backend; monophonic is several times faster "
+                            "on single-line violin and cello recordings, spectral-peaks "
+                            "is a deterministic stand-in without TensorFlow")
+    batch.add_argument("--runtime", default=None, choices=list(RUNTIMES),
+                       help="basic-pitch inference runtime (default: TensorFlow when installed)")
+    batch.add_argument("--threads", type=int, default=None, metavar="N",
+                       help="intra-op threads per worker (default: CPU cores / workers)")
+    batch.add_argument("--inter-op-threads", type=int, default=None, metavar="N",
+                       help="inter-op threads per worker (default: 1)")
+    batch.add_argument("--pack-files", type=int, default=1, metavar="N",
+                       help="transcribe N files per model batch; faster on many short clips")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    if args.command == "batch":
+        from batch import run_batch
+
+        logging.basicConfig(level=logging.WARNING, format="%(levelname)s: %(message)s")
+
+        summary = run_batch(args.inputs, args.output_dir,
+                            instrument_name=args.instrument,
+                            workers=args.workers,
+                            manifest_path=args.manifest,
+                            cache_dir=args.cache_dir,
+                            formats=args.formats,
+                            quantization_params={'quarter_length_divisors': tuple(args.grid),
+                                                 'tolerance': args.tolerance},
+                            track_modulations=args.modulations,
+                            engine=args.engine,
+                            runtime=args.runtime,
+                            threads=args.threads,
+                            inter_op_threads=args.inter_op_threads,
+                            pack_files=args.pack_files)
+        print(json.dumps(summary))
+        return 1 if summary['error'] else 0
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    import tkinter as tk
+    from trascrizione_gui import Audio2ScoreApp
+
+    root = tk.Tk()
+    Audio2ScoreApp(root)
+    root.mainloop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
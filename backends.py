@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+"""
+Transcription backends, chosen per job by name
+
+A backend takes a decoded mono buffer and returns note events
+(start_s, end_s, pitch_midi, amplitude, pitch_bends). The built-in ones:
+
+  basic-pitch     the polyphonic neural model (transcription.ModelSession)
+  monophonic      YIN pitch tracker for single-line instruments (monophonic.py)
+  spectral-peaks  deterministic NumPy stand-in without TensorFlow
+                  (spectral_peaks.py), for tests and benchmarks; audio
+                  is still decoded (and beats tracked) with librosa
+
+The registry only stores factories: a backend's module (and TensorFlow,
+for basic-pitch) is imported the first time that backend is selected.
+get_backend keeps one instance per name and process, like
+transcription.get_session, so a model stays warm between jobs.
+"""
+
+import os
+import time
+
+# Backend used when a job does not name one
+DEFAULT_BACKEND = os.environ.get("AUDIO2SCORE_BACKEND", "basic-pitch")
+
+
+class TranscriptionBackend:
+    """
+    Interface of a transcription backend (transcription.ModelSession is one).
+
+    Subclasses set `name` and `sample_rate` (the rate they analyse audio
+    at: jobs decode files straight to it, so nothing is resampled twice)
+    and implement transcribe_notes; decoding parameters a backend does not
+    use (e.g. basic-pitch's onset_threshold) are accepted and ignored, so
+    every backend can run with the same job settings. The base class times
+    the runs for latency_report.
+    """
+
+    name = None
+    version_number = 1
+    sample_rate = 22050
+    # Whether transcribe() returns activations that decode() turns into
+    # notes again: only then can thresholds be tuned without a new run
+    has_activations = False
+
+    def __init__(self):
+        self.run_times = []
+
+    loaded = True
+
+    @property
+    def version(self):
+        """Identifies the engine that produced a transcription (used in cache keys)"""
+        return f"{self.name} {self.version_number}"
+
+    def get_model(self, timings=None):
+        """Load whatever the backend needs before the first job (nothing by default)"""
+        return None
+
+    def transcribe_notes(self, y, sr, timings=None, cancel_event=None, **params):
+        """Note events of a mono buffer"""
+        raise NotImplementedError
+
+    def notes(self, y, sr, timings=None, cancel_event=None, **params):
+        """Note events of a mono buffer, timed for latency_report"""
+        start = time.perf_counter()
+        note_events = self.transcribe_notes(y, sr, timings=timings, cancel_event=cancel_event, **params)
+        self.run_times.append(time.perf_counter() - start)
+        return note_events
+
+    def transcribe(self, y, sr, timings=None, cancel_event=None, **params):
+        """
+        (activations, midi_data, note_events) like ModelSession.transcribe;
+        backends without activations or MIDI return None for them.
+        """
+        return None, None, self.notes(y, sr, timings=timings, cancel_event=cancel_event, **params)
+
+    def decode(self, activations, timings=None, **params):
+        """
+        Note events from the activations returned by transcribe(), without
+        running the model again; None for backends without activations.
+        """
+        return None
+
+    def transcribe_many(self, buffers, timings=None, cancel_event=None, **params):
+        """
+        transcribe() of several (y, sr) buffers, as a list. Backends that
+        gain from seeing them together (basic-pitch) override this.
+        """
+        return [self.transcribe(y, sr, timings=timings, cancel_event=cancel_event, **params)
+                for y, sr in buffers]
+
+    def transcribe_stream(self, audio_path, timings=None, **params):
+        """Same as transcription.transcribe_stream, with this backend on every chunk"""
+        from transcription import transcribe_stream
+        return transcribe_stream(audio_path, sr=self.sample_rate, timings=timings,
+                                 transcribe_chunk=self.transcribe, **params)
+
+    def latency_report(self):
+        runs = self.run_times
+        return {
+            'model_load': None,
+            'first_run': runs[0] if runs else None,
+            'warm_runs': max(len(runs) - 1, 0),
+            'warm_run_mean': sum(runs[1:]) / (len(runs) - 1) if len(runs) > 1 else None,
+        }
+
+    def release(self):
+        self.run_times = []
+
+
+_factories = {}
+_instances = {}
+
+
+def register_backend(name, factory):
+    """
+    Make a backend selectable by `name`. `factory` is called without
+    arguments the first time the backend is requested; import heavy
+    modules inside it, not at registration.
+    """
+    _factories[name] = factory
+    _instances.pop(name, None)
+
+
+def available_backends():
+    """Names of the registered backends, in registration order"""
+    return tuple(_factories)
+
+
+def get_backend(name=None):
+    """The per-process instance of a backend (DEFAULT_BACKEND if name is None)"""
+    name = name or DEFAULT_BACKEND
+    if name not in _instances:
+        try:
+            factory = _factories[name]
+        except KeyError:
+            raise ValueError(f"Unknown transcription backend {name!r}, "
+                             f"expected one of {available_backends()}") from None
+        _instances[name] = factory()
+    return _instances[name]
+
+
+def _basic_pitch():
+    from transcription import get_session
+    return get_session()
+
+
+def _monophonic():
+    from monophonic import get_monophonic_session
+    return get_monophonic_session()
+
+
+def _spectral_peaks():
+    from spectral_peaks import SpectralPeakBackend
+    return SpectralPeakBackend()
+
+
+register_backend("basic-pitch", _basic_pitch)
+register_backend("monophonic", _monophonic)
+register_backend("spectral-peaks", _spectral_peaks)
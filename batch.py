@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Headless batch transcription over whole directories
+
+Input files are spread over a process pool. Every worker keeps one warm
+transcription backend (backends.get_backend, the basic-pitch model by
+default) for all the files it processes. With pack_files > 1, a worker
+takes several short files at a time and runs their model windows
+through the network together (convert_group). One JSON line per file is
+appended to a manifest as results come in; files already converted
+successfully (same size and mtime, outputs still on disk) are skipped
+when the batch is run again.
+"""
+
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+AUDIO_EXTENSIONS = ('.mp3', '.wav', '.flac', '.ogg', '.m4a', '.aiff', '.aif')
+
+MANIFEST_NAME = "manifest.jsonl"
+
+# Per-worker transcription cache, created on the first job
+_worker_cache = None
+
+
+def collect_inputs(patterns):
+    """
+    Expand directories (recursively) and glob patterns into audio files.
+
+    Returns a sorted list of absolute paths, without duplicates.
+    """
+    found = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            for root, _, files in os.walk(pattern):
+                for name in files:
+                    if name.lower().endswith(AUDIO_EXTENSIONS):
+                        found.add(os.path.abspath(os.path.join(root, name)))
+        else:
+            for path in glob.glob(pattern, recursive=True):
+                if os.path.isfile(path) and path.lower().endswith(AUDIO_EXTENSIONS):
+                    found.add(os.path.abspath(path))
+    return sorted(found)
+
+
+def output_base_for(audio_path, output_dir):
+    """Output path (without extension) for an input file, unique per input path"""
+    stem = os.path.splitext(os.path.basename(audio_path))[0]
+    digest = hashlib.sha1(audio_path.encode('utf-8')).hexdigest()[:8]
+    return os.path.join(output_dir, f"{stem}-{digest}")
+
+
+def file_signature(audio_path):
+    stat = os.stat(audio_path)
+    return {'size': stat.st_size, 'mtime': stat.st_mtime}
+
+
+def error_record(audio_path, instrument_name, error):
+    """Manifest record of a file that could not be converted at all"""
+    try:
+        source = file_signature(audio_path)
+    except OSError:
+        source = None  # gone since it was collected
+    return {
+        'input': audio_path,
+        'source': source,
+        'instrument': instrument_name,
+        'status': 'error',
+        'error': error,
+        'outputs': {},
+        'seconds': 0.0,
+        'timings': {},
+    }
+
+
+def load_finished(manifest_path):
+    """Inputs recorded as converted in the manifest, whose outputs still exist"""
+    finished = {}
+    if not os.path.exists(manifest_path):
+        return finished
+    with open(manifest_path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # partial line from an interrupted run
+            if record.get('status') != 'ok':
+                continue
+            outputs = [p for p in record.get('outputs', {}).values() if p]
+            if all(os.path.exists(p) for p in outputs):
+                finished[record['input']] = record.get('source')
+    return finished
+
+
+def _init_worker(engine=None, runtime=None, intra_op_threads=None, inter_op_threads=None):
+    """Load this worker's model once, before its first job"""
+    from backends import get_backend
+    backend = get_backend(engine)
+    if backend.name == "basic-pitch":
+        from transcription import configure_session
+        configure_session(runtime, intra_op_threads, inter_op_threads)
+    backend.get_model()
+
+
+def _get_worker_cache(cache_dir):
+    global _worker_cache
+    if cache_dir is not None and _worker_cache is None:
+        from cache import TranscriptionCache
+        _worker_cache = TranscriptionCache(cache_dir)
+    return _worker_cache if cache_dir is not None else None
+
+
+def convert_one(audio_path, output_base, instrument_name, cache_dir=None, formats=None,
+                quantization_params=None, track_modulations=False, engine=None, prepared=None,
+                timings=None):
+    """
+    Worker entry point: convert one file and return its manifest record.
+    `prepared` is passed to pipeline.audio_to_score, and `timings` holds
+    the stages already run for it (convert_group). The record's 'cache'
+    is 'hit' (notes cached), 'activations' (notes decoded again from the
+    cached model activations) or 'miss'. `formats` None means
+    every default format; an empty tuple (no requested format can be
+    written here) records an error without converting anything.
+    """
+    if formats is not None and not formats:
+        return error_record(audio_path, instrument_name,
+                            "no export format available: the requested renderers are not installed")
+
+    from exporters import DEFAULT_FORMATS
+    from backends import get_backend
+    from pipeline import audio_to_score
+
+    cache = _get_worker_cache(cache_dir)
+    hits_before = cache.hits if cache is not None else 0
+
+    record = {
+        'input': audio_path,
+        'source': None,
+        'instrument': instrument_name,
+        'engine': engine,
+        'worker': os.getpid(),
+    }
+    timings = dict(timings or {})
+    analysis = {}
+    start = time.perf_counter()
+    try:
+        # Inside the try: a file deleted since it was collected, or a
+        # backend that fails to load, is an error record like any other
+        record['source'] = file_signature(audio_path)
+        record['engine'] = get_backend(engine).name
+        outputs = audio_to_score(
+            audio_path, instrument_name,
+            session=get_backend(engine),
+            output_base=output_base,
+            title=os.path.splitext(os.path.basename(audio_path))[0],
+            timings=timings,
+            cache=cache,
+            formats=DEFAULT_FORMATS if formats is None else formats,
+            quantization_params=quantization_params,
+            track_modulations=track_modulations,
+            analysis=analysis,
+            prepared=prepared,
+        )
+        record['status'] = 'ok'
+        record.update(analysis)
+        record['outputs'] = outputs
+    except Exception as e:
+        record['status'] = 'error'
+        record['error'] = f"{type(e).__name__}: {e}"
+    if cache is not None:
+        if cache.hits > hits_before:
+            record['cache'] = 'hit'
+        elif prepared is None and 'note_decoding' in timings and 'inference' not in timings:
+            record['cache'] = 'activations'
+        else:
+            record['cache'] = 'miss'
+    record['seconds'] = round(time.perf_counter() - start, 3)
+    record['timings'] = {k: round(v, 3) for k, v in timings.items()}
+    return record
+
+
+def convert_group(jobs, instrument_name, cache_dir=None, formats=None,
+                  quantization_params=None, track_modulations=False, engine=None):
+    """
+    Worker entry point for several files, given as (audio_path, output_base)
+    jobs: the ones with nothing in the cache and not long enough to be
+    streamed (pipeline.STREAMING_MIN_SECONDS) are decoded and transcribed
+    together (backend.transcribe_many, which for basic-pitch packs their
+    windows into shared model batches), then every score is built and
+    exported by convert_one. Returns the manifest records, in job order.
+    Packed files get a 'packed' entry with the pack id, size and shared
+    transcription time, and their 'timings' hold their own decoding plus
+    a share of the pack's inference and note decoding, proportional to
+    their length.
+    """
+    from backends import get_backend
+    from pipeline import DEFAULT_TRANSCRIPTION_PARAMS, STREAMING_MIN_SECONDS, activations_key
+    from transcription import audio_duration, load_audio
+
+    session = get_backend(engine)
+    cache = _get_worker_cache(cache_dir)
+    params = dict(DEFAULT_TRANSCRIPTION_PARAMS)
+
+    start = time.perf_counter()
+    packed = []
+    for audio_path, _ in jobs:
+        try:
+            if cache is not None and (
+                    cache.has(cache.key(audio_path, dict(params, sample_rate=session.sample_rate),
+                                        session.version))
+                    or cache.has_activations(activations_key(cache, audio_path, session))):
+                continue  # convert_one takes the notes or the activations from the cache
+            duration = audio_duration(audio_path)
+            if duration is None or duration > STREAMING_MIN_SECONDS:
+                continue
+            own_timings = {}
+            y, sr = load_audio(audio_path, sr=session.sample_rate, timings=own_timings)
+        except Exception:
+            continue  # convert_one records the error
+        packed.append((audio_path, y, sr, own_timings))
+
+    prepared = {}
+    if packed:
+        pack_timings = {}
+        try:
+            results = session.transcribe_many([(y, sr) for _, y, sr, _ in packed],
+                                              timings=pack_timings, **params)
+        except Exception:
+            results = []  # convert_one transcribes the files one by one
+        total_samples = sum(len(y) for _, y, _, _ in packed)
+        for (audio_path, y, sr, own_timings), (activations, _, note_events) in zip(packed, results):
+            share = len(y) / total_samples
+            for stage, seconds in pack_timings.items():
+                own_timings[stage] = own_timings.get(stage, 0.0) + seconds * share
+            prepared[audio_path] = ((y, sr, activations, note_events), own_timings)
+    shared = {
+        'id': hashlib.sha1("\n".join(path for path in prepared).encode('utf-8')).hexdigest()[:12],
+        'files': len(prepared),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+    del packed
+
+    records = []
+    for audio_path, output_base in jobs:
+        ready, own_timings = prepared.pop(audio_path, (None, None))
+        record = convert_one(audio_path, output_base, instrument_name, cache_dir, formats,
+                             quantization_params, track_modulations, engine, prepared=ready,
+                             timings=own_timings)
+        if ready is not None:
+            record['packed'] = shared
+        records.append(record)
+    return records
+
+
+def run_batch(patterns, output_dir, instrument_name="Pianoforte",
+              workers=None, manifest_path=None, cache_dir=None, formats=None,
+              quantization_params=None, track_modulations=False, engine=None,
+              runtime=None, threads=None, inter_op_threads=None, pack_files=1,
+              progress=print):
+    """
+    Convert every audio file matched by `patterns` into `output_dir`.
+
+    If `cache_dir` is given, workers share a TranscriptionCache there.
+    `formats` are the export formats (default: all); those whose renderer
+    is not installed are dropped here, once, rather than in every job; if
+    none is left, every file gets an error record and nothing is converted.
+    `quantization_params` set the rhythmic grid, see
+    pipeline.DEFAULT_QUANTIZATION_PARAMS; with `track_modulations` key
+    changes are written where the key shifts. `engine` is the transcription
+    backend of every job (backends.available_backends, default
+    backends.DEFAULT_BACKEND).
+
+    `runtime` selects basic-pitch's inference runtime (transcription.RUNTIMES).
+    `threads` and `inter_op_threads` are each worker's intra-op and
+    inter-op thread counts; by default the cores are split between the
+    workers (cpu_count // workers intra-op threads, one inter-op thread)
+    so that they do not compete for the same cores. With `pack_files` > 1
+    workers take that many files per job and transcribe them together
+    (convert_group).
+    Returns a summary dict with the number of converted, failed and
+    skipped files.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    if manifest_path is None:
+        manifest_path = os.path.join(output_dir, MANIFEST_NAME)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if threads is None:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+    if inter_op_threads is None:
+        inter_op_threads = 1
+
+    from exporters import DEFAULT_FORMATS, available_formats
+    requested = tuple(formats or DEFAULT_FORMATS)
+    formats = available_formats(requested)
+    missing = [fmt for fmt in requested if fmt not in formats]
+    if missing:
+        progress(f"Formati non disponibili (renderer mancante): {', '.join(missing)}")
+
+    inputs = collect_inputs(patterns)
+    finished = load_finished(manifest_path)
+    todo = [p for p in inputs if p not in finished or finished[p] != file_signature(p)]
+    summary = {'total': len(inputs), 'skipped': len(inputs) - len(todo), 'ok': 0, 'error': 0}
+    progress(f"{len(inputs)} file trovati, {summary['skipped']} già convertiti, "
+             f"{len(todo)} da convertire con {workers} worker ({threads} thread ciascuno)")
+    if not todo:
+        return summary
+    if not formats:
+        # Nothing can be written: record why instead of loading models for nothing
+        with open(manifest_path, 'a', encoding='utf-8') as manifest:
+            for path in todo:
+                record = convert_one(path, output_base_for(path, output_dir), instrument_name,
+                                     formats=formats)
+                manifest.write(json.dumps(record) + "\n")
+                summary['error'] += 1
+        progress(f"Nessun formato di esportazione disponibile: {len(todo)} file non convertiti")
+        return summary
+
+    # spawn: workers start clean, without inheriting the parent's state
+    context = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with open(manifest_path, 'a', encoding='utf-8') as manifest, \
+            ProcessPoolExecutor(max_workers=workers, mp_context=context,
+                                initializer=_init_worker,
+                                initargs=(engine, runtime, threads, inter_op_threads)) as pool:
+        if pack_files > 1:
+            groups = [todo[i:i + pack_files] for i in range(0, len(todo), pack_files)]
+            futures = {
+                pool.submit(convert_group, [(path, output_base_for(path, output_dir)) for path in group],
+                            instrument_name, cache_dir, formats, quantization_params,
+                            track_modulations, engine): group
+                for group in groups
+            }
+        else:
+            futures = {
+                pool.submit(convert_one, path, output_base_for(path, output_dir), instrument_name,
+                            cache_dir, formats, quantization_params, track_modulations, engine): [path]
+                for path in todo
+            }
+        done = 0
+        for future in as_completed(futures):
+            try:
+                result = future.result()
+                records = result if pack_files > 1 else [result]
+            except Exception as e:
+                # A worker that died (BrokenProcessPool) or a job that raised:
+                # its files are recorded as failed, the others go on
+                records = [error_record(path, instrument_name, f"{type(e).__name__}: {e}")
+                           for path in futures[future]]
+            for record in records:
+                done += 1
+                manifest.write(json.dumps(record) + "\n")
+                manifest.flush()
+                summary[record['status']] += 1
+                progress(f"[{done}/{len(todo)}] {record['status']}: {os.path.basename(record['input'])}"
+                         f" ({record['seconds']:.1f}s)")
+
+    elapsed = time.perf_counter() - start
+    summary['seconds'] = round(elapsed, 3)
+    summary['files_per_minute'] = round(len(todo) / elapsed * 60, 2) if elapsed else None
+    return summary
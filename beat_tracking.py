@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+Tempo and beat tracking on the decoded audio buffer
+
+track_beats runs librosa's beat tracker on the same mono buffer the model
+transcribes, so the file is not decoded a second time. The pipeline
+submits it to a thread before inference starts (start_beat_tracking):
+most of the work happens in NumPy and numba code, so it overlaps with
+the model instead of adding to the conversion time.
+
+beat_grid turns the detected beats into the tempo and time origin the
+score builder converts seconds with, so that quarter notes fall on the
+detected beats instead of on the 120 BPM grid of a MIDI file. The tempo
+is the average over the whole recording; the score shows it rounded.
+
+Live performances drift, and a single tempo then puts later notes
+between the beats: odd durations, many tied notes. beat_map instead
+gives every detected beat its own quarter-note position, and the score
+builder interpolates note times between beats (score_builder.warp_seconds).
+tempo_changes writes a new metronome mark only where the smoothed local
+tempo moves and stays away from the current mark.
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from score_builder import DEFAULT_TEMPO
+
+# Fewer beats than this and the tempo estimate is not trusted
+MIN_BEATS = 4
+# Tempi outside this range are folded into it by doubling or halving
+MIN_TEMPO = 50
+MAX_TEMPO = 200
+
+TEMPO_DTYPE = np.dtype([
+    ('offset', 'f8'),   # quarter notes
+    ('bpm', 'f8'),      # quarter notes per minute
+])
+
+# Local tempo is a running median over this many beats
+TEMPO_SMOOTHING_BEATS = 8
+# A new metronome mark is written when the local tempo differs from the
+# current one by more than this fraction for TEMPO_CHANGE_MIN_BEATS beats
+TEMPO_CHANGE_RATIO = 0.06
+TEMPO_CHANGE_MIN_BEATS = 4
+
+
+def track_beats(y, sr, timings=None):
+    """
+    Tempo (BPM) and beat times (seconds) of a mono buffer.
+
+    Returns (None, empty array) when too few beats are found, e.g. in
+    very short or arhythmic recordings.
+    """
+    import librosa
+
+    start = time.perf_counter()
+    tempo, beats = librosa.beat.beat_track(y=y, sr=sr, units='time')
+    if timings is not None:
+        timings['beat_tracking'] = time.perf_counter() - start
+    tempo = float(np.atleast_1d(tempo)[0])
+    beats = np.asarray(beats, dtype=np.float64)
+    if len(beats) < MIN_BEATS or tempo <= 0:
+        return None, np.zeros(0)
+    return tempo, beats
+
+
+def start_beat_tracking(y, sr, timings=None):
+    """
+    Run track_beats on a background thread.
+
+    Returns a concurrent.futures.Future with its result; call
+    .result() once inference is done.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="beat-tracking")
+    future = executor.submit(track_beats, y, sr, timings)
+    executor.shutdown(wait=False)
+    return future
+
+
+def beat_grid(tempo, beats):
+    """
+    (bpm, origin_s) for score_builder: the average tempo of the beats and
+    the time of the last grid beat at or before the start of the
+    recording, in phase with the detected beats.
+
+    Without a tempo the MIDI default (DEFAULT_TEMPO, origin 0) is returned.
+    """
+    if tempo is None or len(beats) < 2:
+        return DEFAULT_TEMPO, 0.0
+    beats = np.asarray(beats, dtype=np.float64)
+    # Number every beat on a grid of the median period (the tracker may
+    # skip one), then fit time = origin + index * period to all of them
+    rough = float(np.median(np.diff(beats)))
+    index = np.round((beats - beats[0]) / rough)
+    period, first = np.polyfit(index, beats, 1)
+    while 60.0 / period < MIN_TEMPO:
+        period /= 2
+    while 60.0 / period > MAX_TEMPO:
+        period *= 2
+    origin = first - np.ceil(first / period) * period
+    return 60.0 / period, float(origin)
+
+
+def beat_map(tempo, beats):
+    """
+    (times, quarters) knots mapping seconds to quarter notes, one per beat,
+    for score_builder.warp_seconds; None without a tempo.
+
+    Beats the tracker skipped (an interval close to twice the median) are
+    counted, and beats outside MIN_TEMPO-MAX_TEMPO are read as eighths or
+    half notes. Offset 0 is the last beat, extrapolated at the first
+    beat's tempo, at or before the start of the recording.
+    """
+    if tempo is None or len(beats) < 2:
+        return None
+    beats = np.asarray(beats, dtype=np.float64)
+    intervals = np.diff(beats)
+    period = float(np.median(intervals))
+    index = np.r_[0.0, np.cumsum(np.maximum(np.round(intervals / period), 1.0))]
+    quarters_per_beat = 1.0
+    while 60.0 / period * quarters_per_beat < MIN_TEMPO:
+        quarters_per_beat *= 2
+    while 60.0 / period * quarters_per_beat > MAX_TEMPO:
+        quarters_per_beat /= 2
+    quarters = index * quarters_per_beat
+    # Whole beats between the start of the recording and the first beat
+    first_beat = (beats[1] - beats[0]) / (index[1] - index[0])
+    lead = np.ceil(beats[0] / first_beat - 1e-9)
+    return beats, quarters + lead * quarters_per_beat
+
+
+def tempo_changes(time_map):
+    """
+    TEMPO_DTYPE records, the first at offset 0, where the tempo of a beat
+    map really changes.
+
+    The tempo between consecutive beats is smoothed with a running median
+    of TEMPO_SMOOTHING_BEATS; a new record starts where the smoothed tempo
+    stays more than TEMPO_CHANGE_RATIO away from the current one for
+    TEMPO_CHANGE_MIN_BEATS beats, at the median tempo of those beats.
+    """
+    times, quarters = time_map
+    local = 60.0 * np.diff(quarters) / np.diff(times)
+    half = TEMPO_SMOOTHING_BEATS // 2
+    padded = np.pad(local, (half, TEMPO_SMOOTHING_BEATS - half - 1), mode='edge')
+    smoothed = np.median(np.lib.stride_tricks.sliding_window_view(padded, TEMPO_SMOOTHING_BEATS), axis=1)
+
+    changes = [(0.0, float(smoothed[0]))]
+    current = smoothed[0]
+    run_start = None
+    for i in range(len(smoothed)):
+        if abs(smoothed[i] / current - 1.0) <= TEMPO_CHANGE_RATIO:
+            run_start = None
+            continue
+        if run_start is None:
+            run_start = i
+        if i - run_start + 1 >= TEMPO_CHANGE_MIN_BEATS:
+            current = float(np.median(smoothed[run_start:i + 1]))
+            changes.append((float(quarters[run_start]), current))
+            run_start = None
+    return np.array(changes, dtype=TEMPO_DTYPE)
+
+
+def format_tempi(tempi):
+    """One-line summary, e.g. '121 BPM, 3 changes (112-128 BPM)'"""
+    if not len(tempi):
+        return "none"
+    text = f"{tempi['bpm'][0]:.0f} BPM"
+    if len(tempi) > 1:
+        text += f", {len(tempi) - 1} changes ({tempi['bpm'].min():.0f}-{tempi['bpm'].max():.0f} BPM)"
+    return text
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cross-file batched inference on many short clips
+
+A corpus of short synthetic clips (random piano-like notes and chords,
+2-5 s each, 200 by default) is written as WAV files and transcribed:
+
+  predict_and_save   basic_pitch.inference.predict_and_save, one file per
+                     call, MIDI saved (model loaded once, before timing)
+  per file           load_audio + ModelSession.transcribe, one file at a time
+  packed N           load_audio + ModelSession.transcribe_many on N files at
+                     a time: their windows share model batches
+
+Throughput is files per minute. Packed transcriptions are also checked
+against the per-file ones (same notes).
+
+Usage: python3 bench_batched_inference.py [--clips 200] [--pack 8 32]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+import warnings
+
+import numpy as np
+import soundfile as sf
+
+from transcription import BATCH_WINDOWS, MODEL_SAMPLE_RATE as SR, ModelSession, load_audio
+
+
+def make_corpus(directory, clips, seed=0):
+    """Write `clips` short WAV files and return their paths"""
+    rng = np.random.default_rng(seed)
+    paths = []
+    for i in range(clips):
+        seconds = rng.uniform(2.0, 5.0)
+        y = np.zeros(int(seconds * SR))
+        t_note = 0.0
+        while t_note < seconds - 0.3:
+            length = rng.uniform(0.2, 0.8)
+            t = np.arange(int(min(length, seconds - t_note) * SR)) / SR
+            for pitch in rng.choice(np.arange(48, 84), size=rng.integers(1, 4), replace=False):
+                f0 = 440.0 * 2 ** ((pitch - 69) / 12)
+                tone = sum(np.sin(2 * np.pi * k * f0 * t) / k ** 1.5 for k in range(1, 6))
+                start = int(t_note * SR)
+                y[start:start + len(t)] += tone * np.exp(-3 * t)
+            t_note += length
+        path = os.path.join(directory, f"clip{i:03d}.wav")
+        sf.write(path, (0.9 * y / np.abs(y).max()).astype(np.float32), SR)
+        paths.append(path)
+    return paths
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--clips', type=int, default=200)
+    parser.add_argument('--pack', type=int, nargs='+', default=[8, 32], help="files per packed call")
+    parser.add_argument('--batch-windows', type=int, default=BATCH_WINDOWS, help="model windows per batch")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from basic_pitch.inference import predict_and_save
+
+    print("\n" + "="*70)
+    print("BENCHMARK: CROSS-FILE BATCHED INFERENCE")
+    print("="*70)
+
+    session = ModelSession()
+    model = session.get_model()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = make_corpus(tmp, args.clips)
+        audio = sum(sf.info(p).duration for p in paths)
+        print(f"\n{len(paths)} clips, {audio:.0f} s of audio, {os.cpu_count()} CPU cores")
+        # Warm up the model graph on every batch size used below
+        session.transcribe_many([load_audio(p) for p in paths[:max(args.pack)]],
+                                batch_windows=args.batch_windows)
+
+        results = []
+        midi_dir = os.path.join(tmp, "midi")
+        os.makedirs(midi_dir)
+        start = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for path in paths:
+                predict_and_save([path], midi_dir, True, False, False, False, model)
+        results.append(("predict_and_save", time.perf_counter() - start))
+
+        start = time.perf_counter()
+        reference = [session.notes(*load_audio(path)) for path in paths]
+        results.append(("per file", time.perf_counter() - start))
+
+        mismatches = {}
+        for pack in args.pack:
+            start = time.perf_counter()
+            packed = []
+            for i in range(0, len(paths), pack):
+                buffers = [load_audio(path) for path in paths[i:i + pack]]
+                packed += [note_events for _, _, note_events in session.transcribe_many(
+                    buffers, batch_windows=args.batch_windows)]
+            results.append((f"packed {pack}", time.perf_counter() - start))
+            mismatches[f"packed {pack}"] = sum(a != b for a, b in zip(packed, reference))
+
+    baseline = results[0][1]
+    print(f"\n{'Mode':<20}{'Wall (s)':>10}{'Files/min':>12}{'Speedup':>10}{'Differ':>9}")
+    print("─"*61)
+    for name, seconds in results:
+        differ = mismatches.get(name, "")
+        print(f"{name:<20}{seconds:>10.1f}{len(paths) / seconds * 60:>12.0f}"
+              f"{baseline / seconds:>9.2f}x{differ:>9}")
+
+    print("\nDiffer: clips whose notes are not identical to the per-file transcription")
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Benchmark: WAV round-trip vs in-memory handoff to the transcription model
+
+Legacy path (old audio_to_score):
+  librosa.load -> sf.write(input.wav) -> predict_and_save (decodes input.wav again)
+In-memory path (transcription.py):
+  load_audio -> transcribe (decoded once at the model's native rate and
+  handed straight to the model)
+
+Both paths share one already-loaded model, so only I/O and decoding differ.
+
+Usage: python3 bench_inmemory_handoff.py [--duration SECONDS] [--repeat N]
+"""
+
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import librosa
+import soundfile as sf
+
+from transcription import format_timings, load_audio, load_model, transcribe
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')
+
+# Sample rate the old audio_to_score decoded to
+LEGACY_SAMPLE_RATE = 16000
+
+
+def legacy_path(audio_path, model, duration):
+    """Decode, write input.wav, let basic-pitch read and decode it again"""
+    from basic_pitch.inference import predict_and_save
+
+    temp_dir = tempfile.mkdtemp()
+    try:
+        start = time.perf_counter()
+        wav_path = os.path.join(temp_dir, "input.wav")
+        y, sr = librosa.load(audio_path, sr=LEGACY_SAMPLE_RATE, duration=duration)
+        sf.write(wav_path, y, sr)
+        predict_and_save(
+            [wav_path],
+            output_directory=temp_dir,
+            save_midi=True,
+            sonify_midi=False,
+            save_model_outputs=False,
+            save_notes=False,
+            model_or_model_path=model,
+        )
+        elapsed = time.perf_counter() - start
+
+        wav_bytes = os.path.getsize(wav_path)
+        return elapsed, {'decodes': 2, 'written': wav_bytes, 'read': wav_bytes}
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+
+def inmemory_path(audio_path, model, duration):
+    """Decode once, hand the buffer to the model"""
+    timings = {}
+    start = time.perf_counter()
+    y, sr = load_audio(audio_path, duration=duration, timings=timings)
+    transcribe(y, sr, model=model, timings=timings)
+    elapsed = time.perf_counter() - start
+    return elapsed, {'decodes': 1, 'written': 0, 'read': 0, 'timings': timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--audio', default=AUDIO_FILE)
+    parser.add_argument('--duration', type=float, default=None,
+                        help="only use the first N seconds of the file")
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("BENCHMARK: WAV ROUND-TRIP vs IN-MEMORY HANDOFF")
+    print("="*70 + "\n")
+    print(f"Audio: {os.path.basename(args.audio)}")
+    print(f"Duration: {args.duration or 'full file'}  Repeats: {args.repeat}")
+    print()
+
+    model = load_model()
+    # Warm-up: the first prediction traces the TF graph, keep it out of the timings
+    inmemory_path(args.audio, model, duration=1.0)
+
+    results = {}
+    for name, fn in (("legacy (WAV round-trip)", legacy_path),
+                     ("in-memory handoff", inmemory_path)):
+        times = []
+        for _ in range(args.repeat):
+            elapsed, io = fn(args.audio, model, args.duration)
+            times.append(elapsed)
+        results[name] = (min(times), io)
+
+    print(f"{'Path':<26}{'best wall (s)':>14}{'decodes':>9}{'written (B)':>14}{'read (B)':>12}")
+    print("─"*75)
+    for name, (best, io) in results.items():
+        print(f"{name:<26}{best:>14.3f}{io['decodes']:>9}{io['written']:>14,}{io['read']:>12,}")
+
+    (legacy, legacy_io), (fast, fast_io) = results.values()
+    print()
+    print(f"In-memory stage timings: {format_timings(fast_io['timings'])}")
+    print(f"Wall time saved: {legacy - fast:.3f} s per job ({(legacy - fast) / legacy * 100:.1f}%)")
+    print(f"Disk I/O saved:  {legacy_io['written'] + legacy_io['read']:,} bytes per job")
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
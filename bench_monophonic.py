@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark: monophonic engine vs basic-pitch on single-line material
+
+Inputs:
+  test_audio_melody.wav         C major scale (pure tones)
+  bach_real_prelude.mid         Cello Suite No. 1 opening, rendered with a
+                                bowed-string tone (harmonics, vibrato),
+                                at written pitch and an octave lower
+
+Each input is transcribed by both engines (the basic-pitch model is
+loaded once, before timing). Accuracy is the note F-measure (onset within
+50 ms, same pitch, mir_eval) of the monophonic notes against the
+basic-pitch notes and, for the rendered MIDI, of both against the score.
+
+Usage: python3 bench_monophonic.py
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+
+from monophonic import transcribe_monophonic
+from transcription import MODEL_SAMPLE_RATE, get_session, load_audio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MELODY = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+PRELUDE = os.path.join(BASE_DIR, 'bach_real_prelude.mid')
+
+ONSET_TOLERANCE = 0.05
+
+
+def render(midi_path, transpose=0, sr=MODEL_SAMPLE_RATE):
+    """Notes of a MIDI file as a bowed-string-like tone, plus the notes"""
+    import pretty_midi
+
+    notes = [(n.start, n.end, n.pitch + transpose)
+             for i in pretty_midi.PrettyMIDI(midi_path).instruments for n in i.notes]
+    y = np.zeros(int((max(end for _, end, _ in notes) + 1) * sr))
+    for start, end, pitch in notes:
+        t = np.arange(int((end - start) * sr)) / sr
+        f0 = 440.0 * 2 ** ((pitch - 69) / 12)
+        phase = 2 * np.pi * f0 * t + 0.005 * f0 / 5.5 * np.sin(2 * np.pi * 5.5 * t)
+        tone = sum(np.sin(k * phase) / k ** 0.8 for k in range(1, 9))
+        envelope = np.minimum(1, t / 0.03) * np.minimum(1, (end - start - t) / 0.02)
+        i = int(start * sr)
+        y[i:i + len(t)] += tone * envelope
+    return (y / np.abs(y).max()).astype(np.float32), notes
+
+
+def f_measure(reference, estimate):
+    """Note F-measure, onset and pitch only (mir_eval)"""
+    from mir_eval.transcription import precision_recall_f1_overlap
+
+    def arrays(notes):
+        intervals = np.array([[n[0], n[1]] for n in notes]).reshape(-1, 2)
+        pitches = np.array([440.0 * 2 ** ((n[2] - 69) / 12) for n in notes])
+        return intervals, pitches
+
+    if not len(reference) or not len(estimate):
+        return 0.0
+    return precision_recall_f1_overlap(*arrays(reference), *arrays(estimate),
+                                       onset_tolerance=ONSET_TOLERANCE, offset_ratio=None)[2]
+
+
+def timed(function, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeats', type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("\n" + "="*70)
+    print("BENCHMARK: MONOPHONIC ENGINE")
+    print("="*70)
+
+    y, sr = load_audio(MELODY)
+    inputs = [("scale (wav)", y, None)]
+    for name, transpose in (("Bach prelude", 0), ("Bach prelude -8va", -12)):
+        y, notes = render(PRELUDE, transpose)
+        inputs.append((name, y, notes))
+
+    session = get_session()
+    session.get_model()
+    print(f"\n{'Input':<18}{'Seconds':>8}{'basic-pitch':>13}{'mono':>8}{'Speedup':>9}"
+          f"{'F vs BP':>9}{'F BP/score':>12}{'F mono/score':>14}")
+    print("─"*91)
+    for name, y, score_notes in inputs:
+        neural_time, (_, _, neural) = timed(lambda: session.transcribe(y, MODEL_SAMPLE_RATE), args.repeats)
+        mono_time, mono = timed(lambda: transcribe_monophonic(y, MODEL_SAMPLE_RATE), args.repeats)
+        row = (f"{name:<18}{len(y) / MODEL_SAMPLE_RATE:>8.1f}{neural_time:>12.2f}s{mono_time:>7.2f}s"
+               f"{neural_time / mono_time:>8.1f}x{f_measure(neural, mono):>9.3f}")
+        if score_notes is not None:
+            row += f"{f_measure(score_notes, neural):>12.3f}{f_measure(score_notes, mono):>14.3f}"
+        print(row)
+
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
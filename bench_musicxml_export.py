@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: MusicXML export size, time and peak memory
+
+  music21       score.write('musicxml')   whole tree, then serialized
+  streamed      write_musicxml            one part at a time
+  streamed mxl  write_mxl                 one part at a time, compressed
+
+Each MIDI file is built notated (score_builder.table_to_score) in two
+layouts: its own parts, and all its notes in one part, as the pipeline
+builds transcriptions. Streaming only saves memory with several parts:
+a single part's tree is the whole document either way.
+
+Every writer gets a freshly built score (music21 writes notated scores
+with makeNotation=False, like write_musicxml). Time is measured without
+tracing; the peak of Python allocations comes from a second, traced run.
+
+Usage: python3 bench_musicxml_export.py [MIDI_FILE ...]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+import warnings
+
+from musicxml_writer import write_musicxml, write_mxl
+from note_table import NoteTable
+from score_builder import table_to_score
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_DIR, 'bach_suite1_prelude.mid')
+
+WRITERS = [
+    ("music21", ".musicxml", lambda score, path: score.write('musicxml', fp=path, makeNotation=False)),
+    ("streamed", ".musicxml", write_musicxml),
+    ("streamed mxl", ".mxl", write_mxl),
+]
+
+
+def one_part(table):
+    """The same notes, all in a single part"""
+    notes = table.notes.copy()
+    notes['part'] = 0
+    return NoteTable(notes, ["All"])
+
+
+# name -> NoteTable of a MIDI file in that layout
+LAYOUTS = {
+    "parts": NoteTable.from_midi,
+    "one part": lambda source: one_part(NoteTable.from_midi(source)),
+}
+
+
+def run_writer(table, write, path, traced):
+    score = table_to_score(table)
+    if traced:
+        tracemalloc.start()
+    start = time.perf_counter()
+    write(score, path)
+    elapsed = time.perf_counter() - start
+    peak = None
+    if traced:
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('inputs', nargs='*', default=[DEFAULT_INPUT])
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("\n" + "="*70)
+    print("BENCHMARK: MUSICXML EXPORT")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in args.inputs:
+            for layout, read in LAYOUTS.items():
+                table = read(source)
+                print(f"\n{os.path.basename(source)}, {layout} "
+                      f"(parts: {len(table.part_names)}, notes: {len(table)})\n")
+                print(f"{'Writer':<14}{'Size (KB)':>12}{'Time (s)':>11}{'Peak alloc (MB)':>18}")
+                print("─"*55)
+                for name, suffix, write in WRITERS:
+                    path = os.path.join(tmp, name.replace(' ', '_') + suffix)
+                    elapsed, _ = run_writer(table, write, path, traced=False)
+                    _, peak = run_writer(table, write, path, traced=True)
+                    print(f"{name:<14}{os.path.getsize(path) / 1024:>12,.0f}{elapsed:>11.2f}"
+                          f"{peak / 1024 / 1024:>18.1f}")
+
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Benchmark: exporting a score built notated vs re-notated at every write
+
+  music21    converter.parse, then score.write('musicxml') and
+             score.write('midi'): the MusicXML export runs makeNotation
+             (accidentals, ties, tuplets, beams, rests, splitAtDurations)
+             on a copy of the score
+  notated    NoteTable.from_midi + score_builder.table_to_score, which
+             computes measures, ties, rests and beams once on the arrays,
+             then write_musicxml and write_midi with no notation pass
+
+PDF and PNG go through the same MusicXML (MuseScore) or the measured
+parts (LilyPond), so they save the same notation time. Every writer gets
+its own freshly built score.
+
+Usage: python3 bench_notated_export.py [MIDI_FILE ...] [--repeats 3]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+from music21 import converter
+
+from midi_writer import write_midi
+from musicxml_writer import write_musicxml
+from note_table import NoteTable
+from score_builder import table_to_score
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_DIR, 'bach_suite1_prelude.mid')
+
+# name -> (build, MusicXML writer, MIDI writer)
+PIPELINES = {
+    "music21": (lambda path: converter.parse(path, forceSource=True),
+                lambda score, path: score.write('musicxml', fp=path),
+                lambda score, path: score.write('midi', fp=path)),
+    "notated": (lambda path: table_to_score(NoteTable.from_midi(path)),
+                write_musicxml,
+                write_midi),
+}
+
+
+def best_time(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('inputs', nargs='*', default=[DEFAULT_INPUT])
+    parser.add_argument('--repeats', type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("\n" + "="*70)
+    print("BENCHMARK: NOTATED SCORE EXPORT")
+    print("="*70)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for source in args.inputs:
+            print(f"\n{os.path.basename(source)}")
+            print(f"{'Pipeline':<10}{'Build (s)':>11}{'MusicXML (s)':>14}{'MIDI (s)':>10}"
+                  f"{'Total (s)':>11}{'Speedup':>9}")
+            print("─"*65)
+            baseline = None
+            for name, (build, write_xml, write_mid) in PIPELINES.items():
+                build_time = best_time(lambda: build(source), args.repeats)
+                xml_path = os.path.join(tmp, name + ".musicxml")
+                midi_path = os.path.join(tmp, name + ".mid")
+                # Fresh score for every write: nothing cached from a previous export
+                xml_time = best_time(lambda: write_xml(build(source), xml_path), args.repeats) - build_time
+                midi_time = best_time(lambda: write_mid(build(source), midi_path), args.repeats) - build_time
+                total = build_time + xml_time + midi_time
+                baseline = baseline or total
+                print(f"{name:<10}{build_time:>11.2f}{xml_time:>14.2f}{midi_time:>10.2f}"
+                      f"{total:>11.2f}{baseline / total:>8.1f}x")
+
+    print("\nWrite times exclude building the score (best build time subtracted)")
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
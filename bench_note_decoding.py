@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Benchmark: note decoding, basic-pitch's decoder vs note_decoding
+
+The DONNE RICCHE track is repeated up to 10 minutes and run through the
+model once; its activations are then decoded into notes by
+basic_pitch.note_creation.model_output_to_notes (Python loops over
+frames) and by note_decoding.model_output_to_notes (array operations),
+with a few threshold settings. Both must give the same note events.
+
+Usage: python3 bench_note_decoding.py [--minutes 10] [--repeats 1]
+"""
+
+import argparse
+import os
+import time
+import warnings
+
+import numpy as np
+
+import note_decoding
+from transcription import MODEL_SAMPLE_RATE, load_audio, load_model, run_model
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')
+
+# (onset threshold, frame threshold, minimum note length in frames)
+SETTINGS = [(0.5, 0.3, 11), (0.3, 0.2, 5), (0.7, 0.5, 20)]
+
+
+def same_notes(a, b):
+    return len(a) == len(b) and all(
+        x[:4] == y[:4] and list(map(int, x[4])) == list(map(int, y[4])) for x, y in zip(a, b))
+
+
+def best_time(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--minutes', type=float, default=10.0)
+    parser.add_argument('--repeats', type=int, default=1, help="best of N runs")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    from basic_pitch import note_creation
+
+    print("\n" + "="*70)
+    print("BENCHMARK: NOTE DECODING")
+    print("="*70)
+
+    y, sr = load_audio(AUDIO_FILE, sr=MODEL_SAMPLE_RATE)
+    y = np.tile(y, int(np.ceil(args.minutes * 60 * sr / len(y))))[:int(args.minutes * 60 * sr)]
+    start = time.perf_counter()
+    activations = run_model(y, sr, load_model())
+    inference = time.perf_counter() - start
+    print(f"\n{len(y) / sr / 60:.1f} minutes, {len(activations['note'])} frames, "
+          f"inference {inference:.1f} s")
+
+    print(f"\n{'Onset':>6}{'Frame':>7}{'Min':>5}{'Notes':>8}{'basic-pitch (s)':>17}"
+          f"{'NumPy (s)':>11}{'Speedup':>9}{'Same':>6}")
+    print("─"*69)
+    for onset, frame, min_len in SETTINGS:
+        # basic-pitch's decoder may write to its input: give it copies
+        reference_time, (_, reference) = best_time(lambda: note_creation.model_output_to_notes(
+            {k: np.array(v) for k, v in activations.items()}, onset, frame, min_note_len=min_len),
+            args.repeats)
+        numpy_time, (_, notes) = best_time(lambda: note_decoding.model_output_to_notes(
+            activations, onset, frame, min_note_len=min_len), args.repeats)
+        print(f"{onset:>6.1f}{frame:>7.1f}{min_len:>5}{len(notes):>8}{reference_time:>17.2f}"
+              f"{numpy_time:>11.2f}{reference_time / numpy_time:>8.1f}x"
+              f"{'yes' if same_notes(reference, notes) else 'NO':>6}")
+
+    print("\nSame: identical note events (times, pitch, amplitude, pitch bends)")
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: basic-pitch inference runtimes × thread counts
+
+Every runtime of transcription.RUNTIMES is run with each intra-op thread
+count (one inter-op thread, as batch workers use) on the bundled audio:
+test_audio_melody.wav and the first minute of the DONNE RICCHE track.
+TensorFlow only accepts its thread setup before it starts, so each
+configuration runs in a fresh subprocess. Runtimes whose package is not
+installed are listed as such.
+
+Usage: python3 bench_runtimes.py [--threads 1 2 4] [--repeats 3]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from transcription import RUNTIMES, available_runtimes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INPUTS = [
+    ("melody", os.path.join(BASE_DIR, 'test_audio_melody.wav')),
+    ("donne ricche", os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')),
+]
+
+# Runs inside the measuring subprocess
+CHILD_SCRIPT = '''
+import json, sys, time
+sys.path.insert(0, {base_dir!r})
+from transcription import ModelSession, load_audio
+runtime, threads, repeats = sys.argv[1], int(sys.argv[2]), int(sys.argv[3])
+buffers = [load_audio(path, duration=60) for path in sys.argv[4:]]
+session = ModelSession(runtime=runtime, intra_op_threads=threads, inter_op_threads=1)
+session.get_model()
+result = {{"load": session.model_load_time, "inputs": []}}
+for y, sr in buffers:
+    session.transcribe(y, sr)
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        notes = session.notes(y, sr)
+        best = min(best, time.perf_counter() - start)
+    result["inputs"].append({{"seconds": best, "notes": len(notes), "audio": len(y) / sr}})
+print(json.dumps(result))
+'''
+
+
+def measure(runtime, threads, repeats):
+    script = CHILD_SCRIPT.format(base_dir=BASE_DIR)
+    result = subprocess.run([sys.executable, "-c", script, runtime, str(threads), str(repeats)]
+                            + [path for _, path in INPUTS],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, nargs='+',
+                        default=sorted({1, 2, 4, os.cpu_count() or 1}))
+    parser.add_argument('--repeats', type=int, default=3, help="best of N warm runs")
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("BENCHMARK: INFERENCE RUNTIMES × THREADS")
+    print("="*70)
+    print(f"\nCPU cores: {os.cpu_count()}")
+
+    installed = available_runtimes()
+    header = f"{'Runtime':<12}{'Threads':>8}{'Load (s)':>10}"
+    header += "".join(f"{name:>20}" for name, _ in INPUTS)
+    print("\n" + header)
+    print("─"*len(header))
+    for runtime in RUNTIMES:
+        if runtime not in installed:
+            print(f"{runtime:<12}{'':>8}  not installed ({' / '.join(RUNTIMES[runtime][1])})")
+            continue
+        for threads in args.threads:
+            r = measure(runtime, threads, args.repeats)
+            row = f"{runtime:<12}{threads:>8}{r['load']:>10.2f}"
+            for i in r['inputs']:
+                row += f"{i['seconds']:>11.2f} ({i['audio'] / i['seconds']:>4.0f}x)"
+            print(row)
+
+    print("\nSeconds per warm run (best of --repeats), in brackets audio seconds per second")
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Benchmark: building a score from a MIDI file
+
+  converter.parse   music21's MIDI import: notes inserted one by one,
+                    then quantized and measured
+  bulk builder      NoteTable.from_midi + score_builder.table_to_score:
+                    notes read into arrays, grouped into chords and
+                    quantized there, created in bulk and inserted with
+                    coreInsert, the stream updated once per part
+
+music21's parse cache is bypassed (forceSource) so every run reads the
+file. Both scores are compared note by note (offset, pitches, length);
+unpitched notes (drum tracks) are only in converter.parse's score.
+
+Usage: python3 bench_score_builder.py [MIDI_FILE ...] [--repeats 3]
+"""
+
+import argparse
+import os
+import time
+import warnings
+from collections import Counter
+
+from music21 import converter
+
+from note_table import NoteTable
+from score_builder import table_to_score
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_DIR, 'bach_suite1_prelude.mid')
+
+BUILDERS = [
+    ("converter.parse", lambda path: converter.parse(path, forceSource=True)),
+    ("bulk builder", lambda path: table_to_score(NoteTable.from_midi(path))),
+]
+
+
+def note_signature(score):
+    """(offset, pitches, quarterLength) of every pitched note and chord, rounded"""
+    return Counter(
+        (round(float(n.getOffsetInHierarchy(score)), 4), tuple(sorted(p.midi for p in n.pitches)),
+         round(float(n.quarterLength), 4))
+        for n in score.recurse().notes if getattr(n, 'pitches', ())
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('inputs', nargs='*', default=[DEFAULT_INPUT])
+    parser.add_argument('--repeats', type=int, default=3, help="best of N runs")
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("\n" + "="*70)
+    print("BENCHMARK: SCORE CONSTRUCTION FROM MIDI")
+    print("="*70)
+
+    for path in args.inputs:
+        print(f"\n{os.path.basename(path)}")
+        print(f"{'Builder':<18}{'Wall (s)':>10}{'Speedup':>10}{'Parts':>7}{'Notes':>8}")
+        print("─"*53)
+        scores = {}
+        baseline = None
+        for name, build in BUILDERS:
+            best = float("inf")
+            for _ in range(args.repeats):
+                start = time.perf_counter()
+                score = build(path)
+                best = min(best, time.perf_counter() - start)
+            baseline = baseline or best
+            scores[name] = note_signature(score)
+            print(f"{name:<18}{best:>10.2f}{baseline / best:>9.1f}x{len(score.parts):>7}"
+                  f"{sum(scores[name].values()):>8}")
+
+        parsed, built = scores["converter.parse"], scores["bulk builder"]
+        same = sum((parsed & built).values())
+        print(f"\nNotes and chords in both scores: {same} of {sum(parsed.values())}")
+
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark: peak memory of streaming vs whole-file transcription
+
+The DONNE RICCHE track is concatenated (written block by block, never
+held in memory) into WAV files of increasing length, e.g. up to 60
+minutes. Each file is transcribed in a fresh subprocess so that its peak
+RSS (ru_maxrss) can be measured on its own.
+
+Usage: python3 bench_streaming_memory.py [--minutes 5 20 60] [--whole-file]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+import soundfile as sf
+
+from transcription import MODEL_SAMPLE_RATE, load_audio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')
+
+# Runs inside the measuring subprocess
+CHILD_SCRIPT = '''
+import json, resource, sys, time
+sys.path.insert(0, {base_dir!r})
+from transcription import load_audio, load_model, transcribe, transcribe_stream
+mode, path = sys.argv[1], sys.argv[2]
+model = load_model()
+start = time.perf_counter()
+if mode == "stream":
+    note_events = transcribe_stream(path, model=model)
+else:
+    y, sr = load_audio(path)
+    _, _, note_events = transcribe(y, sr, model=model)
+elapsed = time.perf_counter() - start
+peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{"notes": len(note_events), "seconds": elapsed, "peak_mb": peak_kb / 1024}}))
+'''
+
+
+def make_long_recording(path, minutes):
+    """Write the track repeated up to `minutes` as a 16-bit WAV"""
+    y, sr = load_audio(AUDIO_FILE, sr=MODEL_SAMPLE_RATE)
+    target = int(minutes * 60 * sr)
+    written = 0
+    with sf.SoundFile(path, 'w', samplerate=sr, channels=1, subtype='PCM_16') as out:
+        while written < target:
+            chunk = y[:target - written]
+            out.write(chunk)
+            written += len(chunk)
+
+
+def measure(mode, path):
+    script = CHILD_SCRIPT.format(base_dir=BASE_DIR)
+    result = subprocess.run([sys.executable, "-c", script, mode, path],
+                            capture_output=True, text=True, check=True)
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--minutes', type=float, nargs='+', default=[5, 20, 60])
+    parser.add_argument('--whole-file', action='store_true',
+                        help="also measure the whole-file path (needs much more memory)")
+    args = parser.parse_args()
+
+    print("\n" + "="*70)
+    print("BENCHMARK: STREAMING TRANSCRIPTION PEAK MEMORY")
+    print("="*70 + "\n")
+
+    modes = ["stream", "whole"] if args.whole_file else ["stream"]
+    print(f"{'Minutes':>8}{'Mode':>8}{'Notes':>9}{'Wall (s)':>11}{'Peak RSS (MB)':>15}")
+    print("─"*51)
+    with tempfile.TemporaryDirectory() as tmp:
+        for minutes in args.minutes:
+            path = os.path.join(tmp, f"donne_ricche_{minutes:g}min.wav")
+            make_long_recording(path, minutes)
+            for mode in modes:
+                r = measure(mode, path)
+                print(f"{minutes:>8g}{mode:>8}{r['notes']:>9}{r['seconds']:>11.1f}{r['peak_mb']:>15.0f}")
+            os.remove(path)
+
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark: score size and export time with and without the beat map
+
+The recording is transcribed once (with beat tracking), then the same
+note events are notated three ways:
+
+  fixed 120 BPM   seconds -> quarters at the MIDI default tempo
+  average tempo   one tempo for the whole piece (beat_grid)
+  beat map        every detected beat on a quarter note (beat_map),
+                  with tempo changes where the performance shifts
+
+For each: objects in the score, tied notes, tuplets, build time and
+MusicXML export time.
+
+Usage: python3 bench_time_warp.py [AUDIO_FILE]
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import warnings
+
+from beat_tracking import beat_grid, beat_map, format_tempi, tempo_changes, track_beats
+from musicxml_writer import write_musicxml
+from score_builder import notes_to_score
+from transcription import get_session, load_audio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INPUT = os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')
+
+
+def describe(score):
+    elements = list(score.recurse())
+    tied = sum(1 for n in score.recurse().notes if n.tie is not None and n.tie.type != 'start')
+    tuplets = sum(1 for n in score.recurse().notesAndRests if n.duration.tuplets)
+    return len(elements), tied, tuplets
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('input', nargs='?', default=DEFAULT_INPUT)
+    args = parser.parse_args()
+    warnings.simplefilter('ignore')
+
+    print("\n" + "="*70)
+    print("BENCHMARK: BEAT MAP")
+    print("="*70)
+
+    y, sr = load_audio(args.input)
+    _, _, note_events = get_session().transcribe(y, sr)
+    tempo, beats = track_beats(y, sr)
+    bpm, origin = beat_grid(tempo, beats)
+    time_map = beat_map(tempo, beats)
+    tempi = tempo_changes(time_map)
+    print(f"\n{os.path.basename(args.input)}: {len(note_events)} notes, {len(beats)} beats")
+    print(f"Average tempo {bpm:.1f} BPM; beat map: {format_tempi(tempi)}\n")
+
+    variants = [
+        ("fixed 120 BPM", {}),
+        ("average tempo", {'bpm': bpm, 'origin': origin}),
+        ("beat map", {'time_map': time_map, 'tempi': tempi}),
+    ]
+    print(f"{'Mapping':<16}{'Objects':>9}{'Tied':>7}{'Tuplets':>9}{'Build (s)':>11}{'Export (s)':>12}")
+    print("─"*64)
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, kwargs in variants:
+            start = time.perf_counter()
+            score = notes_to_score(note_events, **kwargs)
+            build = time.perf_counter() - start
+            objects, tied, tuplets = describe(score)
+            start = time.perf_counter()
+            write_musicxml(score, os.path.join(tmp, 'score.musicxml'))
+            export = time.perf_counter() - start
+            print(f"{name:<16}{objects:>9,}{tied:>7,}{tuplets:>9,}{build:>11.2f}{export:>12.2f}")
+
+    print("\n" + "="*70 + "\n")
+
+
+if __name__ == "__main__":
+    main()
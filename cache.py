@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Content-addressed cache of transcribed note events
+
+Entries are keyed by a hash of the audio file content plus the
+transcription parameters and the model version, so reconverting the same
+recording with another instrument, title or export format skips decoding
+and inference entirely. The model's raw activations (posteriorgrams) can
+be stored too, as .npy arrays that are memory-mapped on load, so notes
+can be decoded again with other thresholds without running the model.
+The cache directory has a size limit; the least recently used entries
+are evicted first.
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "AUDIO2SCORE_CACHE_DIR",
+    os.path.join(os.path.expanduser("~"), ".cache", "audio2score"),
+)
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+
+ENTRY_SUFFIX = ".json"
+# Beat tracking results stored next to an entry's note events
+BEATS_SUFFIX = ".beats" + ENTRY_SUFFIX
+# Model activations, one array per output ('note', 'onset', 'contour')
+ARRAY_SUFFIX = ".npy"
+ACTIVATION_NAMES = ('note', 'onset', 'contour')
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    """SHA-256 of a file's content"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class TranscriptionCache:
+    """On-disk LRU cache of note events, with hit/miss counters"""
+
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._file_hashes = {}
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _hash_file(self, audio_path):
+        # Hashed once per file version: a job computes several keys of the same file
+        stat = os.stat(audio_path)
+        signature = (os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns)
+        if signature not in self._file_hashes:
+            self._file_hashes[signature] = hash_file(audio_path)
+        return self._file_hashes[signature]
+
+    def key(self, audio_path, params, model_version):
+        """Cache key for an audio file transcribed with `params` by `model_version`"""
+        digest = hashlib.sha256()
+        digest.update(self._hash_file(audio_path).encode('ascii'))
+        digest.update(json.dumps(params, sort_keys=True).encode('utf-8'))
+        digest.update(model_version.encode('utf-8'))
+        return digest.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + ENTRY_SUFFIX)
+
+    def get(self, key):
+        """Cached note events for `key`, or None"""
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                note_events = [tuple(e) for e in json.load(f)]
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        # Touch the entry: eviction removes the least recently used first
+        os.utime(path)
+        self.hits += 1
+        return note_events
+
+    def has(self, key):
+        """Whether note events are cached for `key` (not counted as a hit or a miss)"""
+        return os.path.exists(self._path(key))
+
+    def put(self, key, note_events):
+        """Store note events, then evict old entries above the size limit"""
+        events = [
+            (float(start), float(end), int(pitch), float(amplitude),
+             [int(b) for b in bends] if bends is not None else None)
+            for start, end, pitch, amplitude, bends in note_events
+        ]
+        self._write(self._path(key), events)
+        self.evict()
+
+    def _write(self, path, data):
+        # Write to a temporary file first so readers never see partial entries
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def get_beats(self, key):
+        """
+        Cached (tempo, beat times array) of the recording `key` was made
+        for, as track_beats returns them, or None. Does not count as a hit
+        or a miss.
+        """
+        path = os.path.join(self.cache_dir, key + BEATS_SUFFIX)
+        try:
+            with open(path, encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        os.utime(path)
+        return entry['tempo'], np.asarray(entry['beats'], dtype=np.float64)
+
+    def put_beats(self, key, tempo, beats):
+        """Store beat tracking results next to the note events of `key`"""
+        self._write(os.path.join(self.cache_dir, key + BEATS_SUFFIX),
+                    {'tempo': tempo, 'beats': [float(b) for b in beats]})
+        self.evict()
+
+    def _activation_path(self, key, name):
+        return os.path.join(self.cache_dir, f"{key}.{name}{ARRAY_SUFFIX}")
+
+    def get_activations(self, key):
+        """
+        Cached model activations {'note', 'onset', 'contour'} for `key`, as
+        read-only memory-mapped arrays, or None. Does not count as a hit or
+        a miss.
+        """
+        activations = {}
+        try:
+            for name in ACTIVATION_NAMES:
+                path = self._activation_path(key, name)
+                activations[name] = np.load(path, mmap_mode='r')
+                os.utime(path)
+        except (OSError, ValueError):
+            return None  # missing, partly evicted or unreadable
+        return activations
+
+    def has_activations(self, key):
+        """Whether every activation array of `key` is cached"""
+        return all(os.path.exists(self._activation_path(key, name)) for name in ACTIVATION_NAMES)
+
+    def put_activations(self, key, activations):
+        """Store model activations as .npy arrays, then evict old entries"""
+        for name in ACTIVATION_NAMES:
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(activations[name], dtype=np.float32))
+            os.replace(tmp_path, self._activation_path(key, name))
+        self.evict()
+
+    def _entries(self):
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.name.endswith((ENTRY_SUFFIX, ARRAY_SUFFIX)):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits max_bytes"""
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def stats(self):
+        entries = self._entries()
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'entries': len(entries),
+            'bytes': sum(size for _, size, _ in entries),
+        }
@@ -5,12 +5,19 @@ Check all parts of the Bach score to see where the real melody is
 
 from music21 import converter
 
+from note_table import NoteTable, pitch_names
+from part_analysis import analyze_parts, main_part
+
 print(f"\n{'='*70}")
 print(f"CHECKING ALL PARTS OF THE BACH SCORE")
 print(f"{'='*70}\n")
 
 score_path = '/home/user/Audio2Score/bach_output.musicxml'
 score = converter.parse(score_path)
+# One walk over the score, then one pass over its arrays for all parts
+table = NoteTable.from_score(score)
+analysis = analyze_parts(table)
+stats = {int(row['part']): row for row in analysis}
 
 print(f"Total parts in score: {len(score.parts)}\n")
 
@@ -28,35 +35,28 @@ for part_num, part in enumerate(score.parts, start=1):
 
     print(f"Instrument: {inst_name}")
 
-    # Count notes
-    all_notes = part.flatten().notes
-    pitched_notes = [n for n in all_notes if hasattr(n, 'pitch')]
-
-    print(f"Total notes: {len(pitched_notes)}")
+    part_stats = stats.get(part_num - 1)
+    print(f"Total notes: {part_stats['notes'] if part_stats is not None else 0}")
 
-    if len(pitched_notes) > 0:
-        # Get unique pitches
-        unique_pitches = set()
-        for note in pitched_notes:
-            unique_pitches.add(note.pitch.nameWithOctave)
+    if part_stats is not None:
+        part_notes = table.part(part_num - 1)
+        unique_pitches = pitch_names(table.unique_pitches(part_num - 1))
 
-        print(f"Unique pitches: {len(unique_pitches)}")
-        print(f"Pitch variety: {sorted(unique_pitches)[:10]}...")  # Show first 10
+        print(f"Unique pitches: {part_stats['unique_pitches']}")
+        print(f"Pitch variety: {unique_pitches[:10]}...")  # Show first 10
 
         # Show first 20 notes
         print(f"\nFirst 20 notes:")
-        first_notes = [n.pitch.nameWithOctave for n in pitched_notes[:20]]
-        print(f"  {' '.join(first_notes)}")
+        print(f"  {' '.join(pitch_names(part_notes['pitch'][:20]))}")
 
         # Check pitch range
-        pitches_midi = [n.pitch.midi for n in pitched_notes]
-        lowest = min(pitches_midi)
-        highest = max(pitches_midi)
-        from music21 import pitch
-        lowest_note = pitch.Pitch(midi=lowest)
-        highest_note = pitch.Pitch(midi=highest)
+        lowest, highest = int(part_stats['lowest']), int(part_stats['highest'])
+        lowest_name, highest_name = pitch_names([lowest, highest])
 
-        print(f"\nRange: {lowest_note.nameWithOctave} to {highest_note.nameWithOctave} ({highest-lowest} semitones)")
+        print(f"\nRange: {lowest_name} to {highest_name} ({highest-lowest} semitones)")
+        print(f"Density: {part_stats['density']:.2f} notes per quarter")
+        print(f"Polyphony: {part_stats['mean_polyphony']:.2f} on average, {part_stats['max_polyphony']} at most")
+        print(f"Melody score: {part_stats['melody_score']:.3f}")
 
         # Check measures
         measures = part.getElementsByClass('Measure')
@@ -69,36 +69,19 @@ for part_num, part in enumerate(score.parts, start=1):
 
 # Find the most melodically interesting part
 print(f"\n{'='*70}")
-print(f"FINDING THE RICHEST MELODIC PART:")
+print(f"FINDING THE MAIN MELODIC PART:")
 print(f"{'='*70}\n")
 
-best_part_idx = -1
-best_variety = 0
-
-for part_num, part in enumerate(score.parts):
-    all_notes = part.flatten().notes
-    pitched_notes = [n for n in all_notes if hasattr(n, 'pitch')]
-
-    if len(pitched_notes) > 0:
-        unique_pitches = set(n.pitch.nameWithOctave for n in pitched_notes)
-        pitch_variety = len(unique_pitches)
-
-        if pitch_variety > best_variety:
-            best_variety = pitch_variety
-            best_part_idx = part_num
-
-if best_part_idx >= 0:
-    print(f"✓ Most melodically rich part: Part {best_part_idx + 1}")
-    print(f"  Unique pitches: {best_variety}")
+best_part_idx = main_part(analysis)
+if best_part_idx is not None:
+    best = stats[best_part_idx]
+    print(f"✓ Main melodic part: Part {best_part_idx + 1}")
+    print(f"  Unique pitches: {best['unique_pitches']}, melody score: {best['melody_score']:.3f}")
     print(f"\n  This is likely the main melodic line!")
 
     # Show details of this part
-    best_part = score.parts[best_part_idx]
-    all_notes = best_part.flatten().notes
-    pitched_notes = [n for n in all_notes if hasattr(n, 'pitch')]
-
     print(f"\n  First 30 notes of the main melody:")
-    first_30 = [n.pitch.nameWithOctave for n in pitched_notes[:30]]
+    first_30 = pitch_names(table.part(best_part_idx)['pitch'][:30])
     # Print in groups of 10
     for i in range(0, 30, 10):
         print(f"    {' '.join(first_30[i:i+10])}")
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Export plan: write a score only in the formats that are asked for
+
+Every chosen writer runs in its own process with its own timeout, so a
+slow or hung renderer (MuseScore for PDF, LilyPond for PNG) neither
+delays the other formats nor blocks the job forever. External renderers
+are looked up once per process (detect_renderers); formats whose
+renderer is missing are left out of the plan instead of being attempted,
+and timing out, on every job.
+
+Scores built notated (notation.is_notated) are written without music21's
+makeNotation pass in every format, and MIDI is written from the sounding
+notes with tied notes joined (midi_writer.write_midi).
+"""
+
+import logging
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import time
+
+from midi_writer import write_midi
+from musicxml_writer import write_musicxml, write_mxl
+from notation import is_notated
+
+logger = logging.getLogger(__name__)
+
+# format -> (file extension, music21 write format or writer function, external renderer)
+EXPORT_FORMATS = {
+    'midi': ('.mid', write_midi, None),
+    'musicxml': ('.musicxml', write_musicxml, None),
+    'mxl': ('.mxl', write_mxl, None),
+    'pdf': ('.pdf', 'musicxml.pdf', 'musescore'),
+    'png': ('.png', 'lily.png', 'lilypond'),
+}
+DEFAULT_FORMATS = ('midi', 'musicxml', 'pdf', 'png')
+
+# Seconds each writer may run before its process is terminated
+DEFAULT_TIMEOUTS = {'midi': 60, 'musicxml': 120, 'mxl': 120, 'pdf': 180, 'png': 180}
+
+# renderer -> (music21 environment key, executable names searched on PATH)
+RENDERERS = {
+    'musescore': ('musescoreDirectPNGPath',
+                  ('mscore', 'mscore4portable', 'MuseScore4', 'mscore3', 'MuseScore3', 'musescore')),
+    'lilypond': ('lilypondPath', ('lilypond',)),
+}
+
+# How often the parent checks writers for completion, timeout and cancellation
+POLL_INTERVAL = 0.05
+
+_renderers = None
+
+
+def _is_executable(path):
+    return bool(path) and os.path.isfile(path) and os.access(path, os.X_OK)
+
+
+def detect_renderers(refresh=False):
+    """
+    Path of each external renderer, or None when it is not installed.
+
+    The music21 configured path is preferred, then the PATH is searched.
+    The lookup runs once per process; pass refresh=True to repeat it.
+    """
+    global _renderers
+    if _renderers is None or refresh:
+        from music21 import environment
+
+        env = environment.Environment()
+        found = {}
+        for name, (key, executables) in RENDERERS.items():
+            configured = str(env[key]) if env[key] else None
+            if _is_executable(configured):
+                found[name] = configured
+                continue
+            found[name] = next((p for p in map(shutil.which, executables) if p), None)
+        _renderers = found
+    return _renderers
+
+
+def available_formats(formats=DEFAULT_FORMATS):
+    """The subset of `formats` whose renderer (if any) is installed"""
+    renderers = detect_renderers()
+    return tuple(fmt for fmt in formats
+                 if EXPORT_FORMATS[fmt][2] is None or renderers[EXPORT_FORMATS[fmt][2]])
+
+
+def plan_exports(output_base, formats=DEFAULT_FORMATS):
+    """
+    Output path for each requested format that can be written here.
+
+    Raises ValueError for unknown formats; formats whose renderer is not
+    installed are dropped with a warning.
+    """
+    unknown = [fmt for fmt in formats if fmt not in EXPORT_FORMATS]
+    if unknown:
+        raise ValueError(f"Unknown export format(s): {', '.join(unknown)}")
+    usable = available_formats(formats)
+    for fmt in formats:
+        if fmt not in usable:
+            logger.warning(f"Skipping {fmt.upper()}, {EXPORT_FORMATS[fmt][2]} is not installed")
+    return {fmt: output_base + EXPORT_FORMATS[fmt][0] for fmt in usable}
+
+
+def _freeze_score(score, path):
+    # A plain pickle loses what ties elements to their streams (sites and
+    # offsets live in per-process tables); music21's freezer stores them
+    # with the score, on a copy, and the thawer rebuilds them
+    from music21 import freezeThaw
+
+    freezeThaw.StreamFreezer(score).write('pickle', fp=path)
+
+
+def _thaw_score(path):
+    from music21 import freezeThaw
+
+    thawer = freezeThaw.StreamThawer()
+    thawer.open(path)
+    return thawer.stream
+
+
+def _write_format(score_path, fmt, path, renderers, results):
+    """Writer process: thaw the frozen score and write one format"""
+    try:
+        from music21 import environment
+
+        env = environment.Environment()
+        for name, (key, _) in RENDERERS.items():
+            if renderers.get(name):
+                env[key] = renderers[name]  # in memory only, not saved to the user settings
+        score = _thaw_score(score_path)
+        writer = EXPORT_FORMATS[fmt][1]
+        if callable(writer):
+            writer(score, path)
+        elif is_notated(score):
+            score.write(writer, fp=path, makeNotation=False)
+        else:
+            score.write(writer, fp=path)
+        results.put((fmt, None))
+    except Exception as e:
+        results.put((fmt, f"{type(e).__name__}: {e}"))
+
+
+def export_score(score, plan, timeouts=None, cancel_event=None, timings=None):
+    """
+    Write `score` to every path in `plan` (see plan_exports) concurrently.
+
+    timeouts: per-format limits in seconds, defaults to DEFAULT_TIMEOUTS
+    cancel_event: optional threading.Event; when set, all writers are
+        terminated and ConversionCancelled is raised
+    timings: optional dict that receives 'export_<format>' durations
+
+    Returns {format: path}, with None for formats that failed or timed out.
+    """
+    if not plan:
+        return {}
+    timeouts = dict(DEFAULT_TIMEOUTS, **(timeouts or {}))
+    renderers = detect_renderers()
+    # The score is frozen once to a file that every writer reads: large
+    # scores would otherwise be copied through each process's start pipe
+    fd, score_path = tempfile.mkstemp(suffix=".pickle")
+    os.close(fd)
+    _freeze_score(score, score_path)
+
+    # spawn: writers start clean, like the batch workers
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    start = time.perf_counter()
+    writers = {}
+    errors = {}
+    finished = {}
+    try:
+        for fmt, path in plan.items():
+            process = context.Process(target=_write_format,
+                                      args=(score_path, fmt, path, renderers, results),
+                                      daemon=True)
+            process.start()
+            writers[fmt] = process
+
+        while len(finished) < len(writers):
+            if cancel_event is not None and cancel_event.is_set():
+                from transcription import ConversionCancelled
+                raise ConversionCancelled()
+            try:
+                fmt, error = results.get(timeout=POLL_INTERVAL)
+                finished[fmt] = time.perf_counter() - start
+                if error:
+                    errors[fmt] = error
+            except queue.Empty:
+                pass
+            elapsed = time.perf_counter() - start
+            for fmt, process in writers.items():
+                if fmt in finished:
+                    continue
+                if elapsed > timeouts[fmt]:
+                    process.terminate()
+                    errors[fmt] = f"timed out after {timeouts[fmt]}s"
+                    finished[fmt] = elapsed
+                elif not process.is_alive() and process.exitcode not in (None, 0):
+                    errors[fmt] = f"writer exited with code {process.exitcode}"
+                    finished[fmt] = elapsed
+    finally:
+        for process in writers.values():
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        results.close()
+        os.remove(score_path)
+
+    if timings is not None:
+        for fmt, seconds in finished.items():
+            timings['export_' + fmt] = seconds
+
+    outputs = {}
+    for fmt, path in plan.items():
+        if fmt in errors or not os.path.exists(path):
+            logger.warning(f"Could not generate {fmt.upper()}: {errors.get(fmt, 'no output written')}")
+            if os.path.exists(path):
+                os.remove(path)  # partial output of a failed or terminated writer
+            outputs[fmt] = None
+        else:
+            outputs[fmt] = path
+    return outputs
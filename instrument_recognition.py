@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Instrument recognition on the decoded audio buffer
+
+Three spectral features are computed once, from a single STFT of the
+buffer the model transcribes:
+
+  register   median fundamental (MIDI number) of the loud frames, from a
+             harmonic product spectrum
+  sustain    level 0.3 s after an onset relative to the onset (piano
+             notes decay; bowed notes are held or swell, often above 1)
+  polyphony  pitch classes sounding together, from a chromagram
+
+classify scores them against one Gaussian prototype per instrument
+(naive Bayes with equal priors) and returns the best instrument with its
+posterior probability as confidence. The prototypes below are set by
+hand from the typical range and playing style of each instrument; there
+is no labelled corpus of real recordings to fit them on. Recordings of
+other instruments (e.g. voice and guitar) land between the prototypes
+with a low confidence, which the pipeline reports as uncertain.
+
+Everything runs in NumPy on an STFT of at most RECOGNITION_SECONDS of
+audio, which takes a fraction of a second.
+"""
+
+import time
+
+import numpy as np
+
+# Shown in the GUI and accepted by the pipeline instead of an instrument name
+AUTO_INSTRUMENT = "Automatico"
+
+FEATURE_NAMES = ('register', 'sustain', 'polyphony')
+
+# instrument -> (mean, standard deviation) of each feature in FEATURE_NAMES
+INSTRUMENT_PROTOTYPES = {
+    "Pianoforte": ((62.0, 10.0), (0.45, 0.2), (2.2, 0.8)),
+    "Violino": ((76.0, 6.0), (1.0, 0.3), (1.2, 0.5)),
+    "Violoncello": ((50.0, 6.0), (1.0, 0.3), (1.2, 0.5)),
+}
+
+# Only the beginning of long recordings is analysed
+RECOGNITION_SECONDS = 60.0
+
+N_FFT = 4096
+HOP_LENGTH = 512
+# Harmonics multiplied in the harmonic product spectrum
+HPS_HARMONICS = 3
+# Fundamentals searched between these frequencies (Hz)
+MIN_F0 = 55.0
+MAX_F0 = 2100.0
+# A fundamental is at least this fraction of its frame's strongest bin
+FUNDAMENTAL_RATIO = 0.05
+# Partials above this frequency are left out of the chromagram
+MAX_CHROMA_FREQ = 5000.0
+# Frames quieter than this fraction of the loudest one are ignored
+SILENCE_RATIO = 0.1
+# Seconds after an onset at which the sustain level is read
+SUSTAIN_SECONDS = 0.3
+# Chroma bins above this fraction of the frame's strongest count as sounding
+CHROMA_THRESHOLD = 0.5
+
+
+def extract_features(y, sr):
+    """FEATURE_NAMES values of a mono buffer, as a float array"""
+    import librosa
+
+    y = np.asarray(y, dtype=np.float32)[:int(RECOGNITION_SECONDS * sr)]
+    S = np.abs(librosa.stft(y, n_fft=N_FFT, hop_length=HOP_LENGTH))
+    rms = librosa.feature.rms(S=S, frame_length=N_FFT)[0]
+    if not len(rms) or rms.max() <= 0:
+        return np.full(len(FEATURE_NAMES), np.nan)
+    loud = rms > SILENCE_RATIO * rms.max()
+
+    # Register: the harmonic product spectrum peaks at the fundamental
+    freqs = librosa.fft_frequencies(sr=sr, n_fft=N_FFT)
+    bins = len(freqs) // HPS_HARMONICS
+    hps = np.log(S[:bins] + 1e-9)
+    for h in range(2, HPS_HARMONICS + 1):
+        hps = hps + np.log(S[::h][:bins] + 1e-9)
+    # The fundamental itself must be audible, or sparse spectra (pure
+    # tones) put the product's peak on a subharmonic
+    hps[S[:bins] < FUNDAMENTAL_RATIO * S.max(axis=0)] = -np.inf
+    searched = (freqs[:bins] >= MIN_F0) & (freqs[:bins] <= MAX_F0)
+    f0 = freqs[:bins][searched][np.argmax(hps[searched], axis=0)]
+    register = float(np.median(librosa.hz_to_midi(f0[loud])))
+
+    # Sustain: level SUSTAIN_SECONDS after each onset, relative to its peak
+    onset_envelope = librosa.onset.onset_strength(S=librosa.amplitude_to_db(S), sr=sr)
+    onsets = librosa.onset.onset_detect(onset_envelope=onset_envelope, sr=sr, hop_length=HOP_LENGTH)
+    later = int(round(SUSTAIN_SECONDS * sr / HOP_LENGTH))
+    onsets = onsets[(onsets + later < len(rms)) & loud[np.minimum(onsets, len(rms) - 1)]]
+    if len(onsets):
+        peaks = np.max(np.stack([rms[np.minimum(onsets + k, len(rms) - 1)] for k in range(3)]), axis=0)
+        sustain = float(np.median(rms[onsets + later] / peaks))
+    else:
+        sustain = 1.0  # nothing but held sound
+
+    # Polyphony: pitch classes close to the strongest one, per loud frame.
+    # Each STFT bin adds its power to the nearest pitch class (one matrix
+    # product; librosa's chroma filter bank is slower to build than to apply)
+    audible = (freqs >= MIN_F0) & (freqs <= MAX_CHROMA_FREQ)
+    pitch_classes = np.round(librosa.hz_to_midi(freqs[audible])).astype(np.intp) % 12
+    chroma = np.eye(12, dtype=np.float32)[:, pitch_classes] @ (S[audible] ** 2)
+    chroma = chroma / np.maximum(chroma.max(axis=0, keepdims=True), 1e-9)
+    polyphony = float(np.mean(np.sum(chroma[:, loud] > CHROMA_THRESHOLD, axis=0)))
+
+    return np.array([register, sustain, polyphony])
+
+
+def classify(features, prototypes=INSTRUMENT_PROTOTYPES):
+    """
+    (instrument, confidence, {instrument: probability}) for a feature vector.
+
+    Probabilities are Gaussian naive Bayes posteriors with equal priors.
+    Without usable features (silence) the first instrument is returned
+    with zero confidence.
+    """
+    names = list(prototypes)
+    features = np.asarray(features, dtype=np.float64)
+    if np.isnan(features).any():
+        return names[0], 0.0, {name: 0.0 for name in names}
+    params = np.array([prototypes[name] for name in names])  # (instruments, features, 2)
+    means, stds = params[..., 0], params[..., 1]
+    log_likelihood = -0.5 * np.sum(((features - means) / stds) ** 2 + 2 * np.log(stds), axis=1)
+    posterior = np.exp(log_likelihood - log_likelihood.max())
+    posterior /= posterior.sum()
+    best = int(np.argmax(posterior))
+    return names[best], float(posterior[best]), dict(zip(names, posterior.tolist()))
+
+
+def recognize_instrument(y, sr, timings=None):
+    """(instrument, confidence) for a decoded buffer, see classify"""
+    start = time.perf_counter()
+    name, confidence, _ = classify(extract_features(y, sr))
+    if timings is not None:
+        timings['instrument_recognition'] = time.perf_counter() - start
+    return name, confidence
+
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+"""
+Key estimation from duration-weighted pitch-class histograms
+
+estimate_key correlates the pitch-class histogram of a whole piece (each
+pitch class weighted by how long it sounds) with the 24 rotated
+Krumhansl-Kessler key profiles and keeps the best match. track_keys does
+the same over sliding windows to follow modulations: every window is
+classified on its own, then keys that do not last at least a few hops
+are merged into the surrounding key.
+
+Everything works on NumPy arrays of onsets, durations and MIDI pitches.
+The windowed histograms come from cumulative sounding time per pitch
+class, evaluated with searchsorted at the window edges. There is no loop
+over notes or windows, so an hour of transcription takes milliseconds.
+music21's analyze('key') walks the score's objects instead.
+"""
+
+import numpy as np
+
+# Krumhansl & Kessler (1982) probe-tone ratings, tonic first
+KRUMHANSL_MAJOR = np.array([6.35, 2.23, 3.48, 2.33, 4.38, 4.09, 2.52, 5.19, 2.39, 3.66, 2.29, 2.88])
+KRUMHANSL_MINOR = np.array([6.33, 2.68, 3.52, 5.38, 2.60, 3.53, 2.54, 4.75, 3.98, 2.69, 3.34, 3.17])
+
+MODES = ('major', 'minor')
+
+# Tonic spelling with the fewest accidentals in the key signature;
+# lowercase for minor keys, as music21 writes them
+MAJOR_TONICS = ('C', 'D-', 'D', 'E-', 'E', 'F', 'F#', 'G', 'A-', 'A', 'B-', 'B')
+MINOR_TONICS = ('c', 'c#', 'd', 'e-', 'e', 'f', 'f#', 'g', 'g#', 'a', 'b-', 'b')
+
+KEY_DTYPE = np.dtype([
+    ('offset', 'f8'),        # quarter notes; where the key starts
+    ('tonic', 'i1'),         # pitch class, 0 = C
+    ('mode', 'i1'),          # index in MODES
+    ('correlation', 'f4'),   # Pearson correlation with the key profile
+])
+
+# Default tracking window and hop, in quarter notes (four bars and one bar of 4/4)
+DEFAULT_WINDOW = 16.0
+DEFAULT_HOP = 4.0
+# A new key must win this many consecutive hops to count as a modulation
+DEFAULT_MIN_HOPS = 3
+
+
+def _key_profiles():
+    """(24, 12) z-normalized profiles: 12 major keys, then 12 minor keys"""
+    rows = [np.roll(profile, tonic) for profile in (KRUMHANSL_MAJOR, KRUMHANSL_MINOR)
+            for tonic in range(12)]
+    profiles = np.array(rows)
+    profiles -= profiles.mean(axis=1, keepdims=True)
+    return profiles / np.linalg.norm(profiles, axis=1, keepdims=True)
+
+
+PROFILES = _key_profiles()
+
+
+def key_name(tonic, mode):
+    """music21 key name, e.g. 'E-' for E-flat major or 'f#' for F-sharp minor"""
+    return (MAJOR_TONICS if MODES[mode] == 'major' else MINOR_TONICS)[tonic]
+
+
+def pitch_class_histogram(pitches, durations):
+    """Total sounding time of each of the 12 pitch classes"""
+    pitch_classes = np.asarray(pitches, dtype=np.intp) % 12
+    return np.bincount(pitch_classes, weights=np.asarray(durations, dtype=np.float64), minlength=12)
+
+
+def key_correlations(histograms):
+    """
+    Correlation of histograms (..., 12) with every key profile (..., 24).
+
+    Rows without any sounding time give NaN.
+    """
+    h = np.asarray(histograms, dtype=np.float64)
+    h = h - h.mean(axis=-1, keepdims=True)
+    norm = np.linalg.norm(h, axis=-1, keepdims=True)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return (h / norm) @ PROFILES.T
+
+
+def estimate_key(pitches, durations):
+    """Best key for the whole piece as a KEY_DTYPE record, or None without notes"""
+    correlations = key_correlations(pitch_class_histogram(pitches, durations))
+    if np.isnan(correlations).all():
+        return None
+    best = int(np.nanargmax(correlations))
+    return np.array((0.0, best % 12, best // 12, correlations[best]), dtype=KEY_DTYPE)[()]
+
+
+def windowed_histograms(onsets, durations, pitches, edges):
+    """
+    (len(edges) - 1, 12) sounding time of each pitch class between edges.
+
+    The sounding time of a pitch class up to t is
+    sum(max(t - onset, 0)) - sum(max(t - end, 0)) over its notes, which
+    prefix sums of the sorted onsets and ends give at every edge at once.
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    ends = onsets + np.asarray(durations, dtype=np.float64)
+    pitch_classes = np.asarray(pitches, dtype=np.intp) % 12
+    edges = np.asarray(edges, dtype=np.float64)
+
+    def elapsed(times):
+        # sum(max(edge - time, 0)) for each edge, over one pitch class's times
+        times = np.sort(times)
+        before = np.searchsorted(times, edges, side='right')
+        prefix = np.r_[0.0, np.cumsum(times)]
+        return before * edges - prefix[before]
+
+    cumulative = np.stack([elapsed(onsets[pitch_classes == pc]) - elapsed(ends[pitch_classes == pc])
+                           for pc in range(12)], axis=1)
+    return np.diff(cumulative, axis=0)
+
+
+def _merge_short_runs(keys, min_hops):
+    """Fold runs of fewer than min_hops windows into the key before them (or after, at the start)"""
+    while True:
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        lengths = np.diff(np.r_[starts, len(keys)])
+        short = np.flatnonzero(lengths < min_hops)
+        if len(starts) < 2 or not len(short):
+            return keys
+        # Shortest run first, so a brief excursion does not swallow a real key
+        run = short[np.argmin(lengths[short])]
+        neighbour = run - 1 if run > 0 else run + 1
+        keys[starts[run]:starts[run] + lengths[run]] = keys[starts[neighbour]]
+
+
+def track_keys(onsets, durations, pitches, window=DEFAULT_WINDOW, hop=DEFAULT_HOP,
+               min_hops=DEFAULT_MIN_HOPS):
+    """
+    Key segments of a piece, following modulations.
+
+    onsets, durations: quarter notes; pitches: MIDI numbers
+    window, hop: analysis window and step, in quarter notes; a key is
+        assigned to each hop from the window of about `window` quarter
+        notes centred on it
+    min_hops: keys lasting fewer hops are merged into their neighbour
+
+    Returns a KEY_DTYPE array with one record per key change, the first
+    at offset 0; empty without notes. Offsets fall on multiples of `hop`.
+    """
+    if window <= 0 or hop <= 0:
+        raise ValueError(f"Window and hop must be positive, got {window} and {hop}")
+    onsets = np.asarray(onsets, dtype=np.float64)
+    durations = np.asarray(durations, dtype=np.float64)
+    if not len(onsets):
+        return np.zeros(0, dtype=KEY_DTYPE)
+
+    end = float((onsets + durations).max())
+    hops = max(int(np.ceil(end / hop)), 1)
+    starts = np.arange(hops) * hop
+    per_hop = windowed_histograms(onsets, durations, pitches, np.r_[starts, starts[-1] + hop])
+    # Window histograms are sums of consecutive hop histograms, centred on
+    # each hop and clipped to the piece
+    span = max(int(round(window / hop)), 1)
+    padded = np.vstack([np.zeros((span // 2 + 1, 12)), per_hop, np.zeros((span - span // 2, 12))])
+    summed = np.cumsum(padded, axis=0)
+    window_histograms = summed[span:span + hops] - summed[:hops]
+
+    correlations = key_correlations(window_histograms)
+    silent = np.isnan(correlations).all(axis=1)
+    if silent.all():
+        return np.zeros(0, dtype=KEY_DTYPE)
+    best = np.where(silent, -1, np.argmax(np.nan_to_num(correlations, nan=-np.inf), axis=1))
+    # Silent hops keep the key that was sounding before them
+    sounding = np.flatnonzero(~silent)
+    carry = sounding[np.clip(np.searchsorted(sounding, np.arange(hops), side='right') - 1, 0, None)]
+    best = best[carry]
+    best = _merge_short_runs(best, min_hops)
+
+    changes = np.flatnonzero(np.r_[True, best[1:] != best[:-1]])
+    segments = np.zeros(len(changes), dtype=KEY_DTYPE)
+    segments['offset'] = starts[changes]
+    segments['tonic'] = best[changes] % 12
+    segments['mode'] = best[changes] // 12
+    # Confidence of each segment: correlation of its whole span's histogram
+    span_histograms = np.add.reduceat(per_hop, changes, axis=0)
+    segment_correlations = key_correlations(span_histograms)
+    segments['correlation'] = segment_correlations[np.arange(len(changes)), best[changes]]
+    return segments
+
+
+def estimate_keys(onsets, durations, pitches, track_modulations=False, **tracking):
+    """
+    Key segments for the score builder: the single best key at offset 0,
+    or, with track_modulations, the segments of track_keys (**tracking
+    are its window, hop and min_hops).
+    """
+    if track_modulations:
+        return track_keys(onsets, durations, pitches, **tracking)
+    record = estimate_key(pitches, durations)
+    return np.array([record] if record is not None else [], dtype=KEY_DTYPE)
+
+
+def format_keys(keys):
+    """One-line description, e.g. 'G major (r=0.87), D major from 32.0'"""
+    if not len(keys):
+        return "none"
+    parts = []
+    for record in keys:
+        name = f"{key_name(int(record['tonic']), int(record['mode'])).replace('-', 'b')} {MODES[record['mode']]}"
+        if record['offset']:
+            name += f" from {record['offset']:.1f}"
+        parts.append(f"{name} (r={record['correlation']:.2f})")
+    return ", ".join(parts)
+
+
+def make_key(record):
+    """music21 key.Key for a KEY_DTYPE record"""
+    from music21 import key
+
+    k = key.Key(key_name(int(record['tonic']), int(record['mode'])))
+    k.correlationCoefficient = float(record['correlation'])
+    return k
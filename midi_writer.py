@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+MIDI writer for measured scores
+
+score.write('midi') joins tied notes back together with Stream.stripTies,
+which only joins a tie between neighbours of the flattened part: in
+measures with voices the other voices' notes and rests fall in between,
+and a tied note is struck again at every barline it crosses. Here the
+notes are read with NoteTable.from_score, which joins ties by pitch, and
+written as flat parts, one note per sounding note, together with each
+part's instruments, metronome marks and key and time signatures.
+Unpitched notes are left out, as in the table.
+"""
+
+from music21 import duration, instrument, key, meter, note, stream, tempo
+from music21.common.numberTools import opFrac
+
+from note_table import NoteTable
+
+# Elements other than notes that the MIDI file keeps
+CONTEXT_CLASSES = (instrument.Instrument, tempo.MetronomeMark, key.KeySignature, meter.TimeSignature)
+
+
+def sounding_score(score):
+    """A flat copy of `score` for playback: tied noteheads joined into single notes"""
+    table = NoteTable.from_score(score)
+    out = stream.Score()
+    for part_id, part in enumerate(score.parts):
+        flat = stream.Part()
+        if part.partName:
+            flat.partName = part.partName
+        source = part.flatten()
+        for element in source.getElementsByClass(CONTEXT_CLASSES):
+            flat.coreInsert(source.elementOffset(element), element)
+        for onset, length, midi_pitch, velocity, _ in table.part(part_id).tolist():
+            n = note.Note(midi_pitch, duration=duration.Duration(opFrac(length)))
+            n.volume.velocity = velocity
+            flat.coreInsert(opFrac(onset), n)
+        flat.coreElementsChanged()
+        out.coreInsert(0.0, flat)
+    out.coreElementsChanged()
+    return out
+
+
+def write_midi(score, path):
+    """Write `score` to a MIDI file, tied notes played once"""
+    sounding_score(score).write('midi', fp=path)
+    return path
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Fast monophonic transcription for single-line instruments (violin, cello)
+
+Instead of the polyphonic basic-pitch model, a probabilistic YIN pitch
+tracker (the first stage of pYIN) runs on the decoded buffer:
+
+  1. the cumulative mean normalized difference function of every frame
+     is computed at once with FFTs (blocks of frames, bounded memory);
+  2. each of its troughs gets the probability that it is the first one
+     below a YIN threshold drawn from a beta distribution; their sum is
+     the frame's voicing probability, the likeliest trough its period;
+  3. notes are segmented on the frame arrays: the pitch, rounded and
+     median filtered, changes or an onset is detected; pieces shorter
+     than the minimum note length join the note before them.
+
+pYIN's HMM smoothing is replaced by the median filter and the minimum
+note length, which keeps everything vectorized. The note events have the
+transcription.transcribe format, so the score builder does not know
+which engine produced them. Chords come out as a single (usually the
+lowest or loudest) pitch: use basic-pitch for polyphonic material.
+"""
+
+import time
+import warnings
+
+import numpy as np
+
+from backends import TranscriptionBackend
+from transcription import MINIMUM_NOTE_LENGTH, ConversionCancelled, resample
+
+ENGINE_NAME = "monophonic"
+ENGINE_VERSION = 1
+
+# Pitch range searched: cello C2 to the top of the violin
+MIN_PITCH = 36   # C2, 65.4 Hz
+MAX_PITCH = 100  # E7, 2637 Hz
+
+# Rate the pitch tracker works at; WINDOW and HOP_LENGTH are samples at this rate
+SAMPLE_RATE = 22050
+
+# Samples compared by the difference function; frames are this plus the
+# longest period searched
+WINDOW = 1024
+HOP_LENGTH = 256  # same frame rate as basic-pitch
+# Frames analysed together (memory: frames x frame length)
+BLOCK_FRAMES = 2048
+
+# YIN thresholds are drawn from beta(2, 18) (mean 0.1), as in pYIN
+THRESHOLD_BETA = (2.0, 18.0)
+# Resolution of the tabulated threshold distribution
+THRESHOLD_STEPS = 1000
+# Frames whose voicing probability is below this are unvoiced
+VOICING_THRESHOLD = 0.5
+# Frames quieter than this (dB below the loudest) are unvoiced
+SILENCE_DB = 40.0
+# Onset peaks must rise this much above the local mean of the normalized
+# flux (librosa's default, 0.07, also fires on vibrato)
+ONSET_DELTA = 0.2
+# Median filter length (frames) applied to the pitch track
+MEDIAN_FRAMES = 5
+
+
+def midi_to_hz(midi):
+    return 440.0 * 2.0 ** ((np.asarray(midi, dtype=np.float64) - 69.0) / 12.0)
+
+
+def yin_pitch(y, sr, fmin=None, fmax=None, cancel_event=None):
+    """
+    (f0_hz, voiced_probability, rms, flux) per frame of HOP_LENGTH samples
+    (frames centered like librosa's). f0 is NaN where no trough was found;
+    flux is the log-magnitude spectral flux, an onset strength envelope.
+    """
+    from scipy import fft
+    from scipy.stats import beta
+
+    fmin = midi_to_hz(MIN_PITCH) if fmin is None else fmin
+    fmax = midi_to_hz(MAX_PITCH) if fmax is None else fmax
+    min_lag = max(int(np.floor(sr / fmax)), 2)
+    # A semitone of margin below fmin: vibrato and tuning go under it
+    max_lag = int(np.ceil(sr / fmin * 2 ** (1 / 12))) + 1
+    lags = np.arange(min_lag, max_lag + 1)
+    # Circular correlation of a frame with its first WINDOW samples is exact
+    # for lags up to frame_length - WINDOW: no zero padding needed
+    frame_length = fft.next_fast_len(WINDOW + max_lag + 1, real=True)
+    grid = np.linspace(0.0, 1.0, THRESHOLD_STEPS + 1)
+    threshold_cdf = beta.cdf(grid, *THRESHOLD_BETA).astype(np.float32)
+    hann = np.hanning(frame_length).astype(np.float32)
+
+    y = np.pad(np.asarray(y, dtype=np.float32), frame_length // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(y, frame_length)[::HOP_LENGTH]
+    n_frames = len(frames)
+    f0 = np.full(n_frames, np.nan)
+    voiced_probability = np.zeros(n_frames)
+    rms = np.zeros(n_frames)
+    flux = np.zeros(n_frames)
+    previous_log = None
+
+    for first in range(0, n_frames, BLOCK_FRAMES):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ConversionCancelled()
+        block = frames[first:first + BLOCK_FRAMES]
+        rows = np.arange(len(block))
+        # Difference function d(lag) = e(0) + e(lag) - 2 r(lag) over WINDOW samples
+        spectrum = fft.rfft(block, axis=1)
+        head = np.zeros_like(block)
+        head[:, :WINDOW] = block[:, :WINDOW]
+        acf = fft.irfft(spectrum * np.conj(fft.rfft(head, axis=1)), frame_length, axis=1)
+        energy = np.zeros((len(block), max_lag + WINDOW + 1), dtype=np.float32)
+        np.cumsum(block[:, :max_lag + WINDOW] ** 2, axis=1, out=energy[:, 1:])
+        difference = energy[:, WINDOW:WINDOW + 1] + energy[:, WINDOW:] - energy[:, :max_lag + 1] \
+            - 2 * acf[:, :max_lag + 1]
+        rms[first:first + len(block)] = np.sqrt(np.maximum(energy[:, WINDOW], 0) / WINDOW)
+
+        # Cumulative mean normalization
+        cumulative = np.cumsum(difference[:, 1:], axis=1)
+        searched = (difference[:, lags] * lags / np.maximum(cumulative[:, lags - 1], 1e-12)).clip(0.0, 1.0)
+
+        # Troughs: local minima of the searched lags
+        trough = np.zeros_like(searched, dtype=bool)
+        trough[:, 1:-1] = (searched[:, 1:-1] < searched[:, :-2]) & (searched[:, 1:-1] <= searched[:, 2:])
+        # A trough is picked by the thresholds between its value and the
+        # lowest earlier trough (higher thresholds pick an earlier one)
+        values = np.where(trough, searched, 1.0)
+        earlier = np.ones_like(values)
+        np.minimum.accumulate(values[:, :-1], axis=1, out=earlier[:, 1:])
+        cdf = np.interp(values, grid, threshold_cdf)
+        probability = np.where(trough, np.interp(earlier, grid, threshold_cdf) - cdf, 0.0).clip(0.0, None)
+
+        best = np.argmax(probability, axis=1)
+        found = probability[rows, best] > 0
+        # Parabolic interpolation of the trough
+        inner = np.clip(best, 1, len(lags) - 2)
+        left, middle, right = searched[rows, inner - 1], searched[rows, inner], searched[rows, inner + 1]
+        curvature = left - 2 * middle + right
+        shift = np.where(curvature > 0, 0.5 * (left - right) / np.where(curvature > 0, curvature, 1), 0.0)
+        period = lags[inner] + np.clip(shift, -1, 1)
+
+        f0[first:first + len(block)] = np.where(found, sr / period, np.nan)
+        voiced_probability[first:first + len(block)] = probability.sum(axis=1)
+
+        # Onset strength: rise of the log spectrum from the previous frame
+        log_magnitude = np.log1p(np.abs(fft.rfft(block * hann, axis=1)))
+        if previous_log is None:
+            previous_log = log_magnitude[:1]
+        rise = np.diff(np.concatenate([previous_log, log_magnitude]), axis=0)
+        flux[first:first + len(block)] = np.maximum(rise, 0).mean(axis=1)
+        previous_log = log_magnitude[-1:]
+
+    return f0, voiced_probability, rms, flux
+
+
+def _runs(values):
+    """(starts, ends) of the runs of equal consecutive values"""
+    change = np.flatnonzero(values[1:] != values[:-1]) + 1
+    return np.r_[0, change], np.r_[change, len(values)]
+
+
+def segment_notes(f0, voiced_probability, rms, onsets, sr, min_frames):
+    """
+    Note events from per-frame pitch tracks, see the module docstring.
+
+    onsets: frame indices where a new note may start on the same pitch.
+    """
+    n_frames = len(f0)
+    if not n_frames or rms.max() <= 0:
+        return []
+    loud = 20 * np.log10(np.maximum(rms, 1e-12) / rms.max()) > -SILENCE_DB
+    voiced = (voiced_probability >= VOICING_THRESHOLD) & loud & np.isfinite(f0)
+
+    midi = np.where(voiced, 69.0 + 12.0 * np.log2(np.where(voiced, f0, 440.0) / 440.0), np.nan)
+    # Median over the voiced frames of each window (octave blips, vibrato)
+    half = MEDIAN_FRAMES // 2
+    padded = np.pad(midi, half, constant_values=np.nan)
+    windows = np.lib.stride_tricks.sliding_window_view(padded, MEDIAN_FRAMES)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # all-NaN windows
+        smoothed = np.nanmedian(np.where(voiced[:, None], windows, np.nan), axis=1) if voiced.any() else midi
+    pitch = np.where(voiced, np.round(smoothed), 0).astype(np.int64)
+
+    # Pieces shorter than min_frames take the pitch of the piece before
+    # them in the same voiced run (or after, at the start of a run)
+    label = pitch.copy()
+    starts, ends = _runs(label)
+    short = (ends - starts < min_frames) & (label[starts] > 0)
+    if short.any():
+        keep = np.repeat(~short, ends - starts) | (label == 0)
+        index = np.where(keep, np.arange(n_frames), -1)
+        previous = np.maximum.accumulate(index)
+        following = np.minimum.accumulate(np.where(keep, np.arange(n_frames), n_frames)[::-1])[::-1]
+        fill = np.where(previous >= 0, label[np.maximum(previous, 0)], 0)
+        fill = np.where(fill > 0, fill, np.where(following < n_frames, label[np.minimum(following, n_frames - 1)], 0))
+        label = np.where(keep, label, fill)
+        label = np.where(voiced, label, 0)
+
+    # Notes: runs of one pitch, split again at onsets at least min_frames
+    # inside the run (onsets near a pitch change belong to that change)
+    boundary = np.zeros(n_frames, dtype=bool)
+    boundary[0] = True
+    boundary[1:] = label[1:] != label[:-1]
+    changes = np.r_[np.flatnonzero(boundary), n_frames]
+    onsets = np.asarray(onsets, dtype=np.intp)
+    onsets = onsets[(onsets > 0) & (onsets < n_frames)]
+    following = np.searchsorted(changes, onsets, side='right')
+    inside = (onsets - changes[following - 1] >= min_frames) & (changes[following] - onsets >= min_frames)
+    boundary[onsets[inside]] = True
+    starts = np.flatnonzero(boundary)
+    ends = np.r_[starts[1:], n_frames]
+    notes = (label[starts] > 0) & (ends - starts >= min_frames)
+    starts, ends = starts[notes], ends[notes]
+    if not len(starts):
+        return []
+
+    # Mean level over each note's own frames
+    cumulative = np.r_[0.0, np.cumsum(rms)]
+    level = (cumulative[ends] - cumulative[starts]) / (ends - starts)
+    amplitude = np.clip(level / rms.max(), 0.0, 1.0)
+    seconds = HOP_LENGTH / sr
+    return [(float(s * seconds), float(e * seconds), int(p), float(a), None)
+            for s, e, p, a in zip(starts, ends, label[starts], amplitude)]
+
+
+def transcribe_monophonic(y, sr, minimum_note_length=MINIMUM_NOTE_LENGTH,
+                          fmin=None, fmax=None, timings=None, cancel_event=None):
+    """
+    Note events of a single-line recording, in the transcription.transcribe
+    format (pitch_bends is None).
+
+    fmin/fmax (Hz) narrow the searched range, MIN_PITCH-MAX_PITCH by default.
+    """
+    import librosa
+
+    y = resample(y, sr, SAMPLE_RATE, timings)
+    start = time.perf_counter()
+    f0, voiced_probability, rms, flux = yin_pitch(y, SAMPLE_RATE, fmin, fmax, cancel_event)
+    onsets = librosa.onset.onset_detect(onset_envelope=flux, sr=SAMPLE_RATE, hop_length=HOP_LENGTH,
+                                        delta=ONSET_DELTA)
+    if timings is not None:
+        timings['pitch_tracking'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    min_frames = max(int(round(minimum_note_length / 1000 * SAMPLE_RATE / HOP_LENGTH)), 1)
+    note_events = segment_notes(f0, voiced_probability, rms, onsets, SAMPLE_RATE, min_frames)
+    if timings is not None:
+        timings['note_decoding'] = time.perf_counter() - start
+    return note_events
+
+
+class MonophonicSession(TranscriptionBackend):
+    """
+    Transcription backend using transcribe_monophonic, a drop-in for
+    transcription.ModelSession: there is no model to load.
+    """
+
+    name = ENGINE_NAME
+    version_number = ENGINE_VERSION
+    sample_rate = SAMPLE_RATE
+
+    def __init__(self, fmin=None, fmax=None):
+        super().__init__()
+        self.fmin = fmin
+        self.fmax = fmax
+
+    @property
+    def version(self):
+        low = self.fmin or midi_to_hz(MIN_PITCH)
+        high = self.fmax or midi_to_hz(MAX_PITCH)
+        return f"{super().version} {low:.1f}-{high:.1f}Hz"
+
+    def transcribe_notes(self, y, sr, timings=None, cancel_event=None,
+                         minimum_note_length=MINIMUM_NOTE_LENGTH, **params):
+        return transcribe_monophonic(y, sr, minimum_note_length, self.fmin, self.fmax,
+                                     timings, cancel_event)
+
+
+_default_session = None
+
+
+def get_monophonic_session():
+    """The per-process MonophonicSession, like transcription.get_session"""
+    global _default_session
+    if _default_session is None:
+        _default_session = MonophonicSession()
+    return _default_session
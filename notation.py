@@ -0,0 +1,430 @@
+#!/usr/bin/env python3
+"""
+Notation computed once on note arrays: measures, voices, ties, rests, beams
+
+score.write('musicxml') turns the parts it is given into notation every
+time it is called (Score.makeNotation on a copy: accidentals, ties at
+barlines, tuplets, beams; then rests, splitAtDurations and a last fixup
+pass), and every format written pays for it again. notate_part does that
+work once, while the score is built, on the integer tick positions of the
+quantized notes and chords:
+
+  1. layout: every note or chord is cut at the barlines and into lengths
+     a single notehead can show, the pieces tied together; pieces that
+     overlap within a measure go to separate voices, as makeVoices places
+     them, and the gaps of every voice become rests;
+  2. beams: the beaming TimeSignature.getBeams computes, on the pieces'
+     offsets and beam counts instead of Beams objects;
+  3. the measures and voices are created with their final content, the
+     accidentals and tuplet brackets set once with music21's helpers, and
+     the part flagged (streamStatus) as notated.
+
+is_notated tells the exporters that a score was built this way: MusicXML,
+PDF and PNG are then written with makeNotation=False, and MIDI from the
+same measured parts.
+"""
+
+from bisect import bisect_right
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from music21 import bar, beam, clef, duration, meter, note, stream, tie
+from music21.common.numberTools import opFrac
+from music21.stream import makeNotation
+
+# The meter makeMeasures uses when a stream has none
+TIME_SIGNATURE = '4/4'
+
+# Tie of a notehead: none, or where it falls in its run of tied pieces
+TIE_TYPES = (None, 'start', 'continue', 'stop')
+
+LAYOUT_DTYPE = np.dtype([
+    ('group', 'i8'),    # note or chord index, -1 for a rest
+    ('measure', 'i8'),  # from 0
+    ('voice', 'i8'),    # from 0, within the measure
+    ('start', 'i8'),    # ticks from the start of the part
+    ('length', 'i8'),   # ticks
+    ('tie', 'i1'),      # index into TIE_TYPES
+])
+
+# Lengths a single notehead shows, in quarter notes: whole to 64th, plain,
+# dotted and as eighth-note-style triplets, longest first
+_PLAIN = [Fraction(4, 2 ** k) for k in range(7)]
+NOTEHEAD_LENGTHS = tuple(sorted({*_PLAIN, *(q * 3 / 2 for q in _PLAIN), *(q * 2 / 3 for q in _PLAIN)},
+                                reverse=True))
+
+
+def tick_resolution(values):
+    """Ticks per quarter note that put every quarterLength in `values` on an integer"""
+    denominators = [Fraction(opFrac(v)).denominator for v in np.unique(values).tolist()]
+    return int(np.lcm.reduce(denominators + [1]))
+
+
+@lru_cache(maxsize=None)
+def notatable_lengths(quarter_length):
+    """
+    The tied lengths a note of `quarter_length` is written with, longest
+    first: itself when one notehead can show it (plain, dotted or a
+    triplet), else the longest notehead lengths on its own grid, e.g. 2.5
+    as 2 + 0.5 and 5/12 as 1/3 + 1/12 instead of music21's 6:5 eighth.
+    Other lengths are split into music21's duration components, as
+    splitAtDurations does.
+    """
+    d = duration.Duration(quarter_length)
+    if d.type != 'complex' and all((t.numberNotesActual, t.numberNotesNormal) == (3, 2)
+                                   for t in d.tuplets):
+        return (quarter_length,)
+    left = Fraction(quarter_length)
+    unit = Fraction(1, left.denominator)
+    pieces = []
+    while left:
+        piece = next((q for q in NOTEHEAD_LENGTHS if q <= left and ((left - q) / unit).denominator == 1),
+                     None)
+        if piece is None:
+            break
+        pieces.append(opFrac(piece))
+        left -= piece
+    if not left:
+        return tuple(pieces)
+    if d.type != 'complex':
+        return (quarter_length,)
+    multiplier = d.aggregateTupletMultiplier()
+    return tuple(opFrac(c.quarterLength * multiplier) for c in d.components)
+
+
+def assign_voices(measures, starts, ends):
+    """
+    Voice of every piece, as Measure.makeVoices assigns them: pieces (cut
+    at the barlines, sorted by start) go to the first voice of their
+    measure that is free when they start. Only measures where pieces
+    overlap are walked piece by piece; elsewhere every piece is voice 0.
+    """
+    voices = np.zeros(len(starts), dtype=np.int64)
+    if len(starts) < 2:
+        return voices
+    # A piece overlaps an earlier one if it starts before all of them have
+    # ended; pieces never cross a barline, so no reset between measures
+    reach = np.maximum.accumulate(ends)
+    overlapping = np.unique(measures[1:][starts[1:] < reach[:-1]])
+    for m in overlapping.tolist():
+        first, last = np.searchsorted(measures, [m, m + 1])
+        free = []  # end of each voice so far
+        for i in range(first, last):
+            for v, end in enumerate(free):
+                if end <= starts[i]:
+                    break
+            else:
+                v = len(free)
+                free.append(0)
+            free[v] = ends[i]
+            voices[i] = v
+    return voices
+
+
+def _split(starts, ends, ticks):
+    """Cut spans into notatable lengths: (index of its span, start, length) of every notehead"""
+    lengths = ends - starts
+    unique, inverse = np.unique(lengths, return_inverse=True)
+    splits = [[int(q * ticks) for q in notatable_lengths(opFrac(Fraction(int(k), ticks)))]
+              for k in unique.tolist()]
+    counts = np.array([len(s) for s in splits], dtype=np.int64)[inverse]
+    flat = np.concatenate([np.array(s, dtype=np.int64) for s in splits] + [np.zeros(0, np.int64)])
+    offsets = np.cumsum([0] + [len(s) for s in splits])[:-1]
+    span = np.repeat(np.arange(len(lengths)), counts)
+    within = np.arange(len(span)) - np.repeat(np.cumsum(counts) - counts, counts)
+    piece = flat[offsets[inverse][span] + within]
+    before = np.cumsum(piece) - piece
+    before -= np.repeat(before[np.cumsum(counts) - counts], counts)
+    return span, starts[span] + before, piece
+
+
+def layout(onsets, ends, ticks, bar_ticks, n_measures=None):
+    """
+    Noteheads and rests of a part, as a LAYOUT_DTYPE array sorted by
+    measure, voice and start.
+
+    onsets, ends: integer ticks of every note or chord, sorted by onset
+    ticks, bar_ticks: ticks per quarter note and per measure
+    n_measures: measures to fill, at least those the notes reach
+    """
+    onsets = np.asarray(onsets, dtype=np.int64)
+    ends = np.maximum(np.asarray(ends, dtype=np.int64), onsets + 1)
+    ticks_reached = int(ends.max()) if len(ends) else 0
+    n_measures = max(n_measures or 1, -(-ticks_reached // bar_ticks))
+
+    # Cut at the barlines
+    first = onsets // bar_ticks
+    counts = (ends - 1) // bar_ticks - first + 1
+    group = np.repeat(np.arange(len(onsets)), counts)
+    measure = first[group] + np.arange(len(group)) - np.repeat(np.cumsum(counts) - counts, counts)
+    start = np.maximum(onsets[group], measure * bar_ticks)
+    end = np.minimum(ends[group], (measure + 1) * bar_ticks)
+    order = np.argsort(start, kind='stable')
+    group, measure, start, end = group[order], measure[order], start[order], end[order]
+    voice = assign_voices(measure, start, end)
+
+    # Rests: the gaps of every voice, and the measures without notes
+    order = np.lexsort((start, voice, measure))
+    group, measure, voice, start, end = group[order], measure[order], voice[order], start[order], end[order]
+    key = measure * (int(voice.max()) + 1 if len(voice) else 1) + voice
+    opens = np.ones(len(key), dtype=bool)
+    opens[1:] = key[1:] != key[:-1]
+    closes = np.append(opens[1:], True) if len(key) else opens
+    previous_end = np.where(opens, measure * bar_ticks, np.roll(end, 1))
+    gap = start > previous_end
+    bar_end = (measure + 1) * bar_ticks
+    tail = closes & (end < bar_end)
+    empty = np.setdiff1d(np.arange(n_measures), measure)
+    rest_measure = np.concatenate([measure[gap], measure[tail], empty])
+    rest_voice = np.concatenate([voice[gap], voice[tail], np.zeros(len(empty), dtype=np.int64)])
+    rest_start = np.concatenate([previous_end[gap], end[tail], empty * bar_ticks])
+    rest_end = np.concatenate([start[gap], bar_end[tail], (empty + 1) * bar_ticks])
+
+    group = np.concatenate([group, np.full(len(rest_measure), -1)])
+    measure = np.concatenate([measure, rest_measure])
+    voice = np.concatenate([voice, rest_voice])
+    span, piece_start, piece_length = _split(np.concatenate([start, rest_start]),
+                                             np.concatenate([end, rest_end]), ticks)
+    rows = np.zeros(len(span), dtype=LAYOUT_DTYPE)
+    rows['group'], rows['measure'], rows['voice'] = group[span], measure[span], voice[span]
+    rows['start'], rows['length'] = piece_start, piece_length
+
+    # Ties: first, middle and last noteheads of every note or chord
+    notes = np.flatnonzero(rows['group'] >= 0)
+    notes = notes[np.lexsort((rows['start'][notes], rows['group'][notes]))]
+    g = rows['group'][notes]
+    starts_run = np.ones(len(g), dtype=bool)
+    starts_run[1:] = g[1:] != g[:-1]
+    ends_run = np.append(starts_run[1:], True) if len(g) else starts_run
+    rows['tie'][notes] = np.select([starts_run & ends_run, starts_run, ends_run], [0, 1, 3], 2)
+    return rows[np.lexsort((rows['start'], rows['voice'], rows['measure']))]
+
+
+def beam_spans(time_signature, ticks):
+    """Per beam level, the ticks where the meter's beam groups start, then the bar's end"""
+    beam_sequence = meter.TimeSignature(time_signature).beamSequence
+    spans = []
+    for depth in range(len(beam.beamableDurationTypes)):
+        level = beam_sequence.getLevel(depth)
+        lengths = [opFrac(part.duration.quarterLength * ticks) for part in level]
+        spans.append([int(x) for x in np.cumsum([0] + lengths)])
+    return spans
+
+
+def beam_types(starts, ends, counts, spans):
+    """
+    Beams of a measure's (or voice's) notes and rests, as
+    TimeSignature.getBeams sets them for a full measure: per element None
+    or the type of each of its beams ('start', 'continue', 'stop',
+    'partial-left', 'partial-right'), eighth-note beam first.
+
+    starts, ends: offsets in the measure; counts: beams each element's
+    note value has, 0 for rests and quarter notes or longer; spans: see
+    beam_spans.
+    """
+    n = len(counts)
+    if n <= 1:
+        return [None] * n
+    beams = [[None] * c if c else None for c in counts]
+    # Beamable elements without a beamable neighbour on either side
+    previous = None
+    for i in range(n):
+        following = beams[i + 1] if i < n - 1 else None
+        if previous is None and following is None:
+            beams[i] = None
+        previous = beams[i]
+
+    for depth in range(max(counts)):
+        bounds = spans[depth]
+        for i in range(n):
+            own = beams[i]
+            if own is None or depth >= len(own):
+                continue
+            start, end = starts[i], ends[i]
+            before = beams[i - 1] if i else None
+            after = beams[i + 1] if i < n - 1 else None
+            before_has = before is not None and depth < len(before)
+            after_has = after is not None and depth < len(after)
+            k = bisect_right(bounds, start) - 1
+            span_start, span_end = bounds[k], bounds[k + 1]
+            # A value that fills its beat (or beat part) alone is not beamed
+            if end == span_end and (start == span_start or (before is None and depth == 0)):
+                beams[i] = None
+                continue
+            if i == 0:
+                kind = 'start' if after_has else 'partial-right'
+            elif i == n - 1:
+                kind = 'stop' if before_has else 'partial-left'
+            elif not before_has:
+                if after is None and depth == 0:
+                    beams[i] = None
+                    continue
+                if after is None or end >= span_end:
+                    kind = 'partial-left'
+                elif not after_has:
+                    kind = 'partial-right'
+                else:
+                    kind = 'start'
+            elif before[depth] in ('stop', 'partial-left'):
+                if after is None:
+                    kind = 'partial-left'
+                else:
+                    kind = 'start' if after_has else 'partial-right'
+            elif not after_has or end >= span_end:
+                kind = 'stop'
+            else:
+                kind = 'continue'
+            own[depth] = kind
+
+    # Beams.sanitizePartialBeams
+    for i, own in enumerate(beams):
+        if own is None:
+            continue
+        if not {'start', 'stop', 'continue'} & set(own):
+            beams[i] = None
+            continue
+        has_start = has_stop = False
+        for depth, kind in enumerate(own):
+            if kind == 'start':
+                has_start = True
+            elif kind == 'stop':
+                has_stop = True
+            elif has_start and kind == 'partial-left':
+                own[depth] = 'partial-right'
+            elif has_stop and kind == 'partial-right':
+                own[depth] = 'partial-left'
+
+    # Beams.mergeConnectingPartialBeams
+    for own, after in zip(beams[:-1], beams[1:]):
+        if not own or not after:
+            continue
+        for depth, kind in enumerate(own):
+            if kind != 'partial-right' or depth >= len(after):
+                continue
+            if after[depth] in ('partial-right', 'continue', 'stop'):
+                continue
+            own[depth] = 'start'
+            after[depth] = 'stop' if after[depth] == 'partial-left' else 'continue'
+    for own, before in zip(beams[1:], beams[:-1]):
+        if not own or not before:
+            continue
+        for depth, kind in enumerate(own):
+            if kind == 'partial-left' and depth < len(before) and before[depth] == 'stop':
+                own[depth] = 'stop'
+                before[depth] = 'continue'
+    return beams
+
+
+def best_clef(diatonic_note_numbers):
+    """clef.bestClef from the pitches' diatonic note numbers (all noteheads, tied pieces included)"""
+    heights = np.asarray(diatonic_note_numbers, dtype=np.float64)
+    heights = heights + np.where(heights > 33, 3, 0) - np.where(heights < 24, 3, 0)
+    average = heights.mean() if len(heights) else 29.0
+    if average > 49:
+        return clef.Treble8vaClef()
+    if average > 28:
+        return clef.TrebleClef()
+    if average > 10:
+        return clef.BassClef()
+    return clef.Bass8vbClef()
+
+
+def notate_part(part, onsets, ends, make_elements, extras=(), time_signature=TIME_SIGNATURE):
+    """
+    Fill `part` with measures holding the notes and chords whose onsets
+    and ends (quarter notes, sorted by onset) are given, fully notated.
+
+    make_elements(groups): a new note.Note or chord.Chord, without
+        duration, for each note or chord index in the array `groups`;
+        called once, for every notehead
+    extras: (offset, element) pairs placed in the measure at their offset,
+        e.g. key signatures and metronome marks
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    extras = [(opFrac(offset), element) for offset, element in extras]
+    ts = meter.TimeSignature(time_signature)
+    bar_length = opFrac(ts.barDuration.quarterLength)
+    ticks = tick_resolution(np.concatenate([onsets, ends, [bar_length]]))
+    bar_ticks = int(bar_length * ticks)
+    last_extra = max((offset for offset, _ in extras), default=0)
+    rows = layout(np.rint(onsets * ticks), np.rint(ends * ticks), ticks, bar_ticks,
+                  n_measures=int(last_extra // bar_length) + 1)
+    n_measures = int(rows['measure'].max()) + 1
+
+    in_measure = rows['start'] - rows['measure'] * bar_ticks
+    times = np.unique(np.concatenate([in_measure, rows['length']]))
+    quarters = {k: opFrac(Fraction(k, ticks)) for k in times.tolist()}
+    is_note = rows['group'] >= 0
+    made = iter(make_elements(rows['group'][is_note]))
+    elements = [next(made) if n else note.Rest() for n in is_note.tolist()]
+    diatonic = []
+    for el, length, tie_type in zip(elements, rows['length'].tolist(), rows['tie'].tolist()):
+        el.duration = duration.Duration(quarters[length])
+        if el.isRest:
+            el.fullMeasure = length == bar_ticks
+            continue
+        if tie_type:
+            el.tie = tie.Tie(TIE_TYPES[tie_type])
+        diatonic.extend(p.diatonicNoteNum for p in el.pitches)
+
+    # Beams, one measure or voice at a time
+    beam_counts = {k: beam.beamableDurationTypes.index(d.type) + 1
+                   if (d := duration.Duration(quarters[k])).type in beam.beamableDurationTypes else 0
+                   for k in np.unique(rows['length']).tolist()}
+    spans = beam_spans(time_signature, ticks)
+    key = rows['measure'] * (int(rows['voice'].max()) + 1) + rows['voice']
+    bounds = np.flatnonzero(np.diff(key, prepend=-1, append=-1))
+    n_voices = np.zeros(n_measures, dtype=np.int64)
+    np.maximum.at(n_voices, rows['measure'], rows['voice'] + 1)
+    measures = [stream.Measure(number=i + 1) for i in range(n_measures)]
+    for first, last in zip(bounds[:-1].tolist(), bounds[1:].tolist()):
+        starts = in_measure[first:last].tolist()
+        lengths = rows['length'][first:last].tolist()
+        counts = [beam_counts[k] if n else 0 for k, n in zip(lengths, is_note[first:last].tolist())]
+        types = beam_types(starts, [s + k for s, k in zip(starts, lengths)], counts, spans)
+        m = int(rows['measure'][first])
+        if n_voices[m] > 1:
+            container = stream.Voice()
+            measures[m].coreInsert(0.0, container)
+        else:
+            container = measures[m]
+        for el, at, kinds in zip(elements[first:last], starts, types):
+            if kinds is not None:
+                el.beams = beam.Beams()
+                el.beams.fill(len(kinds))
+                for number, kind in enumerate(kinds, start=1):
+                    el.beams.setByNumber(number, kind)
+            container.coreInsert(quarters[at], el)
+        if container is not measures[m]:
+            container.coreElementsChanged()
+        makeNotation.makeTupletBrackets(container, inPlace=True)
+
+    measures[0].coreInsert(0.0, best_clef(diatonic))
+    measures[0].coreInsert(0.0, ts)
+    for offset, element in extras:
+        m = min(int(offset // bar_length), n_measures - 1)
+        measures[m].coreInsert(opFrac(offset - m * bar_length), element)
+    measures[-1].rightBarline = bar.Barline('final')
+    for i, m in enumerate(measures):
+        m.coreElementsChanged()
+        part.coreInsert(opFrac(i * bar_length), m)
+    part.coreElementsChanged()
+
+    makeNotation.makeAccidentalsInMeasureStream(part)
+    part.streamStatus.beams = True
+    part.streamStatus.tuplets = True
+    return part
+
+
+def is_notated(score):
+    """
+    Whether every part of `score` was built by notate_part: measured,
+    accidentals, beams and tuplet brackets made, so that exports can
+    skip music21's makeNotation.
+    """
+    parts = list(score.parts)
+    return bool(parts) and all(
+        p.streamStatus.accidentals and p.streamStatus.beams and p.streamStatus.tuplets
+        and p.hasMeasures() for p in parts)
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Note decoding of basic-pitch activations with NumPy array operations
+
+basic-pitch's note_creation turns the model's note, onset and contour
+activations into note events with Python loops over frames: every note
+is tracked one frame at a time, and the "melodia trick" (notes grown
+from the strongest leftover frame activation) looks for that activation
+with an argmax over the whole (frames, 88) matrix once per note, which
+grows with the square of the recording's length. This decoder gives the
+same note events, in the same order, with:
+
+  1. onset peak picking on the whole onset matrix at once (inferred
+     onsets from frame differences, local maxima in time, threshold);
+  2. note tracking that finds where a note ends, the first run of
+     ENERGY_TOLERANCE frames below the frame threshold, with a search
+     over array chunks of the pitch's activations instead of a loop
+     over frames;
+  3. the melodia trick ("merging" the leftover energy into notes) run
+     over the leftover activations sorted once by strength: picking the
+     strongest one left is skipping those already used, not an argmax;
+  4. pitch bends and frame times gathered for all notes at once.
+
+Notes are still taken one after the other: each one clears the energy
+around it, which decides where the following ones start and end. The
+work per note is a few array operations on its own frames, so decoding
+grows linearly with the length of the recording.
+"""
+
+import numpy as np
+
+# basic-pitch's note_creation constants
+MIDI_OFFSET = 21
+# Frames below the frame threshold that end a note
+ENERGY_TOLERANCE = 11
+# Inferred onsets: frame differences over 1..N frames
+ONSET_DIFFERENCES = 2
+# Contour bins either side of a note's pitch searched for its pitch bend
+BEND_TOLERANCE = 25
+# Frames searched for a note's end at first; doubled until found
+SEARCH_FRAMES = 64
+# Note frames whose pitch bends are computed together (memory: x 51 bins)
+BEND_BLOCK_FRAMES = 16384
+
+
+def inferred_onsets(onsets, frames, n_diff=ONSET_DIFFERENCES):
+    """
+    The onset activations or, where larger, the rises of the frame
+    activations over 1..n_diff frames (scaled to the largest onset)
+    """
+    frames = frames.astype(np.float64)
+    diff = None
+    for n in range(1, n_diff + 1):
+        # Rise over n frames, from silence before the first frame
+        rise = frames.copy()
+        rise[n:] -= frames[:-n]
+        diff = rise if diff is None else np.minimum(diff, rise)
+    diff[diff < 0] = 0
+    diff[:n_diff] = 0
+    with np.errstate(invalid='ignore'):
+        # No rise at all (silence): NaN, no onsets, as in basic-pitch
+        diff = np.max(onsets) * diff / np.max(diff)
+    return np.maximum(onsets, diff)
+
+
+def onset_peaks(onsets, onset_threshold):
+    """
+    (frame, pitch index) arrays of the onset activations that are a local
+    maximum in time and reach onset_threshold, latest frame (and highest
+    pitch) first: the order note tracking visits them
+    """
+    peak = np.zeros(onsets.shape, dtype=bool)
+    peak[1:-1] = (onsets[1:-1] > onsets[:-2]) & (onsets[1:-1] > onsets[2:])
+    frame_idx, freq_idx = np.nonzero(np.where(peak, onsets, 0) >= onset_threshold)
+    return frame_idx[::-1], freq_idx[::-1]
+
+
+def quiet_from(energy, start, frame_threshold, energy_tol=ENERGY_TOLERANCE):
+    """
+    First frame r >= start such that energy[r:r + energy_tol] is below
+    frame_threshold, frames from len(energy) - 1 on counting as below
+    (basic-pitch never looks at the last frame): where a note tracked
+    from `start` ends
+    """
+    limit = len(energy) - 1
+    pos, run, span = start, 0, SEARCH_FRAMES
+    while pos < limit:
+        stop = min(pos + span, limit)
+        below = energy[pos:stop] < frame_threshold
+        index = np.arange(stop - pos)
+        # Length of the run of below-threshold frames ending at each frame
+        last_above = np.maximum.accumulate(np.where(below, -1 - run, index))
+        lengths = index - last_above
+        hit = np.flatnonzero(lengths >= energy_tol)
+        if hit.size:
+            return pos + int(hit[0]) - energy_tol + 1
+        run = int(lengths[-1])
+        pos, span = stop, span * 2
+    return pos - run
+
+
+def _clear(energy, freq_idx, start, end):
+    """Zero a note's frames [start, end) at its pitch and both neighbours"""
+    energy[max(freq_idx - 1, 0):freq_idx + 2, start:end] = 0
+
+
+def track_notes(frames, onsets, onset_threshold, frame_threshold, min_note_len,
+                infer_onsets=True, melodia_trick=True, energy_tol=ENERGY_TOLERANCE):
+    """
+    (start_frame, end_frame, pitch_midi, amplitude) note tuples, as
+    basic_pitch.note_creation.output_to_notes_polyphonic returns them
+    """
+    n_frames = frames.shape[0]
+    if infer_onsets:
+        onsets = inferred_onsets(onsets, frames)
+    # Pitch-major copy: each pitch's frames are contiguous
+    remaining = np.array(frames, dtype=np.float64).T.copy()
+
+    note_events = []
+    for start, freq_idx in zip(*(a.tolist() for a in onset_peaks(onsets, onset_threshold))):
+        if start >= n_frames - 1:
+            continue
+        end = quiet_from(remaining[freq_idx], start + 1, frame_threshold, energy_tol)
+        if end - start <= min_note_len:
+            continue
+        _clear(remaining, freq_idx, start, end)
+        note_events.append((start, end, freq_idx + MIDI_OFFSET, np.mean(frames[start:end, freq_idx])))
+
+    if not melodia_trick:
+        return note_events
+
+    # Leftover activations, strongest first; ties in frame-major order, as
+    # np.argmax over the (frames, pitches) matrix would take them
+    freq_left, frame_left = np.nonzero(remaining > frame_threshold)
+    strength = remaining[freq_left, frame_left]
+    order = np.lexsort((frame_left * frames.shape[1] + freq_left, -strength))
+    for i_mid, freq_idx in zip(frame_left[order].tolist(), freq_left[order].tolist()):
+        energy = remaining[freq_idx]
+        if energy[i_mid] <= frame_threshold:
+            continue  # cleared by an earlier note
+        energy[i_mid] = 0
+
+        # Forward to the first quiet run, backward (on the reversed frames) likewise
+        forward = quiet_from(energy, i_mid + 1, frame_threshold, energy_tol)
+        backward = quiet_from(energy[::-1], n_frames - i_mid, frame_threshold, energy_tol)
+        i_end = forward - 1
+        i_start = n_frames - backward
+        _clear(remaining, freq_idx, i_mid + 1, min(forward + energy_tol, n_frames - 1))
+        _clear(remaining, freq_idx, max(i_start - 1 - energy_tol, 0) + 1, i_mid)
+
+        if i_end - i_start <= min_note_len:
+            continue
+        note_events.append((i_start, i_end, freq_idx + MIDI_OFFSET, np.mean(frames[i_start:i_end, freq_idx])))
+
+    return note_events
+
+
+def pitch_bends(contours, starts, ends, pitches, n_bins_tolerance=BEND_TOLERANCE):
+    """
+    Per note, its pitch bend in every frame (1/3 semitone steps, as
+    basic_pitch.note_creation.get_pitch_bends): the strongest contour bin
+    near its pitch, weighted by a Gaussian around it
+    """
+    from basic_pitch.note_creation import midi_pitch_to_contour_bin
+    from scipy.signal.windows import gaussian
+
+    n_bins = contours.shape[1]
+    offsets = np.arange(-n_bins_tolerance, n_bins_tolerance + 1)
+    weights = gaussian(len(offsets), std=5)
+    centre = np.round(midi_pitch_to_contour_bin(np.asarray(pitches))).astype(np.int64)
+    lengths = np.asarray(ends) - np.asarray(starts)
+
+    bends = []
+    first = 0
+    while first < len(lengths):
+        # Notes of this block: at least one, at most BEND_BLOCK_FRAMES frames
+        last = first + max(int(np.searchsorted(np.cumsum(lengths[first:]), BEND_BLOCK_FRAMES, 'right')), 1)
+        block = lengths[first:last]
+        rows = np.repeat(np.asarray(starts[first:last]) - np.cumsum(block) + block, block) + np.arange(block.sum())
+        bins = np.repeat(centre[first:last], block)[:, None] + offsets
+        inside = (bins >= 0) & (bins < n_bins)
+        weighted = contours[rows[:, None], np.clip(bins, 0, n_bins - 1)] * weights
+        # Outside the contour range: below any real (non-negative) bin
+        weighted[~inside] = -1
+        steps = np.argmax(weighted, axis=1) - n_bins_tolerance
+        bends += [list(b) for b in np.split(steps, np.cumsum(block)[:-1])]
+        first = last
+    return bends
+
+
+def model_output_to_notes(output, onset_thresh, frame_thresh, infer_onsets=True, min_note_len=11,
+                          min_freq=None, max_freq=None, include_pitch_bends=True,
+                          multiple_pitch_bends=False, melodia_trick=True, midi_tempo=120):
+    """
+    (midi, note_events) from the model's activations, with the arguments
+    and results of basic_pitch.note_creation.model_output_to_notes
+    """
+    import librosa
+    from basic_pitch.note_creation import model_frames_to_time, note_events_to_midi
+
+    frames, onsets, contours = output['note'], output['onset'], output['contour']
+    if min_freq is not None or max_freq is not None:
+        frames, onsets = np.array(frames), np.array(onsets)
+        if max_freq is not None:
+            max_freq_idx = int(np.round(librosa.hz_to_midi(max_freq) - MIDI_OFFSET))
+            onsets[:, max_freq_idx:] = 0
+            frames[:, max_freq_idx:] = 0
+        if min_freq is not None:
+            min_freq_idx = int(np.round(librosa.hz_to_midi(min_freq) - MIDI_OFFSET))
+            onsets[:, :min_freq_idx] = 0
+            frames[:, :min_freq_idx] = 0
+
+    notes = track_notes(frames, onsets, onset_thresh, frame_thresh, min_note_len,
+                        infer_onsets=infer_onsets, melodia_trick=melodia_trick)
+    starts = np.array([n[0] for n in notes], dtype=np.int64)
+    ends = np.array([n[1] for n in notes], dtype=np.int64)
+    pitches = np.array([n[2] for n in notes], dtype=np.int64)
+    if include_pitch_bends:
+        bends = pitch_bends(contours, starts, ends, pitches)
+    else:
+        bends = [None] * len(notes)
+
+    times_s = model_frames_to_time(contours.shape[0])
+    note_events = list(zip(times_s[starts], times_s[ends], pitches, [n[3] for n in notes], bends))
+    return note_events_to_midi(note_events, multiple_pitch_bends, midi_tempo), note_events
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Array-backed note table for score analysis
+
+A NoteTable holds one row per sounding note (chord members get a row
+each, tied notes are joined into one) in a NumPy structured array: onset
+and duration in quarter notes, MIDI pitch, velocity and part id. It is
+built once, from a music21 score or straight from a MIDI file, and
+counts, ranges, unique pitches and per-part statistics are then
+vectorized queries instead of walks over music21 objects.
+
+Unpitched notes (percussion parts, MIDI channel 10) are left out, so a
+part with no pitched notes has no rows.
+"""
+
+import numpy as np
+
+NOTE_DTYPE = np.dtype([
+    ('onset', 'f8'),     # quarter notes from the start of the score
+    ('duration', 'f8'),  # quarter notes
+    ('pitch', 'i1'),     # MIDI note number
+    ('velocity', 'i1'),
+    ('part', 'i2'),      # index in score.parts
+])
+
+DEFAULT_VELOCITY = 64
+
+# MIDI channel reserved for percussion (1-based, as music21 numbers them)
+PERCUSSION_CHANNEL = 10
+
+# Pitch spelling used by music21 for a bare MIDI number
+PITCH_NAMES = ('C', 'C#', 'D', 'E-', 'E', 'F', 'F#', 'G', 'G#', 'A', 'B-', 'B')
+
+PART_STATS_DTYPE = np.dtype([
+    ('part', 'i2'),
+    ('notes', 'i8'),
+    ('lowest', 'i1'),
+    ('highest', 'i1'),
+    ('unique_pitches', 'i2'),
+    ('end', 'f8'),       # end of the last note, in quarter notes
+])
+
+
+def pitch_names(pitches):
+    """nameWithOctave of MIDI pitches, spelled as music21 spells them"""
+    return [f"{PITCH_NAMES[p % 12]}{p // 12 - 1}" for p in np.asarray(pitches).tolist()]
+
+
+class NoteTable:
+    """Notes of a score as a structured array, with vectorized queries"""
+
+    def __init__(self, notes, part_names=None):
+        self.notes = np.asarray(notes, dtype=NOTE_DTYPE)
+        # Name of every part of the source, including parts without rows
+        self.part_names = list(part_names or [])
+
+    @classmethod
+    def from_score(cls, score):
+        """Build the table with a single walk over each part's notes"""
+        rows = []
+        part_names = []
+        for part_id, part in enumerate(score.parts):
+            part_names.append(part.partName)
+            tied = {}  # MIDI pitch -> rows of the notes ties continue (unisons can repeat a pitch)
+            for n in part.flatten().notes:
+                if not getattr(n, 'pitches', ()):
+                    continue  # Unpitched
+                onset = float(n.offset)
+                duration = float(n.quarterLength)
+                # A chord's members carry their own tie and velocity
+                for member in (n.notes if n.isChord else (n,)):
+                    midi_pitch = member.pitch.midi
+                    velocity = member.volume.velocity if member.hasVolumeInformation() else None
+                    if velocity is None:
+                        velocity = DEFAULT_VELOCITY
+                    tie_type = member.tie.type if member.tie is not None else None
+                    # A tied continuation lengthens the note it continues
+                    if tie_type in ('continue', 'stop') and tied.get(midi_pitch):
+                        tied[midi_pitch][0][1] += duration
+                        if tie_type == 'stop':
+                            tied[midi_pitch].pop(0)
+                        continue
+                    row = [onset, duration, midi_pitch, velocity, part_id]
+                    rows.append(row)
+                    if tie_type == 'start':
+                        tied.setdefault(midi_pitch, []).append(row)
+        return cls([tuple(row) for row in rows], part_names)
+
+    @classmethod
+    def from_midi(cls, midi_path):
+        """
+        Build the table from a MIDI file without creating music21 notes.
+
+        Part ids follow the tracks that contain notes, in the same order
+        as the parts of converter.parse(midi_path). Times are not
+        quantized, so onsets and durations can differ slightly from the
+        parsed score's.
+        """
+        from music21 import midi
+
+        mf = midi.MidiFile()
+        mf.open(midi_path)
+        mf.read()
+        mf.close()
+        ticks_per_quarter = mf.ticksPerQuarterNote
+
+        rows = []
+        part_names = []
+        note_on = midi.ChannelVoiceMessages.NOTE_ON
+        note_off = midi.ChannelVoiceMessages.NOTE_OFF
+        for track in mf.tracks:
+            if not track.hasNotes():
+                continue
+            part_id = len(part_names)
+            name = None
+            tick = 0
+            sounding = {}  # (channel, pitch) -> [(start tick, velocity), ...]
+            for event in track.events:
+                if event.isDeltaTime():
+                    tick += event.time
+                    continue
+                if event.type == midi.MetaEvents.SEQUENCE_TRACK_NAME and name is None:
+                    name = event.data.decode('utf-8', 'replace') if isinstance(event.data, bytes) else event.data
+                if event.type not in (note_on, note_off) or event.channel == PERCUSSION_CHANNEL:
+                    continue
+                key = (event.channel, event.pitch)
+                if event.type == note_on and event.velocity > 0:
+                    sounding.setdefault(key, []).append((tick, event.velocity))
+                elif sounding.get(key):
+                    start, velocity = sounding[key].pop(0)
+                    rows.append((start / ticks_per_quarter, (tick - start) / ticks_per_quarter,
+                                 event.pitch, velocity, part_id))
+            part_names.append(name)
+
+        table = cls(rows, part_names)
+        table.notes.sort(order=('part', 'onset', 'pitch'), kind='stable')
+        return table
+
+    def __len__(self):
+        return len(self.notes)
+
+    @property
+    def num_parts(self):
+        return len(self.part_names)
+
+    def part(self, part_id):
+        """Rows of one part, in onset order"""
+        return self.notes[self.notes['part'] == part_id]
+
+    def _select(self, part_id):
+        return self.notes if part_id is None else self.part(part_id)
+
+    def count(self, part_id=None):
+        return len(self._select(part_id))
+
+    def pitch_range(self, part_id=None):
+        """(lowest, highest) MIDI pitch, or None without notes"""
+        pitches = self._select(part_id)['pitch']
+        if not len(pitches):
+            return None
+        return int(pitches.min()), int(pitches.max())
+
+    def unique_pitches(self, part_id=None):
+        """Sorted distinct MIDI pitches"""
+        return np.unique(self._select(part_id)['pitch'])
+
+    def counts_per_part(self):
+        """Number of rows of every part, including parts without notes"""
+        return np.bincount(self.notes['part'], minlength=self.num_parts)
+
+    def parts_with_notes(self):
+        return np.flatnonzero(self.counts_per_part())
+
+    def part_stats(self):
+        """One PART_STATS_DTYPE record per part that has notes"""
+        n_parts = self.num_parts
+        part_ids = self.notes['part'].astype(np.intp)
+        pitches = self.notes['pitch'].astype(np.int16)
+
+        counts = np.bincount(part_ids, minlength=n_parts)
+        lowest = np.full(n_parts, 127, dtype=np.int16)
+        highest = np.zeros(n_parts, dtype=np.int16)
+        end = np.zeros(n_parts)
+        np.minimum.at(lowest, part_ids, pitches)
+        np.maximum.at(highest, part_ids, pitches)
+        np.maximum.at(end, part_ids, self.notes['onset'] + self.notes['duration'])
+        # Distinct (part, pitch) pairs, counted per part
+        distinct = np.unique(part_ids * 128 + pitches) // 128
+        unique = np.bincount(distinct, minlength=n_parts)
+
+        present = np.flatnonzero(counts)
+        stats = np.zeros(len(present), dtype=PART_STATS_DTYPE)
+        stats['part'] = present
+        stats['notes'] = counts[present]
+        stats['lowest'] = lowest[present]
+        stats['highest'] = highest[present]
+        stats['unique_pitches'] = unique[present]
+        stats['end'] = end[present]
+        return stats
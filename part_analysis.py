@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Single-pass per-part analysis on a NoteTable
+
+analyze_parts computes, for every part with notes, its note count, pitch
+range, number of distinct pitches, note density, polyphony and a melody
+score, using one sort of the table and segment-wise NumPy reductions (no
+music21 objects, no Python loop over notes). main_part picks the part
+most likely to carry the melody. Transcriptions always come out as a
+single part, so this is for multi-part MIDI files (check_all_parts.py),
+not for the conversion pipeline.
+"""
+
+import numpy as np
+
+from note_table import NoteTable
+
+PART_ANALYSIS_DTYPE = np.dtype([
+    ('part', 'i2'),
+    ('notes', 'i8'),
+    ('lowest', 'i1'),
+    ('highest', 'i1'),
+    ('unique_pitches', 'i2'),
+    ('mean_pitch', 'f4'),
+    ('density', 'f4'),          # notes per quarter note, over the part's span
+    ('mean_polyphony', 'f4'),   # notes sounding together, while the part sounds
+    ('max_polyphony', 'i2'),
+    ('coverage', 'f4'),         # fraction of the score during which the part sounds
+    ('melody_score', 'f4'),
+])
+
+# Distinct pitches beyond which a part counts as fully varied
+FULL_VARIETY_PITCHES = 12
+# Piano range, used to place a part's register between 0 and 1
+LOWEST_PIANO_KEY = 21
+HIGHEST_PIANO_KEY = 108
+
+
+def analyze_parts(table):
+    """One PART_ANALYSIS_DTYPE record per part of `table` that has notes"""
+    notes = table.notes
+    if not len(notes):
+        return np.zeros(0, dtype=PART_ANALYSIS_DTYPE)
+
+    order = np.lexsort((notes['onset'], notes['part']))
+    part_ids = notes['part'][order].astype(np.intp)
+    pitches = notes['pitch'][order].astype(np.int16)
+    onsets = notes['onset'][order]
+    ends = onsets + notes['duration'][order]
+
+    # Segments of the sorted rows, one per part
+    starts = np.flatnonzero(np.r_[True, part_ids[1:] != part_ids[:-1]])
+    present = part_ids[starts]
+    counts = np.diff(np.r_[starts, len(part_ids)])
+
+    lowest = np.minimum.reduceat(pitches, starts)
+    highest = np.maximum.reduceat(pitches, starts)
+    mean_pitch = np.add.reduceat(pitches.astype(np.float64), starts) / counts
+    distinct = np.unique(part_ids * 128 + pitches) // 128
+    unique = np.bincount(distinct, minlength=part_ids.max() + 1)[present]
+
+    first_onset = onsets[starts]  # rows are sorted by onset within a part
+    last_end = np.maximum.reduceat(ends, starts)
+    span = np.maximum(last_end - first_onset, np.finfo(np.float64).eps)
+    density = counts / span
+
+    # Polyphony: sweep over note starts (+1) and ends (-1) of all parts at
+    # once. Events are sorted by part, then time, ends before starts, so
+    # the running sum returns to zero at the end of every part.
+    event_part = np.r_[part_ids, part_ids]
+    event_time = np.r_[onsets, ends]
+    event_step = np.r_[np.ones_like(part_ids), -np.ones_like(part_ids)]
+    event_order = np.lexsort((event_step, event_time, event_part))
+    event_part = event_part[event_order]
+    event_time = event_time[event_order]
+    sounding = np.cumsum(event_step[event_order])
+    # Time until the next event of the same part, with `sounding` notes on
+    gap = np.r_[np.diff(event_time), 0.0]
+    gap[np.r_[event_part[1:] != event_part[:-1], True]] = 0.0
+    event_starts = np.flatnonzero(np.r_[True, event_part[1:] != event_part[:-1]])
+    sounding_time = np.add.reduceat(np.where(sounding > 0, gap, 0.0), event_starts)
+    note_time = np.add.reduceat(sounding * gap, event_starts)
+    max_polyphony = np.maximum.reduceat(sounding, event_starts)
+    mean_polyphony = note_time / np.maximum(sounding_time, np.finfo(np.float64).eps)
+
+    score_length = max(last_end.max() - first_onset.min(), np.finfo(np.float64).eps)
+    coverage = sounding_time / score_length
+
+    # A melody is varied, mostly one note at a time, present for much of
+    # the piece and usually in a higher register
+    variety = np.minimum(unique / FULL_VARIETY_PITCHES, 1.0)
+    monophony = 1.0 / np.maximum(mean_polyphony, 1.0)
+    register = np.clip((mean_pitch - LOWEST_PIANO_KEY) / (HIGHEST_PIANO_KEY - LOWEST_PIANO_KEY), 0.0, 1.0)
+    melody_score = variety * monophony * coverage * (0.5 + 0.5 * register)
+
+    result = np.zeros(len(present), dtype=PART_ANALYSIS_DTYPE)
+    result['part'] = present
+    result['notes'] = counts
+    result['lowest'] = lowest
+    result['highest'] = highest
+    result['unique_pitches'] = unique
+    result['mean_pitch'] = mean_pitch
+    result['density'] = density
+    result['mean_polyphony'] = mean_polyphony
+    result['max_polyphony'] = max_polyphony
+    result['coverage'] = coverage
+    result['melody_score'] = melody_score
+    return result
+
+
+def main_part(analysis):
+    """Part id with the highest melody score, or None if no part has notes"""
+    if not len(analysis):
+        return None
+    return int(analysis['part'][analysis['melody_score'].argmax()])
+
+
+def select_main_part(score):
+    """
+    Keep only the main (melody) part of a multi-part score, in place.
+
+    Returns the index the main part had in score.parts.
+    """
+    parts = list(score.parts)
+    if len(parts) < 2:
+        return 0
+    part_id = main_part(analyze_parts(NoteTable.from_score(score)))
+    if part_id is None:
+        return 0
+    for i, part in enumerate(parts):
+        if i != part_id:
+            score.remove(part)
+    return part_id
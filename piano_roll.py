@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Piano-roll preview of transcribed notes, for live threshold tuning
+
+The GUI shows how onset threshold, frame threshold and minimum note
+length change the transcription before anything is exported. Notes are
+decoded again from the model activations kept after the first
+transcription (TranscriptionBackend.decode), on an excerpt of
+PREVIEW_SECONDS only, so a redraw takes a few tens of milliseconds and
+the model never runs again. The geometry is computed here, without Tk;
+PianoRoll draws it on a Canvas.
+"""
+
+import time
+
+# Length of the previewed excerpt
+PREVIEW_SECONDS = 20.0
+
+# Pitch range always shown (C2-C7); wider when notes fall outside it
+LOWEST_PITCH = 36
+HIGHEST_PITCH = 96
+
+BACKGROUND = "#ffffff"
+C_LINE = "#d0d0d0"  # horizontal line at every C
+NOTE_FILL = "#3a6ea5"
+
+
+def preview_notes(session, activations, start_s, params, seconds=PREVIEW_SECONDS, timings=None):
+    """
+    Note events between start_s and start_s + seconds, decoded by
+    `session` from an excerpt of `activations` with the transcription
+    `params`; times are in seconds from the start of the recording.
+    """
+    from transcription import activation_excerpt
+
+    start = time.perf_counter()
+    excerpt, offset = activation_excerpt(activations, start_s, seconds)
+    note_events = session.decode(excerpt, **params) or []
+    if timings is not None:
+        timings['preview'] = time.perf_counter() - start
+    end_s = start_s + seconds
+    return [(s + offset, e + offset, pitch, amplitude, bends)
+            for s, e, pitch, amplitude, bends in note_events
+            if e + offset > start_s and s + offset < end_s]
+
+
+def roll_rectangles(note_events, start_s, seconds, width, height):
+    """
+    Canvas rectangles (x0, y0, x1, y1) of the notes in the window
+    [start_s, start_s + seconds], one per note, high pitches at the top,
+    and the (lowest, highest) pitch shown.
+    """
+    pitches = [pitch for _, _, pitch, *_ in note_events]
+    lowest = min([LOWEST_PITCH] + pitches)
+    highest = max([HIGHEST_PITCH] + pitches)
+    row = height / (highest - lowest + 1)
+    scale = width / seconds
+    rectangles = []
+    for start, end, pitch, *_ in note_events:
+        x0 = max(start - start_s, 0.0) * scale
+        x1 = min(end - start_s, seconds) * scale
+        y0 = (highest - pitch) * row
+        rectangles.append((x0, y0, max(x1, x0 + 1), y0 + max(row, 1)))
+    return rectangles, (lowest, highest)
+
+
+class PianoRoll:
+    """A Tk Canvas showing a piano roll of note events"""
+
+    def __init__(self, master, width=560, height=240):
+        import tkinter as tk
+
+        self.width = width
+        self.height = height
+        self.canvas = tk.Canvas(master, width=width, height=height, background=BACKGROUND,
+                                highlightthickness=1, highlightbackground=C_LINE)
+
+    def pack(self, **kwargs):
+        self.canvas.pack(**kwargs)
+
+    def draw(self, note_events, start_s, seconds=PREVIEW_SECONDS):
+        """Replace the shown notes (one canvas item per note and per C line)"""
+        self.canvas.delete('all')
+        rectangles, (lowest, highest) = roll_rectangles(note_events, start_s, seconds,
+                                                        self.width, self.height)
+        row = self.height / (highest - lowest + 1)
+        for pitch in range(lowest, highest + 1):
+            if pitch % 12 == 0:
+                y = (highest - pitch + 1) * row
+                self.canvas.create_line(0, y, self.width, y, fill=C_LINE)
+                self.canvas.create_text(2, y, text=f"C{pitch // 12 - 1}", anchor='sw',
+                                        fill=C_LINE, font=("TkDefaultFont", 7))
+        for x0, y0, x1, y1 in rectangles:
+            self.canvas.create_rectangle(x0, y0, x1, y1, fill=NOTE_FILL, outline="")
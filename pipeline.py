@@ -0,0 +1,315 @@
+#!/usr/bin/env python3
+"""
+Audio -> score conversion pipeline, independent of the GUI
+
+audio_to_score runs every stage (decode, transcription, score building,
+export) without touching Tk, so it can run on a worker thread or in a
+batch process. Progress is reported through an optional callback and a
+running job can be stopped with a threading.Event. Diagnostics (stage
+timings, tempo, key, quantization) go to this module's logger, at INFO
+level; the command line decides where they are shown.
+"""
+
+import logging
+import os
+
+import numpy as np
+from music21 import instrument, metadata
+
+from transcription import (
+    ConversionCancelled, FRAME_THRESHOLD, MINIMUM_NOTE_LENGTH, ONSET_THRESHOLD,
+    audio_duration, format_timings, load_audio,
+)
+from backends import get_backend
+from score_builder import DEFAULT_TEMPO, notes_to_score, seconds_to_quarters, warp_seconds
+from beat_tracking import (
+    beat_grid, beat_map, format_tempi, start_beat_tracking, tempo_changes, track_beats,
+)
+from key_estimation import estimate_keys, format_keys
+from quantize import DEFAULT_DIVISORS, format_displacement
+from instrument_recognition import AUTO_INSTRUMENT, RECOGNITION_SECONDS, recognize_instrument
+from exporters import DEFAULT_FORMATS, export_score, plan_exports
+
+logger = logging.getLogger(__name__)
+
+SUPPORTED_INSTRUMENTS = {
+    "Pianoforte": instrument.Piano(),
+    "Violino": instrument.Violin(),
+    "Violoncello": instrument.Violoncello()
+}
+
+DEFAULT_TITLE = "Spartito generato da Audio2Score"
+
+# Recognized instruments below this confidence are reported as uncertain
+MIN_INSTRUMENT_CONFIDENCE = 0.6
+
+# Recordings longer than this are transcribed in streaming mode (bounded memory)
+STREAMING_MIN_SECONDS = 10 * 60
+
+DEFAULT_TRANSCRIPTION_PARAMS = {
+    'onset_threshold': ONSET_THRESHOLD,
+    'frame_threshold': FRAME_THRESHOLD,
+    'minimum_note_length': MINIMUM_NOTE_LENGTH,
+}
+
+DEFAULT_QUANTIZATION_PARAMS = {
+    'quarter_length_divisors': DEFAULT_DIVISORS,
+    'tolerance': None,
+}
+
+
+def check_cancelled(cancel_event):
+    """Raise ConversionCancelled if the job has been cancelled"""
+    if cancel_event is not None and cancel_event.is_set():
+        raise ConversionCancelled()
+
+
+def activations_key(cache, audio_path, session):
+    """
+    Cache key of the model activations (and beats) of a recording: unlike
+    the notes, they do not depend on the note decoding parameters.
+    """
+    return cache.key(audio_path, {'sample_rate': session.sample_rate}, session.version)
+
+
+def prepare_transcription(audio_path, session=None, cache=None, progress=None,
+                          cancel_event=None, timings=None, engine=None):
+    """
+    Run only the expensive part of audio_to_score, for interactive tuning
+    of the transcription parameters: decode audio_path and run the model,
+    or take its activations from `cache` when they are stored there.
+
+    Returns (y, sr, activations). y and sr are None when the activations
+    came from the cache; all three are None for backends that have no
+    activations (then there is nothing to tune, and nothing is run). Fresh activations are stored in
+    `cache` and returned memory-mapped from it. Pass the result, with the
+    notes decoded by session.decode, to audio_to_score as `prepared`.
+    """
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    if session is None:
+        session = get_backend(engine)
+    if not session.has_activations:
+        return None, None, None
+    if timings is None:
+        timings = {}
+
+    if cache is not None:
+        key = activations_key(cache, audio_path, session)
+        activations = cache.get_activations(key)
+        if activations is not None:
+            return None, None, activations
+
+    report("Caricamento audio...")
+    y, sr = load_audio(audio_path, sr=session.sample_rate, timings=timings)
+    check_cancelled(cancel_event)
+    report("Trascrizione audio in MIDI...")
+    activations, _, _ = session.transcribe(y, sr, timings=timings, cancel_event=cancel_event)
+    logger.info(f"Stage timings: {format_timings(timings)}")
+    if cache is not None and activations is not None:
+        cache.put_activations(key, activations)
+        activations = cache.get_activations(key) or activations
+    return y, sr, activations
+
+
+def audio_to_score(audio_path, instrument_name="Pianoforte", session=None,
+                   output_base=None, title=DEFAULT_TITLE,
+                   progress=None, cancel_event=None, timings=None,
+                   cache=None, transcription_params=None, streaming=None,
+                   formats=DEFAULT_FORMATS, export_timeouts=None,
+                   quantization_params=None, track_modulations=False, detect_tempo=True,
+                   follow_tempo=True, analysis=None, engine=None, prepared=None):
+    """
+    Convert an audio file to a musical score in multiple formats.
+
+    instrument_name: one of SUPPORTED_INSTRUMENTS, or AUTO_INSTRUMENT to
+        recognize it from the audio (instrument_recognition)
+
+    session: transcription backend instance (backends.TranscriptionBackend);
+        by default the per-process instance of `engine`
+    engine: name of a registered backend (backends.available_backends),
+        default backends.DEFAULT_BACKEND; e.g. "monophonic" for
+        single-line violin and cello recordings
+    progress: optional callable receiving a status message for each stage
+    cancel_event: optional threading.Event; when set, the conversion stops
+        at the next stage (or model window) with ConversionCancelled
+    timings: optional dict that receives the per-stage durations
+    cache: optional cache.TranscriptionCache; on a hit decoding and
+        inference are skipped. The model's activations are cached as well
+        (not in streaming mode), so with other transcription_params only
+        note decoding runs again
+    transcription_params: note decoding parameters, see
+        DEFAULT_TRANSCRIPTION_PARAMS
+    streaming: read and transcribe the audio in chunks; None chooses it
+        automatically for recordings longer than STREAMING_MIN_SECONDS
+    formats: export formats, any of exporters.EXPORT_FORMATS; formats whose
+        renderer (MuseScore, LilyPond) is not installed are skipped
+    export_timeouts: per-format export time limits, see
+        exporters.DEFAULT_TIMEOUTS
+    quantization_params: rhythmic grid and tolerance, see
+        DEFAULT_QUANTIZATION_PARAMS and quantize.quantize_notes
+    track_modulations: follow key changes (key_estimation.track_keys)
+        instead of writing one key signature for the whole piece
+    detect_tempo: track tempo and beats on the decoded audio, during
+        inference, and notate the score on that beat grid; otherwise (and
+        in streaming mode) the score is written at DEFAULT_TEMPO
+    follow_tempo: map note times through the detected beats, with tempo
+        changes where the performance speeds up or slows down; False
+        notates at the average tempo
+    analysis: optional dict that receives the instrument used and, when
+        it was recognized, the recognition confidence
+    prepared: optional (y, sr, activations, note_events) of audio_path
+        already decoded and transcribed with these parameters
+        (batch.convert_group transcribes queued files together, the GUI
+        tunes them after prepare_transcription); inference is skipped and
+        the results are stored in `cache`. y and sr may be None: the audio
+        is then decoded only if beats or the instrument are needed
+
+    Returns {format: path} for the planned formats; the path is None when
+    that export failed or timed out.
+    """
+    def report(message):
+        if progress is not None:
+            progress(message)
+
+    if session is None:
+        session = get_backend(engine)
+    if output_base is None:
+        output_base = os.path.abspath("spartito_output")
+
+    params = dict(DEFAULT_TRANSCRIPTION_PARAMS, **(transcription_params or {}))
+    if timings is None:
+        timings = {}
+
+    note_events = None
+    y = None  # decoded buffer, when the audio had to be decoded whole
+    beats = None  # (tempo, beat times) from beat_tracking.track_beats
+    if cache is not None:
+        cache_key = cache.key(audio_path, dict(params, sample_rate=session.sample_rate), session.version)
+        audio_key = activations_key(cache, audio_path, session)
+    if prepared is not None:
+        # Decoded and transcribed by the caller, e.g. together with other files
+        y, sr, activations, note_events = prepared
+        streaming = False
+        if cache is not None:
+            cache.put(cache_key, note_events)
+            if activations is not None and not cache.has_activations(audio_key):
+                cache.put_activations(audio_key, activations)
+            if detect_tempo:
+                beats = cache.get_beats(audio_key)
+    elif cache is not None:
+        note_events = cache.get(cache_key)
+        logger.info(f"Transcription cache: {cache.hits} hits, {cache.misses} misses")
+        if note_events is None:
+            activations = cache.get_activations(audio_key)
+            if activations is not None:
+                # Same recording and model, other thresholds: decode again, no inference
+                report("Trascrizione audio in MIDI...")
+                note_events = session.decode(activations, timings=timings, **params)
+                if note_events is not None:
+                    logger.info(f"Notes decoded again from cached activations in "
+                                f"{timings['note_decoding']:.3f}s")
+                    cache.put(cache_key, note_events)
+        if note_events is not None and detect_tempo:
+            beats = cache.get_beats(audio_key)
+
+    if streaming is None and (note_events is None or (detect_tempo and beats is None)):
+        duration = audio_duration(audio_path)
+        streaming = duration is not None and duration > STREAMING_MIN_SECONDS
+
+    if note_events is None:
+        if streaming:
+            # Steps 1-2: Decode and transcribe chunk by chunk, with bounded memory
+            # (no whole buffer to track beats on: the score keeps the default tempo)
+            report("Trascrizione audio in MIDI...")
+            note_events = session.transcribe_stream(audio_path, timings=timings,
+                                                    cancel_event=cancel_event, **params)
+        else:
+            # Step 1: Decode audio once, straight to the backend's sample rate
+            report("Caricamento audio...")
+            y, sr = load_audio(audio_path, sr=session.sample_rate, timings=timings)
+            check_cancelled(cancel_event)
+
+            # Beat tracking reads the same buffer, on a thread, during inference
+            beat_tracking = start_beat_tracking(y, sr, timings) if detect_tempo else None
+
+            # Step 2: Transcribe the decoded buffer with the selected backend
+            report("Trascrizione audio in MIDI...")
+            activations, _, note_events = session.transcribe(y, sr, timings=timings,
+                                                             cancel_event=cancel_event, **params)
+            if beat_tracking is not None:
+                beats = beat_tracking.result()
+            if cache is not None and activations is not None:
+                cache.put_activations(audio_key, activations)
+        logger.info(f"Stage timings: {format_timings(timings)}")
+        logger.info(f"Model latency: {session.latency_report()}")
+        if cache is not None:
+            cache.put(cache_key, note_events)
+            if beats is not None:
+                cache.put_beats(audio_key, *beats)
+    elif detect_tempo and beats is None and not streaming:
+        # Transcription cached (or prepared) without beats: track them now
+        if y is None:
+            report("Caricamento audio...")
+            y, sr = load_audio(audio_path, sr=session.sample_rate, timings=timings)
+        beats = track_beats(y, sr, timings)
+        if cache is not None:
+            cache.put_beats(audio_key, *beats)
+
+    confidence = None
+    if instrument_name == AUTO_INSTRUMENT:
+        report("Riconoscimento strumento...")
+        if y is None:
+            # Cached or streamed: the beginning of the recording is enough
+            y, sr = load_audio(audio_path, duration=RECOGNITION_SECONDS)
+        instrument_name, confidence = recognize_instrument(y, sr, timings)
+        logger.info(f"Instrument: {instrument_name} (confidence {confidence:.0%})")
+        if confidence < MIN_INSTRUMENT_CONFIDENCE:
+            logger.warning("Uncertain instrument recognition, choose the instrument by hand if wrong")
+    if analysis is not None:
+        analysis['instrument'] = instrument_name
+        if confidence is not None:
+            analysis['instrument_confidence'] = round(confidence, 3)
+
+    # Step 3: Build the musical score straight from the note events
+    report("Generazione spartito...")
+    tracked = beats is not None and beats[0] is not None
+    bpm, origin = beat_grid(*beats) if tracked else (DEFAULT_TEMPO, 0.0)
+    time_map = tempi = None
+    if tracked and follow_tempo:
+        # Every beat gets its own position: rubato does not pull notes off the beat
+        time_map = beat_map(*beats)
+        tempi = tempo_changes(time_map)
+        logger.info(f"Tempo: {format_tempi(tempi)}, following {len(time_map[0])} beats")
+    else:
+        logger.info(f"Tempo: {bpm:.1f} BPM" + (f", first beat at {origin:.3f}s" if tracked else " (default)"))
+    quantization = dict(DEFAULT_QUANTIZATION_PARAMS, **(quantization_params or {}))
+    times = np.array([[float(e[0]), float(e[1])] for e in note_events]).reshape(-1, 2)
+    quarters = warp_seconds(times, time_map) if time_map is not None else seconds_to_quarters(times, bpm, origin)
+    pitches = np.array([int(e[2]) for e in note_events], dtype=np.int16)
+    keys = estimate_keys(quarters[:, 0], quarters[:, 1] - quarters[:, 0], pitches,
+                         track_modulations=track_modulations)
+    logger.info(f"Key: {format_keys(keys)}")
+    reports = []
+    score = notes_to_score(note_events, bpm=bpm, origin=origin, time_map=time_map, tempi=tempi,
+                           reports=reports, keys=keys, **quantization)
+    logger.info(f"Quantization: {format_displacement(reports[0])}")
+
+    # Step 4: Set the chosen instrument
+    chosen_instrument = SUPPORTED_INSTRUMENTS[instrument_name]
+    for part in score.parts:
+        part.insert(0, chosen_instrument)
+
+    # Step 5: Add metadata
+    if not score.metadata:
+        score.metadata = metadata.Metadata()
+    score.metadata.title = title
+    check_cancelled(cancel_event)
+
+    # Step 6: Save the requested formats, each writer in its own process
+    report("Esportazione spartito...")
+    plan = plan_exports(output_base, formats)
+    return export_score(score, plan, timeouts=export_timeouts,
+                        cancel_event=cancel_event, timings=timings)
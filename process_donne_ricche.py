@@ -5,12 +5,12 @@ Process the uploaded Donne Ricche MP3 with Audio2Score
 
 import os
 import sys
-import tempfile
-import shutil
-import glob
-from music21 import converter, instrument, metadata
-import librosa
-import soundfile as sf
+from music21 import instrument, metadata
+
+from backends import get_backend
+from transcription import format_timings, load_audio
+from score_builder import notes_to_score
+from note_table import NoteTable, pitch_names
 
 AUDIO_FILE = '/home/user/Audio2Score/DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3'
 
@@ -37,38 +37,31 @@ SUPPORTED_INSTRUMENTS = {
 }
 
 instrument_choice = "Pianoforte"  # Best for acoustic guitar/vocal
-temp_dir = tempfile.mkdtemp()
 
 try:
     # Step 1: Load audio
-    print("[1/7] Loading audio with librosa...")
-    print("  Sample rate: 16kHz (Audio2Score standard)")
+    print("[1/6] Loading audio with librosa...")
+    # AUDIO2SCORE_BACKEND selects another engine (default: basic-pitch)
+    backend = get_backend()
+    print(f"  Sample rate: {backend.sample_rate} Hz ({backend.name} native rate)")
 
-    wav_path = os.path.join(temp_dir, "input.wav")
-    y, sr = librosa.load(AUDIO_FILE, sr=16000)
-    sf.write(wav_path, y, sr)
+    timings = {}
+    y, sr = load_audio(AUDIO_FILE, sr=backend.sample_rate, timings=timings)
 
     duration = len(y) / sr
     print(f"  ✓ Audio loaded: {duration:.1f} seconds ({duration/60:.1f} minutes)")
     print()
 
     # Step 2: Transcribe to MIDI with basic-pitch
-    print("[2/7] Transcribing audio to MIDI...")
+    print("[2/6] Transcribing audio to MIDI...")
     print("  Using Spotify's basic-pitch ML model")
     print("  (This may take 1-3 minutes...)")
 
     try:
-        from basic_pitch.inference import predict_and_save
-
-        predict_and_save(
-            [wav_path],
-            output_directory=temp_dir,
-            save_midi=True,
-            save_model_outputs=False,
-            sonify_midi=False
-        )
+        note_events = backend.notes(y, sr, timings=timings)
 
         print(f"  ✓ ML transcription complete!")
+        print(f"    Stage timings: {format_timings(timings)}")
         print()
 
     except ImportError as e:
@@ -77,75 +70,45 @@ try:
         print("  basic-pitch requires:")
         print("    pip install basic-pitch tensorflow")
         print()
-        print("  Creating a demo MIDI file instead to show the pipeline...")
-
-        # Create a simple demo MIDI to show the rest of the pipeline works
-        from music21 import stream, note, tempo, key as music_key
-        demo_score = stream.Score()
-        demo_part = stream.Part()
-        demo_part.append(tempo.MetronomeMark(number=120))
-        demo_part.append(music_key.Key('C'))
-
-        # Add a few notes as demo
-        for pitch in ['C4', 'E4', 'G4', 'C5']:
-            n = note.Note(pitch)
-            n.quarterLength = 1.0
-            demo_part.append(n)
-
-        demo_score.append(demo_part)
-        demo_midi = os.path.join(temp_dir, "input_basic_pitch.mid")
-        demo_score.write('midi', fp=demo_midi)
-        print(f"  ✓ Demo MIDI created to demonstrate pipeline")
-        print()
+        print("  Creating demo note events instead to show the pipeline...")
 
-    # Step 3: Find generated MIDI
-    print("[3/7] Locating MIDI file...")
-
-    midi_files = glob.glob(os.path.join(temp_dir, "*_basic_pitch.mid"))
-    if not midi_files:
-        midi_files = glob.glob(os.path.join(temp_dir, "*.mid"))
-
-    if not midi_files:
-        print(f"  ✗ No MIDI file found")
-        sys.exit(1)
+        # A few notes (C4 E4 G4 C5, one quarter each at 120 BPM) as demo
+        note_events = [(i * 0.5, (i + 1) * 0.5, pitch, 0.8, None)
+                       for i, pitch in enumerate([60, 64, 67, 72])]
+        print(f"  ✓ Demo note events created to demonstrate pipeline")
+        print()
 
-    midi_path_temp = midi_files[0]
-    print(f"  ✓ Found: {os.path.basename(midi_path_temp)}")
-    print()
+    # Step 3: Build score from the note events
+    print("[3/6] Building score from note events...")
 
-    # Step 4: Parse MIDI
-    print("[4/7] Parsing MIDI and creating score...")
+    score = notes_to_score(note_events)
 
-    score = converter.parse(midi_path_temp)
+    # Note table: one walk over the score, every query below runs on arrays
+    table = NoteTable.from_score(score)
 
     # Filter pitched notes
     from music21 import stream as m21_stream
     filtered_score = m21_stream.Score()
 
-    for part in score.parts:
-        notes = part.flatten().notes
-        pitched_notes = [n for n in notes if hasattr(n, 'pitch')]
-        if len(pitched_notes) > 0:
-            filtered_score.append(part)
+    kept_ids = [int(i) for i in table.parts_with_notes()]
+    for i in kept_ids:
+        filtered_score.append(score.parts[i])
 
     if len(filtered_score.parts) == 0:
         filtered_score = score  # Keep original if filtering fails
+        kept_ids = list(range(len(score.parts)))
     else:
         score = filtered_score
 
-    total_notes = 0
-    for part in score.parts:
-        notes = part.flatten().notes
-        pitched_notes = [n for n in notes if hasattr(n, 'pitch')]
-        total_notes += len(pitched_notes)
+    total_notes = len(table)
 
-    print(f"  ✓ MIDI parsed successfully")
+    print(f"  ✓ Score built successfully")
     print(f"    Parts: {len(score.parts)}")
     print(f"    Total notes: {total_notes}")
     print()
 
-    # Step 5: Assign instrument
-    print(f"[5/7] Assigning instrument: {instrument_choice}...")
+    # Step 4: Assign instrument
+    print(f"[4/6] Assigning instrument: {instrument_choice}...")
 
     chosen_instrument = SUPPORTED_INSTRUMENTS[instrument_choice]
     for part in score.parts:
@@ -154,8 +117,8 @@ try:
     print(f"  ✓ {instrument_choice} assigned to all parts")
     print()
 
-    # Step 6: Add metadata
-    print("[6/7] Adding metadata...")
+    # Step 5: Add metadata
+    print("[5/6] Adding metadata...")
 
     if not score.metadata:
         score.metadata = metadata.Metadata()
@@ -167,8 +130,8 @@ try:
     print(f"    Composer: {score.metadata.composer}")
     print()
 
-    # Step 7: Export
-    print("[7/7] Exporting to multiple formats...")
+    # Step 6: Export
+    print("[6/6] Exporting to multiple formats...")
 
     output_base = "/home/user/Audio2Score/donne_ricche_output"
 
@@ -199,22 +162,20 @@ try:
 
     if score.parts:
         main_part = score.parts[0]
-        notes = [n for n in main_part.flatten().notes if hasattr(n, 'pitch')]
+        notes = table.part(kept_ids[0])
 
         print(f"Instrument: {main_part.getInstrument().instrumentName}")
         print(f"Notes in main part: {len(notes)}")
 
-        if notes:
-            pitches_midi = [n.pitch.midi for n in notes]
-            from music21 import pitch
-            lowest = pitch.Pitch(midi=min(pitches_midi))
-            highest = pitch.Pitch(midi=max(pitches_midi))
-            print(f"Range: {lowest.nameWithOctave} - {highest.nameWithOctave}")
+        if len(notes):
+            lowest, highest = pitch_names(table.pitch_range(kept_ids[0]))
+            print(f"Range: {lowest} - {highest}")
 
             # Show first few notes
             print(f"\nFirst 10 notes:")
-            for i, n in enumerate(notes[:10], 1):
-                print(f"  {i}. {n.pitch.nameWithOctave} (duration: {n.quarterLength})")
+            first = notes[:10]
+            for i, (name, duration) in enumerate(zip(pitch_names(first['pitch']), first['duration']), 1):
+                print(f"  {i}. {name} (duration: {duration:g})")
 
         measures = main_part.getElementsByClass('Measure')
         if measures:
@@ -242,10 +203,3 @@ except Exception as e:
     import traceback
     traceback.print_exc()
     sys.exit(1)
-
-finally:
-    # Cleanup
-    try:
-        shutil.rmtree(temp_dir)
-    except:
-        pass
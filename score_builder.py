@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Build a music21 score directly from transcribed note events
+
+Replaces the MIDI round-trip (write *_basic_pitch.mid, glob for it,
+converter.parse it back): the note events produced by the transcription
+stage are turned into a stream.Score in memory, with the same chord
+grouping and notation steps music21 applies when it parses a MIDI file.
+Onsets and durations are quantized beforehand on arrays (quantize.py),
+so music21's Stream.quantize pass is not needed.
+
+Notes are grouped into chords on the arrays too (group_chords), then
+created in bulk and inserted with coreInsert, with a single
+coreElementsChanged per measure instead of music21's bookkeeping after
+every insert. table_to_score builds a score the same way from a
+note_table.NoteTable, e.g. the notes of a MIDI file, in place of
+converter.parse.
+
+Parts come out measured and notated (notation.notate_part): barlines,
+ties, voices, rests and beams are computed from the quantized arrays,
+so exporters write them without makeNotation.
+"""
+
+import numpy as np
+from music21 import chord, note, pitch, stream, tempo
+
+from key_estimation import make_key
+from notation import notate_part
+from quantize import DEFAULT_DIVISORS, quantize_notes
+
+# Tempo basic-pitch writes its MIDI files at (midi_tempo default)
+DEFAULT_TEMPO = 120
+
+
+def seconds_to_quarters(seconds, bpm=DEFAULT_TEMPO, origin=0.0):
+    """Convert a time in seconds to a quarterLength at a fixed tempo, counted from `origin`"""
+    return (seconds - origin) * bpm / 60.0
+
+
+def warp_seconds(seconds, time_map):
+    """
+    Convert times in seconds to quarterLengths through a beat map.
+
+    time_map: (times, quarters) arrays, e.g. beat_tracking.beat_map; times
+    in between are interpolated linearly, times outside are extrapolated
+    at the tempo of the first or last beat.
+    """
+    times, quarters = time_map
+    seconds = np.asarray(seconds, dtype=np.float64)
+    result = np.interp(seconds, times, quarters)
+    head = (quarters[1] - quarters[0]) / (times[1] - times[0])
+    tail = (quarters[-1] - quarters[-2]) / (times[-1] - times[-2])
+    result = np.where(seconds < times[0], quarters[0] + (seconds - times[0]) * head, result)
+    return np.where(seconds > times[-1], quarters[-1] + (seconds - times[-1]) * tail, result)
+
+
+def _metronome_mark(bpm):
+    # Shown rounded; MIDI export plays the exact tempo the notes were mapped with
+    shown = int(round(bpm))
+    return tempo.MetronomeMark(number=shown, numberSounding=bpm if bpm != shown else None)
+
+
+def make_notes(pitches, velocities):
+    """
+    One note.Note per MIDI pitch, with its velocity. Pitches are created
+    from the MIDI number (spelling inferred, as note.Note(midi=...) does)
+    and durations are set later, once per note or chord.
+    """
+    notes = []
+    for midi_pitch, velocity in zip(np.asarray(pitches).tolist(), np.asarray(velocities).tolist()):
+        n = note.Note(pitch.Pitch(midi=midi_pitch))
+        n.volume.velocity = velocity
+        notes.append(n)
+    return notes
+
+
+def group_chords(onsets, offsets, step):
+    """
+    Chord grouping of notes sorted by onset (then offset): the index of
+    the note leading each note's group, and whether notes start together
+    but end apart (a second voice is needed).
+
+    A note joins the first earlier note that starts less than `step`
+    before it and ends within `step` of it, as music21 groups the notes
+    of a MIDI track. Only notes chained by onsets less than `step` apart
+    can meet that condition; the chains where every note joins the first
+    (single notes, plain chords) are grouped on the arrays, the others
+    note by note.
+    """
+    n_notes = len(onsets)
+    leader = np.arange(n_notes)
+    if n_notes < 2:
+        return leader, False
+    chain_start = np.concatenate([[True], np.diff(onsets) >= step])
+    chain_starts = np.flatnonzero(chain_start)
+    first = chain_starts[np.cumsum(chain_start) - 1]
+    joins = (onsets - onsets[first] < step) & (np.abs(offsets - offsets[first]) <= step)
+    plain = np.logical_and.reduceat(joins, chain_starts)
+    leader = first.copy()
+
+    voices_required = False
+    chain_ends = np.append(chain_starts[1:], n_notes)
+    for start, end in zip(chain_starts[~plain].tolist(), chain_ends[~plain].tolist()):
+        gathered = np.zeros(end - start, dtype=bool)
+        for i in range(start, end):
+            if gathered[i - start]:
+                continue
+            leader[i] = i
+            for j in range(i + 1, end):
+                if abs(onsets[j] - onsets[i]) >= step:
+                    break
+                if abs(offsets[j] - offsets[i]) > step:
+                    voices_required = True
+                    continue
+                if not gathered[j - start]:
+                    leader[j] = i
+                    gathered[j - start] = True
+    return leader, voices_required
+
+
+def fill_part(part, onsets, offsets, pitches, velocities,
+              quarter_length_divisors=DEFAULT_DIVISORS, tolerance=None, reports=None, keys=None,
+              marks=()):
+    """
+    Add notes given as arrays (onset and offset in quarter notes, MIDI
+    pitch, velocity) to `part` and make it a measured, notated part.
+
+    Notes are grouped into chords and quantized on the arrays, and the
+    measures, ties, voices, rests and beams computed from them
+    (notation.notate_part); every note and chord is then created once
+    per notehead, with its final offset and duration. Key signatures
+    (keys) and `marks`, (offset, element) pairs such as metronome marks,
+    go into the measures at their offsets.
+    """
+    onsets = np.asarray(onsets, dtype=np.float64)
+    offsets = np.asarray(offsets, dtype=np.float64)
+    pitches = np.asarray(pitches, dtype=np.int64)
+    velocities = np.asarray(velocities, dtype=np.int64)
+    # Sort by onset, then offset, so simultaneous notes are adjacent
+    order = np.lexsort((velocities, pitches, offsets, onsets))
+    onsets, offsets, pitches, velocities = onsets[order], offsets[order], pitches[order], velocities[order]
+
+    # Notes starting (and ending) within one quantization step become a
+    # chord; notes that overlap otherwise get separate voices when notated
+    leader, _ = group_chords(onsets, offsets, 1.0 / max(quarter_length_divisors))
+    members = np.argsort(leader, kind='stable')
+    group_starts = np.flatnonzero(np.diff(leader[members], prepend=-1))
+    group_sizes = np.diff(np.append(group_starts, len(members)))
+    heads = members[group_starts]
+
+    # Onsets and durations are snapped to the grid on arrays, so every
+    # note and chord is created with its final offset and duration
+    report = quantize_notes(onsets[heads], offsets[heads] - onsets[heads],
+                            divisors=quarter_length_divisors, tolerance=tolerance)
+    if reports is not None:
+        reports.append(report)
+
+    def make_elements(groups):
+        # One note or chord per notehead: tied pieces are separate objects
+        sizes = group_sizes[groups]
+        firsts = np.cumsum(sizes) - sizes
+        rows = members[np.repeat(group_starts[groups] - firsts, sizes) + np.arange(sizes.sum())]
+        notes = make_notes(pitches[rows], velocities[rows])
+        return [chord.Chord(notes[first:first + size]) if size > 1 else notes[first]
+                for first, size in zip(firsts.tolist(), sizes.tolist())]
+
+    extras = list(marks)
+    if keys is not None:
+        extras += [(float(record['offset']), make_key(record)) for record in keys]
+    return notate_part(part, report['onset'], report['onset'] + report['duration'], make_elements, extras)
+
+
+def events_to_part(note_events, bpm=DEFAULT_TEMPO,
+                   quarter_length_divisors=DEFAULT_DIVISORS, tolerance=None, reports=None,
+                   keys=None, origin=0.0, time_map=None, tempi=None):
+    """
+    Build a measured stream.Part from note events.
+
+    note_events: iterable of (start_s, end_s, pitch_midi, amplitude[, pitch_bends])
+    tuples, as returned by transcription.transcribe.
+    bpm, origin: the beat grid; time `origin` (seconds) is offset 0 and a
+        quarter note lasts 60 / bpm seconds, see beat_tracking.beat_grid
+    time_map: optional (times, quarters) beat map used instead of bpm and
+        origin, see warp_seconds and beat_tracking.beat_map
+    tempi: optional (offset, bpm) records, e.g. beat_tracking.tempo_changes;
+        a metronome mark is inserted at each offset instead of one for bpm
+    quarter_length_divisors, tolerance: rhythmic grid, see quantize.quantize_notes
+    reports: optional list; the part's quantization report (one row per
+        note or chord) is appended to it
+    keys: optional key_estimation.KEY_DTYPE segments; a key signature is
+        inserted where each one starts
+    """
+    if tempi is None:
+        marks = [(0.0, _metronome_mark(bpm))]
+    else:
+        marks = [(float(record['offset']), _metronome_mark(float(record['bpm']))) for record in tempi]
+
+    note_events = list(note_events)
+    times = np.array([[float(e[0]), float(e[1])] for e in note_events]).reshape(-1, 2)
+    if time_map is not None:
+        quarters = warp_seconds(times, time_map)
+    else:
+        quarters = seconds_to_quarters(times, bpm, origin)
+    pitches = np.array([int(e[2]) for e in note_events], dtype=np.int64)
+    velocities = np.round(127 * np.array([float(e[3]) for e in note_events])).astype(np.int64)
+
+    return fill_part(stream.Part(), quarters[:, 0], quarters[:, 1], pitches, velocities,
+                     quarter_length_divisors=quarter_length_divisors, tolerance=tolerance,
+                     reports=reports, keys=keys, marks=marks)
+
+
+def table_to_score(table, quarter_length_divisors=DEFAULT_DIVISORS, tolerance=None, reports=None):
+    """
+    Build a score with one measured part per part of a note_table.NoteTable,
+    e.g. NoteTable.from_midi(path): the notes of a MIDI file without
+    converter.parse and its note-by-note stream insertions. Parts keep
+    their names; unpitched notes are not in the table, so not in the score.
+    """
+    score = stream.Score()
+    for part_id, name in enumerate(table.part_names):
+        rows = table.part(part_id)
+        part = stream.Part()
+        if name:
+            part.partName = name
+        fill_part(part, rows['onset'], rows['onset'] + rows['duration'], rows['pitch'], rows['velocity'],
+                  quarter_length_divisors=quarter_length_divisors, tolerance=tolerance, reports=reports)
+        score.coreInsert(0.0, part)
+    score.coreElementsChanged()
+    return score
+
+
+def notes_to_score(note_events, bpm=DEFAULT_TEMPO,
+                   quarter_length_divisors=DEFAULT_DIVISORS, tolerance=None, reports=None,
+                   keys=None, origin=0.0, time_map=None, tempi=None):
+    """Build a single-part stream.Score from note events, without any MIDI file"""
+    score = stream.Score()
+    score.insert(0, events_to_part(note_events, bpm=bpm,
+                                   quarter_length_divisors=quarter_length_divisors,
+                                   tolerance=tolerance, reports=reports, keys=keys,
+                                   origin=origin, time_map=time_map, tempi=tempi))
+    return score
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Deterministic spectral-peak transcription, a stand-in for the neural model
+
+Every frame of a Hann-windowed STFT contributes its strongest spectral
+peaks (parabolically interpolated, so low notes get the right semitone);
+peaks at a whole multiple of a stronger, lower peak in the same frame are
+taken as its harmonics and dropped. The remaining peaks fill a piano roll,
+whose runs become notes; a dip in a note's level between two attacks
+splits it in two.
+
+It is no match for basic-pitch on real recordings, but it needs nothing
+beyond NumPy, gives the same notes for the same audio every time and
+handles clean synthetic test signals (scales, chords) correctly, in a
+few milliseconds. Pipeline tests and benchmarks use it through the
+"spectral-peaks" backend (backends.py) to run without TensorFlow.
+"""
+
+import time
+
+import numpy as np
+
+from backends import TranscriptionBackend
+
+# Same as transcription.MINIMUM_NOTE_LENGTH (not imported: that module loads librosa)
+MINIMUM_NOTE_LENGTH = 127.70  # milliseconds
+
+# Rate files are decoded at for this backend: frames are sized in seconds,
+# and MAX_PITCH (4186 Hz) is well below the Nyquist frequency
+SAMPLE_RATE = 16000
+
+FRAME_SECONDS = 0.093
+HOP_SECONDS = 0.0116  # about basic-pitch's frame rate
+MIN_PITCH = 21   # A0
+MAX_PITCH = 108  # C8
+# Strongest peaks kept per frame
+PEAKS_PER_FRAME = 6
+# Peaks weaker than this fraction of their frame's strongest are ignored
+PEAK_RATIO = 0.1
+# Frames whose strongest peak is below this fraction of the loudest are silent
+SILENCE_RATIO = 0.01
+# A note is played again where its level dips below this fraction of the
+# level on both sides (within DIP_FRAMES)
+DIP_RATIO = 0.6
+DIP_FRAMES = 6
+# A peak within this many semitones of a multiple of a lower peak is a harmonic
+HARMONIC_TOLERANCE = 0.35
+
+
+def frame_spectra(y, sr):
+    """(magnitudes (frames, bins), bin frequency in Hz, hop in samples)"""
+    frame_length = 1 << int(np.round(np.log2(FRAME_SECONDS * sr)))
+    hop = max(int(round(HOP_SECONDS * sr)), 1)
+    y = np.pad(np.asarray(y, dtype=np.float32), frame_length // 2)
+    if len(y) < frame_length:
+        y = np.pad(y, (0, frame_length - len(y)))
+    frames = np.lib.stride_tricks.sliding_window_view(y, frame_length)[::hop]
+    spectra = np.abs(np.fft.rfft(frames * np.hanning(frame_length).astype(np.float32), axis=1))
+    return spectra, np.fft.rfftfreq(frame_length, 1.0 / sr), hop
+
+
+def frame_peaks(spectra, freqs):
+    """
+    (midi, magnitude) arrays of shape (frames, PEAKS_PER_FRAME): the
+    strongest non-harmonic peaks of each frame; midi is -1 where unused.
+    """
+    n_frames = len(spectra)
+    loudest = spectra.max() if spectra.size else 0.0
+    strongest = spectra.max(axis=1, keepdims=True)
+    in_range = (freqs >= 440.0 * 2 ** ((MIN_PITCH - 69.5) / 12)) & (freqs <= 440.0 * 2 ** ((MAX_PITCH - 68.5) / 12))
+    peak = np.zeros_like(spectra, dtype=bool)
+    peak[:, 1:-1] = (spectra[:, 1:-1] > spectra[:, :-2]) & (spectra[:, 1:-1] >= spectra[:, 2:])
+    peak &= in_range & (spectra >= PEAK_RATIO * strongest) & (strongest >= SILENCE_RATIO * loudest) & (loudest > 0)
+
+    # Strongest peaks of each frame, sorted by frequency
+    k = min(PEAKS_PER_FRAME, spectra.shape[1])
+    candidates = np.where(peak, spectra, -1.0)
+    top = np.sort(np.argpartition(-candidates, k - 1, axis=1)[:, :k], axis=1)
+    rows = np.arange(n_frames)[:, None]
+    valid = candidates[rows, top] > 0
+
+    # Parabolic interpolation on the log magnitude
+    log_spectra = np.log(spectra + 1e-12)
+    inner = np.clip(top, 1, spectra.shape[1] - 2)
+    left, middle, right = log_spectra[rows, inner - 1], log_spectra[rows, inner], log_spectra[rows, inner + 1]
+    curvature = left - 2 * middle + right
+    shift = np.where(curvature < 0, 0.5 * (left - right) / np.where(curvature < 0, curvature, -1), 0.0)
+    hz = (inner + np.clip(shift, -0.5, 0.5)) * (freqs[1] - freqs[0])
+    hz = np.where(valid, hz, np.nan)
+
+    # Harmonics: close to a whole multiple (2x or more) of a lower, valid peak
+    with np.errstate(invalid='ignore', divide='ignore'):
+        ratio = hz[:, :, None] / hz[:, None, :]
+        multiple = np.round(ratio)
+        off = np.abs(12 * np.log2(ratio / np.where(multiple > 0, multiple, 1)))
+    harmonic = ((multiple >= 2) & (off <= HARMONIC_TOLERANCE)).any(axis=2)
+    keep = valid & ~harmonic
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        midi = np.round(69 + 12 * np.log2(hz / 440.0))
+    midi = np.where(keep, midi, -1).astype(np.int64)
+    magnitude = np.where(keep, spectra[rows, top], 0.0)
+    return midi, magnitude
+
+
+def roll_to_notes(roll, levels, seconds_per_frame, min_frames):
+    """Note events from a boolean piano roll (frames, 128) and its levels"""
+    padded = np.zeros((roll.shape[0] + 2, roll.shape[1]), dtype=np.int8)
+    padded[1:-1] = roll
+    change = np.diff(padded, axis=0)
+    # Column-major order pairs every pitch's starts with its ends
+    start_pitch, start_frame = np.nonzero(change.T == 1)
+    _, end_frame = np.nonzero(change.T == -1)
+    long_enough = end_frame - start_frame >= min_frames
+    start_pitch, start_frame, end_frame = start_pitch[long_enough], start_frame[long_enough], end_frame[long_enough]
+
+    cumulative = np.concatenate([np.zeros((1, roll.shape[1])), np.cumsum(levels, axis=0)])
+    amplitude = (cumulative[end_frame, start_pitch] - cumulative[start_frame, start_pitch]) / (end_frame - start_frame)
+    order = np.lexsort((start_pitch, start_frame))
+    return [(float(start_frame[i] * seconds_per_frame), float(end_frame[i] * seconds_per_frame),
+             int(start_pitch[i]), float(amplitude[i]), None) for i in order]
+
+
+def spectral_peak_notes(y, sr, minimum_note_length=MINIMUM_NOTE_LENGTH, timings=None):
+    """Note events of a buffer at any sample rate, in the transcription.transcribe format"""
+    start = time.perf_counter()
+    spectra, freqs, hop = frame_spectra(y, sr)
+    midi, magnitude = frame_peaks(spectra, freqs)
+
+    roll = np.zeros((len(spectra), 128), dtype=bool)
+    levels = np.zeros((len(spectra), 128))
+    frames, slots = np.nonzero(midi >= 0)
+    roll[frames, midi[frames, slots]] = True
+    loudest = magnitude.max() if magnitude.size else 0.0
+    if loudest > 0:
+        levels[frames, midi[frames, slots]] = magnitude[frames, slots] / loudest
+
+    # Repeated notes: cut the roll at level dips between two attacks
+    if len(levels) > 2:
+        padded = np.pad(levels, ((DIP_FRAMES, DIP_FRAMES), (0, 0)))
+        windows = np.lib.stride_tricks.sliding_window_view(padded, DIP_FRAMES, axis=0)
+        before = windows[:-DIP_FRAMES - 1].max(axis=2)
+        after = windows[DIP_FRAMES + 1:].max(axis=2)
+        local_minimum = np.zeros_like(roll)
+        local_minimum[1:-1] = (levels[1:-1] <= levels[:-2]) & (levels[1:-1] < levels[2:])
+        roll &= ~(local_minimum & (levels < DIP_RATIO * np.minimum(before, after)))
+
+    seconds_per_frame = hop / sr
+    min_frames = max(int(round(minimum_note_length / 1000 / seconds_per_frame)), 1)
+    note_events = roll_to_notes(roll, levels, seconds_per_frame, min_frames)
+    if timings is not None:
+        timings['spectral_peaks'] = time.perf_counter() - start
+    return note_events
+
+
+class SpectralPeakBackend(TranscriptionBackend):
+    """The "spectral-peaks" backend: spectral_peak_notes, nothing to load"""
+
+    name = "spectral-peaks"
+    sample_rate = SAMPLE_RATE
+
+    def transcribe_notes(self, y, sr, timings=None, cancel_event=None,
+                         minimum_note_length=MINIMUM_NOTE_LENGTH, **params):
+        return spectral_peak_notes(y, sr, minimum_note_length, timings)
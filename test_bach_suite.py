@@ -7,6 +7,8 @@ A complex, real-world musical piece to verify the system works correctly
 import os
 from music21 import converter, instrument, metadata
 
+from note_table import NoteTable, pitch_names
+
 # Bach Cello Suite No. 1 - Prelude
 MIDI_INPUT = "/home/user/Audio2Score/bach_suite1_prelude.mid"
 OUTPUT_BASE = "/home/user/Audio2Score/bach_output"
@@ -41,19 +43,16 @@ def process_bach_suite(midi_path, instrument_name="Violoncello"):
         print(f"  File size: {os.path.getsize(midi_path):,} bytes")
         print(f"  Parts/Tracks: {len(score.parts)}")
 
-        # Analyze original structure
-        total_notes = 0
-        for i, part in enumerate(score.parts):
-            notes = part.flatten().notesAndRests
-            note_count = len([n for n in notes if hasattr(n, 'pitch')])
-            total_notes += note_count
-            if i < 3:  # Show first 3 parts
-                print(f"  - Part {i+1}: {note_count} notes")
+        # Analyze original structure: one walk over the score, then array queries
+        table = NoteTable.from_score(score)
+        note_counts = table.counts_per_part()
+        for i, note_count in enumerate(note_counts[:3]):  # Show first 3 parts
+            print(f"  - Part {i+1}: {note_count} notes")
 
         if len(score.parts) > 3:
             print(f"  - ... ({len(score.parts) - 3} more parts)")
 
-        print(f"  Total notes across all parts: {total_notes}")
+        print(f"  Total notes across all parts: {len(table)}")
 
     except Exception as e:
         print(f"✗ Error parsing MIDI: {e}")
@@ -70,18 +69,17 @@ def process_bach_suite(midi_path, instrument_name="Violoncello"):
 
         parts_kept = 0
         parts_skipped = 0
+        kept_ids = []
 
         for i, part in enumerate(score.parts):
             # Check if part has pitched notes
-            notes = part.flatten().notes
-            pitched_notes = [n for n in notes if hasattr(n, 'pitch')]
-
-            if len(pitched_notes) > 0:
+            if note_counts[i] > 0:
                 # Keep this part
                 filtered_score.append(part)
+                kept_ids.append(i)
                 parts_kept += 1
                 if parts_kept <= 3:
-                    print(f"  ✓ Part {i+1}: {len(pitched_notes)} pitched notes - KEPT")
+                    print(f"  ✓ Part {i+1}: {note_counts[i]} pitched notes - KEPT")
             else:
                 parts_skipped += 1
                 if parts_skipped <= 2:
@@ -194,10 +192,9 @@ def process_bach_suite(midi_path, instrument_name="Violoncello"):
         measures = main_part.getElementsByClass('Measure')
         print(f"Measures: {len(measures)}")
 
-        # Note analysis
-        all_notes = main_part.flatten().notesAndRests
-        notes = [n for n in all_notes if hasattr(n, 'pitch')]
-        rests = len(all_notes) - len(notes)
+        # Note analysis (rows of the table built in step 1)
+        notes = table.part(kept_ids[0])
+        rests = len(main_part.recurse().getElementsByClass('Rest'))
 
         print(f"Notes (part 1): {len(notes)}")
         print(f"Rests (part 1): {rests}")
@@ -217,20 +214,17 @@ def process_bach_suite(midi_path, instrument_name="Violoncello"):
             print(f"Time Signature: {time_sigs[0].ratioString}")
 
         # Pitch range
-        if notes:
-            pitches = [n.pitch.midi for n in notes]
-            lowest = min(pitches)
-            highest = max(pitches)
-            from music21 import pitch
-            lowest_note = pitch.Pitch(midi=lowest)
-            highest_note = pitch.Pitch(midi=highest)
-            print(f"Pitch range: {lowest_note.nameWithOctave} to {highest_note.nameWithOctave}")
+        if len(notes):
+            lowest, highest = table.pitch_range(kept_ids[0])
+            lowest_name, highest_name = pitch_names([lowest, highest])
+            print(f"Pitch range: {lowest_name} to {highest_name}")
             print(f"  (MIDI {lowest} to {highest}, range: {highest-lowest} semitones)")
 
         # Show first few notes as sample
         print(f"\nFirst 10 notes of the piece:")
-        for i, note in enumerate(notes[:10]):
-            print(f"  {i+1}. {note.pitch.nameWithOctave} (duration: {note.quarterLength})")
+        first = notes[:10]
+        for i, (name, duration) in enumerate(zip(pitch_names(first['pitch']), first['duration'])):
+            print(f"  {i+1}. {name} (duration: {duration:g})")
 
     except Exception as e:
         print(f"⚠ Warning during analysis: {e}")
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Test the transcription backend registry and the spectral-peak stand-in
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+import backends
+from backends import TranscriptionBackend, available_backends, get_backend, register_backend
+from spectral_peaks import spectral_peak_notes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+SCALE = [60, 62, 64, 65, 67, 69, 71, 72, 72, 71, 69, 67, 65, 64, 62, 60]
+SR = 22050
+
+
+def harmonic_tone(midi, seconds):
+    t = np.arange(int(seconds * SR)) / SR
+    f0 = 440.0 * 2 ** ((midi - 69) / 12)
+    return sum(np.sin(2 * np.pi * k * f0 * t) / k for k in range(1, 6))
+
+
+def test_registry():
+    assert available_backends()[:3] == ("basic-pitch", "monophonic", "spectral-peaks")
+    assert get_backend("spectral-peaks") is get_backend("spectral-peaks")
+    try:
+        get_backend("crepe")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown backend accepted")
+
+
+def test_factories_run_on_first_use():
+    calls = []
+
+    class Silent(TranscriptionBackend):
+        name = "silent"
+
+        def transcribe_notes(self, y, sr, timings=None, cancel_event=None, **params):
+            return []
+
+    def factory():
+        calls.append(1)
+        return Silent()
+
+    register_backend("silent", factory)
+    try:
+        assert calls == [] and "silent" in available_backends()
+        backend = get_backend("silent")
+        assert get_backend("silent") is backend and calls == [1]
+        # Unused decoding parameters are accepted
+        assert backend.transcribe(np.zeros(SR), SR, onset_threshold=0.5) == (None, None, [])
+        assert backend.version == "silent 1"
+        assert backend.latency_report()['first_run'] is not None
+    finally:
+        backends._factories.pop("silent")
+        backends._instances.pop("silent", None)
+
+
+def test_spectral_peaks_scale_and_chords():
+    y, sr = sf.read(AUDIO_FILE, dtype='float32')
+    events = spectral_peak_notes(y, sr)
+    assert [e[2] for e in events] == SCALE
+    assert all(abs(e[0] - 0.5 * i) <= 0.05 for i, e in enumerate(events))
+    # Deterministic: the same audio gives the same notes
+    assert spectral_peak_notes(y, sr) == events
+
+    y = np.r_[harmonic_tone(48, 1.0) + harmonic_tone(52, 1.0) + harmonic_tone(55, 1.0),
+              harmonic_tone(57, 1.0) + harmonic_tone(64, 1.0)]
+    notes = sorted((round(start, 1), pitch) for start, _, pitch, *_ in spectral_peak_notes(y, SR))
+    assert notes == [(0.0, 48), (0.0, 52), (0.0, 55), (1.0, 57), (1.0, 64)], notes
+    assert spectral_peak_notes(np.zeros(SR), SR) == []
+
+
+def test_stand_in_streams():
+    backend = get_backend("spectral-peaks")
+    y, sr = sf.read(AUDIO_FILE, dtype='float32')
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "scale.wav")
+        sf.write(path, y, sr)
+        streamed = backend.transcribe_stream(path, chunk_seconds=3.0, overlap_seconds=1.0)
+    assert [e[2] for e in streamed] == SCALE
+
+
+def test_jobs_decode_at_backend_rate():
+    seen = []
+
+    class Telephone(TranscriptionBackend):
+        name = "telephone"
+        sample_rate = 8000
+
+        def transcribe_notes(self, y, sr, timings=None, cancel_event=None, **params):
+            seen.append((sr, len(y)))
+            return [(0.0, 0.5, 60, 0.8, None)]
+
+    from pipeline import audio_to_score, prepare_transcription
+    from monophonic import MonophonicSession
+    from spectral_peaks import SpectralPeakBackend
+    from transcription import MODEL_SAMPLE_RATE, ModelSession
+
+    assert ModelSession.sample_rate == MonophonicSession.sample_rate == MODEL_SAMPLE_RATE
+    assert SpectralPeakBackend.sample_rate == 16000
+
+    register_backend("telephone", Telephone)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            audio_to_score(AUDIO_FILE, engine="telephone", detect_tempo=False,
+                           output_base=os.path.join(tmp, "scale"), formats=("midi",))
+            # Decoded once, straight to the backend's rate (the file is 8 s at 22050 Hz)
+            assert seen == [(8000, 8 * 8000)], seen
+            seen.clear()
+            get_backend("telephone").transcribe_stream(AUDIO_FILE, chunk_seconds=3.0, overlap_seconds=1.0)
+            assert seen and all(sr == 8000 for sr, _ in seen), seen
+            # No activations to tune: preparing runs nothing, the conversion transcribes once
+            seen.clear()
+            assert prepare_transcription(AUDIO_FILE, engine="telephone") == (None, None, None)
+            assert seen == [] and not get_backend("telephone").has_activations
+    finally:
+        backends._factories.pop("telephone")
+        backends._instances.pop("telephone", None)
+
+
+def test_pipeline_without_tensorflow():
+    # A fresh interpreter: converting with the stand-in never imports TensorFlow
+    script = (
+        "import sys, tempfile, os\n"
+        "from pipeline import audio_to_score\n"
+        "out = tempfile.mkdtemp()\n"
+        f"outputs = audio_to_score({AUDIO_FILE!r}, 'Violino', engine='spectral-peaks', detect_tempo=False,\n"
+        "                         output_base=os.path.join(out, 'scale'), formats=('midi',))\n"
+        "assert os.path.getsize(outputs['midi']) > 0\n"
+        "print('tensorflow' in sys.modules, 'basic_pitch' in sys.modules)\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=BASE_DIR,
+                            capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stderr[-2000:]
+    assert result.stdout.strip().splitlines()[-1] == "False False", result.stdout
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING TRANSCRIPTION BACKENDS")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_registry,
+                 test_factories_run_on_first_use,
+                 test_spectral_peaks_scale_and_chords,
+                 test_stand_in_streams,
+                 test_jobs_decode_at_backend_rate,
+                 test_pipeline_without_tensorflow):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Test the batch input expansion and the rerun/skip logic of the manifest
+
+The manifest tests write it by hand; the packing test transcribes two
+copies of the bundled scale recording in this process.
+"""
+
+import json
+import os
+import shutil
+import sys
+import tempfile
+
+import batch
+from batch import collect_inputs, convert_group, convert_one, file_signature, load_finished, output_base_for, run_batch
+from exporters import EXPORT_FORMATS, available_formats
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+
+def make_tree(root):
+    os.makedirs(os.path.join(root, "sub"))
+    paths = [os.path.join(root, "a.wav"), os.path.join(root, "sub", "a.mp3"),
+             os.path.join(root, "notes.txt")]
+    for path in paths:
+        with open(path, "wb") as f:
+            f.write(b"\0" * 16)
+    return paths
+
+
+def test_collect_directories_and_globs():
+    with tempfile.TemporaryDirectory() as root:
+        wav, mp3, _ = make_tree(root)
+        assert collect_inputs([root]) == sorted([wav, mp3])
+        assert collect_inputs([os.path.join(root, "**", "*.mp3")]) == [mp3]
+        # Same file from a directory and a glob is only listed once
+        assert collect_inputs([root, os.path.join(root, "*.wav")]) == sorted([wav, mp3])
+
+
+def test_output_names_do_not_collide():
+    assert output_base_for("/x/a.wav", "/out") != output_base_for("/y/a.wav", "/out")
+
+
+def test_finished_files_are_skipped_until_they_change():
+    with tempfile.TemporaryDirectory() as root:
+        wav, mp3, _ = make_tree(root)
+        midi = os.path.join(root, "a.mid")
+        open(midi, "w").close()
+        manifest = os.path.join(root, "manifest.jsonl")
+        with open(manifest, "w") as f:
+            f.write(json.dumps({'input': wav, 'source': file_signature(wav),
+                                'status': 'ok', 'outputs': {'midi': midi, 'pdf': None}}) + "\n")
+            f.write(json.dumps({'input': mp3, 'source': file_signature(mp3),
+                                'status': 'error', 'error': 'boom'}) + "\n")
+            f.write('{"input": "trunc')  # interrupted write
+
+        finished = load_finished(manifest)
+        assert finished == {wav: file_signature(wav)}
+
+        # A deleted output means the file has to be converted again
+        os.remove(midi)
+        assert load_finished(manifest) == {}
+
+
+def test_no_available_format_records_error():
+    with tempfile.TemporaryDirectory() as root:
+        wav, mp3, _ = make_tree(root)
+        record = convert_one(wav, os.path.join(root, "a"), "Pianoforte", formats=())
+        assert record['status'] == 'error' and record['outputs'] == {}, record
+        assert sorted(os.listdir(root)) == ["a.wav", "notes.txt", "sub"]  # nothing exported
+
+        # Formats whose renderer is missing here are filtered out to nothing:
+        # no default formats are exported in their place
+        missing = tuple(fmt for fmt in EXPORT_FORMATS if not available_formats((fmt,)))
+        if not missing:
+            return  # every renderer is installed
+        out = os.path.join(root, "out")
+        messages = []
+        summary = run_batch([root], out, formats=missing, progress=messages.append)
+        assert (summary['ok'], summary['error']) == (0, 2), summary
+        assert sorted(os.listdir(out)) == ["manifest.jsonl"]
+        with open(os.path.join(out, "manifest.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        assert sorted(r['input'] for r in records) == sorted([wav, mp3])
+        assert all(r['status'] == 'error' for r in records), records
+        # Not finished: converted on the next run once a renderer is installed
+        assert load_finished(os.path.join(out, "manifest.jsonl")) == {}
+
+
+def test_failed_jobs_get_error_records():
+    with tempfile.TemporaryDirectory() as root:
+        # Deleted after it was collected: an error record, not an exception
+        gone = os.path.join(root, "gone.wav")
+        record = convert_one(gone, os.path.join(root, "gone"), "Pianoforte",
+                             formats=("midi",), engine="spectral-peaks")
+        assert record['status'] == 'error' and record['source'] is None, record
+        assert record['error'].startswith("FileNotFoundError"), record
+
+        # Workers that cannot start break the pool: every file is recorded
+        # as failed and the run still writes its manifest and summary
+        wav = shutil.copy(AUDIO_FILE, os.path.join(root, "a.wav"))
+        out = os.path.join(root, "out")
+        summary = run_batch([wav], out, workers=1, formats=("midi",), engine="no-such-engine",
+                            progress=lambda message: None)
+        assert (summary['ok'], summary['error']) == (0, 1), summary
+        with open(os.path.join(out, "manifest.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        assert [r['input'] for r in records] == [wav]
+        assert records[0]['error'].startswith("BrokenProcessPool"), records
+
+
+def test_packed_files_get_timings_and_cache_status():
+    with tempfile.TemporaryDirectory() as root:
+        jobs = []
+        for name in ("a", "b"):
+            path = shutil.copy(AUDIO_FILE, os.path.join(root, name + ".wav"))
+            jobs.append((path, os.path.join(root, name)))
+        cache_dir = os.path.join(root, "cache")
+        try:
+            records = convert_group(jobs, "Pianoforte", cache_dir, formats=("midi",))
+            assert [r['status'] for r in records] == ['ok', 'ok'], records
+            packs = {r['packed']['id'] for r in records}
+            assert len(packs) == 1 and records[0]['packed']['files'] == 2
+            # Each file gets its own decoding and a share of the pack's inference
+            for record in records:
+                assert record['cache'] == 'miss'
+                assert record['timings']['decode'] >= 0 and record['timings']['inference'] > 0, record
+
+            # Cached now: not packed again, reported as cache hits
+            records = convert_group(jobs, "Pianoforte", cache_dir, formats=("midi",))
+            assert [r['cache'] for r in records] == ['hit', 'hit'], records
+            assert not any('packed' in r for r in records)
+        finally:
+            batch._worker_cache = None  # the per-worker cache points into root
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING BATCH MODE")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_collect_directories_and_globs,
+                 test_output_names_do_not_collide,
+                 test_finished_files_are_skipped_until_they_change,
+                 test_no_available_format_records_error,
+                 test_failed_jobs_get_error_records,
+                 test_packed_files_get_timings_and_cache_status):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
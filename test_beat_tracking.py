@@ -0,0 +1,141 @@
+#!/usr/bin/env python3
+"""
+Test tempo/beat tracking and the beat grid given to the score builder
+"""
+
+import sys
+
+import numpy as np
+
+from beat_tracking import beat_grid, beat_map, start_beat_tracking, tempo_changes, track_beats
+from score_builder import DEFAULT_TEMPO, notes_to_score, warp_seconds
+
+SR = 22050
+
+
+def click_track(bpm, seconds, first_beat=0.0):
+    """Short noise bursts on every beat"""
+    y = np.zeros(int(seconds * SR), dtype=np.float32)
+    burst = np.random.default_rng(0).standard_normal(int(0.02 * SR)).astype(np.float32)
+    for t in np.arange(first_beat, seconds - 0.05, 60.0 / bpm):
+        i = int(t * SR)
+        y[i:i + len(burst)] += burst * np.hanning(len(burst)).astype(np.float32)
+    return y
+
+
+def test_tracks_click_tempo():
+    tempo, beats = track_beats(click_track(100, 20.0, first_beat=0.25), SR)
+    assert abs(tempo - 100) < 3, tempo
+    bpm, origin = beat_grid(tempo, beats)
+    assert abs(bpm - 100) < 0.5, bpm
+    # The grid starts at or before the recording, in phase with the clicks
+    # (onset detection places beats up to a frame late)
+    assert -60.0 / bpm < origin <= 0.0
+    position = (np.arange(0.25, 19.9, 0.6) - origin) * bpm / 60
+    assert np.abs(position - np.round(position)).max() < 0.1
+
+
+def test_threaded_matches_direct():
+    y = click_track(90, 10.0)
+    timings = {}
+    tempo, beats = start_beat_tracking(y, SR, timings).result(timeout=120)
+    direct_tempo, direct_beats = track_beats(y, SR)
+    assert tempo == direct_tempo and np.allclose(beats, direct_beats)
+    assert 'beat_tracking' in timings
+
+
+def test_silence_has_no_tempo():
+    tempo, beats = track_beats(np.zeros(SR * 3, dtype=np.float32), SR)
+    assert tempo is None and len(beats) == 0
+    assert beat_grid(tempo, beats) == (DEFAULT_TEMPO, 0.0)
+
+
+def test_grid_folds_tempo():
+    beats = np.arange(0, 20, 60.0 / 240)
+    assert np.isclose(beat_grid(240.0, beats)[0], 120)
+    assert np.isclose(beat_grid(40.0, np.arange(0, 20, 1.5))[0], 80)
+    # Beats read back from the cache's JSON are a list
+    assert beat_grid(240.0, beats.tolist()) == beat_grid(240.0, beats)
+
+
+def test_score_follows_beat_grid():
+    # Notes on every beat at 90 BPM, starting 0.2 s into the recording
+    period = 60.0 / 90
+    events = [(0.2 + i * period, 0.2 + (i + 1) * period, 60 + i, 0.8, None) for i in range(8)]
+    score = notes_to_score(events, bpm=90, origin=0.2)
+    notes = list(score.recurse().notes)
+    assert [float(n.getOffsetInHierarchy(score)) for n in notes] == [float(i) for i in range(8)]
+    assert all(n.quarterLength == 1.0 for n in notes)
+    mark = score.recurse().getElementsByClass('MetronomeMark').first()
+    assert mark.number == 90 and mark.numberSounding is None
+    mark = notes_to_score(events, bpm=90.4).recurse().getElementsByClass('MetronomeMark').first()
+    assert mark.number == 90 and mark.getQuarterBPM() == 90.4
+
+
+def accelerating_beats():
+    """20 beats at 120 BPM from 0.3 s, then 20 at 150 BPM"""
+    return np.cumsum(np.r_[0.3, np.full(20, 0.5), np.full(20, 0.4)])
+
+
+def test_beat_map_follows_beats():
+    beats = accelerating_beats()
+    time_map = beat_map(120.0, beats)
+    quarters = warp_seconds(beats, time_map)
+    # One quarter note per beat, offset 0 one beat before the first
+    assert np.allclose(quarters, np.arange(1, len(beats) + 1))
+    assert np.isclose(warp_seconds(0.0, time_map), 0.4)
+    # Half way between two beats is half way between their quarters
+    assert np.isclose(warp_seconds(beats[25] + 0.2, time_map), 26.5)
+    # A beat the tracker skipped still counts
+    skipped = np.delete(beats, 5)
+    assert np.allclose(beat_map(120.0, skipped)[1], np.delete(np.arange(1, len(beats) + 1), 5))
+    # Beats at 240 BPM are eighth notes
+    assert np.allclose(np.diff(beat_map(240.0, np.arange(0, 5, 0.25))[1]), 0.5)
+    assert beat_map(None, np.zeros(0)) is None
+
+
+def test_tempo_changes_only_where_tempo_shifts():
+    tempi = tempo_changes(beat_map(120.0, accelerating_beats()))
+    assert tempi['offset'].tolist() == [0.0, 21.0]
+    assert np.allclose(tempi['bpm'], [120.0, 150.0])
+    # Small fluctuations around a steady tempo give a single mark
+    jitter = np.random.default_rng(1).normal(0, 0.01, 40)
+    steady = np.cumsum(np.full(40, 0.5) + jitter)
+    assert len(tempo_changes(beat_map(120.0, steady))) == 1
+
+
+def test_score_with_beat_map():
+    beats = accelerating_beats()
+    # One note on every beat: all quarter notes, no ties, two tempo marks
+    events = [(start, end, 60, 0.8, None) for start, end in zip(beats[:-1], beats[1:])]
+    time_map = beat_map(120.0, beats)
+    score = notes_to_score(events, time_map=time_map, tempi=tempo_changes(time_map))
+    notes = list(score.recurse().notes)
+    assert all(n.quarterLength == 1.0 and n.tie is None for n in notes)
+    marks = list(score.recurse().getElementsByClass('MetronomeMark'))
+    assert [m.number for m in marks] == [120, 150]
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING BEAT TRACKING")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_tracks_click_tempo,
+                 test_threaded_matches_direct,
+                 test_silence_has_no_tempo,
+                 test_grid_folds_tempo,
+                 test_score_follows_beat_grid,
+                 test_beat_map_follows_beats,
+                 test_tempo_changes_only_where_tempo_shifts,
+                 test_score_with_beat_map):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Test the content-addressed transcription cache (keys, LRU eviction, counters)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from cache import TranscriptionCache
+
+NOTE_EVENTS = [(0.0, 0.5, 60, 0.8, None), (0.5, 1.0, 64, 0.7, [0, 1, 1])]
+PARAMS = {'onset_threshold': 0.5, 'frame_threshold': 0.3}
+
+
+def write_audio(directory, name, content):
+    path = os.path.join(directory, name)
+    with open(path, 'wb') as f:
+        f.write(content)
+    return path
+
+
+def test_key_depends_on_content_params_and_model():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(os.path.join(tmp, "cache"))
+        a = write_audio(tmp, "a.wav", b"audio one")
+        a_copy = write_audio(tmp, "copy.wav", b"audio one")
+        b = write_audio(tmp, "b.wav", b"audio two")
+
+        key = cache.key(a, PARAMS, "model 1")
+        assert cache.key(a_copy, PARAMS, "model 1") == key  # content, not path
+        assert cache.key(b, PARAMS, "model 1") != key
+        assert cache.key(a, dict(PARAMS, onset_threshold=0.6), "model 1") != key
+        assert cache.key(a, PARAMS, "model 2") != key
+
+
+def test_round_trip_and_counters():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(tmp)
+        assert cache.get("missing") is None
+        cache.put("k", NOTE_EVENTS)
+        assert cache.get("k") == NOTE_EVENTS
+        stats = cache.stats()
+        assert (stats['hits'], stats['misses'], stats['entries']) == (1, 1, 1), stats
+
+
+def test_beats_stored_next_to_entry():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(tmp)
+        assert cache.get_beats("k") is None
+        cache.put("k", NOTE_EVENTS)
+        cache.put_beats("k", 123.0, [0.5, 1.0, 1.5])
+        tempo, beats = cache.get_beats("k")
+        # An array, as track_beats returns it: beat_grid does arithmetic on it
+        assert tempo == 123.0 and isinstance(beats, np.ndarray)
+        assert beats.tolist() == [0.5, 1.0, 1.5]
+        cache.put_beats("none", None, [])
+        tempo, beats = cache.get_beats("none")
+        assert tempo is None and len(beats) == 0
+        # Beat lookups do not count as transcription hits or misses
+        assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_activations_are_memory_mapped():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(tmp)
+        assert cache.get_activations("k") is None
+        rng = np.random.default_rng(0)
+        activations = {'note': rng.random((50, 88)), 'onset': rng.random((50, 88)),
+                       'contour': rng.random((50, 264))}
+        cache.put_activations("k", activations)
+        loaded = cache.get_activations("k")
+        for name, array in activations.items():
+            assert isinstance(loaded[name], np.memmap) and loaded[name].dtype == np.float32
+            assert np.allclose(loaded[name], array)
+        assert (cache.hits, cache.misses) == (0, 0)
+        # An entry with an evicted array is not returned
+        os.remove(os.path.join(tmp, "k.onset.npy"))
+        assert cache.get_activations("k") is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(tmp)
+        for key in ("old", "used", "new"):
+            cache.put(key, NOTE_EVENTS)
+            time.sleep(0.01)
+        entry_size = cache.stats()['bytes'] // 3
+
+        cache.get("used")  # refresh: now more recent than "new"
+        cache.max_bytes = 2 * entry_size
+        cache.evict()
+
+        assert cache.get("old") is None
+        assert cache.get("used") is not None
+        assert cache.get("new") is not None
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING TRANSCRIPTION CACHE")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_key_depends_on_content_params_and_model,
+                 test_round_trip_and_counters,
+                 test_beats_stored_next_to_entry,
+                 test_activations_are_memory_mapped,
+                 test_least_recently_used_entries_are_evicted):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
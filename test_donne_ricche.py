@@ -15,10 +15,7 @@ The script will process the audio through Audio2Score and generate:
 
 import os
 import sys
-import tempfile
-import shutil
-import glob
-from music21 import converter, instrument, metadata
+from music21 import instrument, metadata
 
 # Check if the audio file exists
 AUDIO_FILE = '/home/user/Audio2Score/donne_ricche_acoustic.mp3'
@@ -57,191 +54,165 @@ def process_donne_ricche(audio_path, instrument_choice="Pianoforte"):
         "Violoncello": instrument.Violoncello()
     }
 
-    temp_dir = tempfile.mkdtemp()
+    # Step 1: Load audio
+    print("[1/7] Loading audio file...")
+    print("  Loading with librosa at the model's native sample rate")
 
     try:
-        # Step 1: Load audio
-        print("[1/8] Loading audio file...")
-        print("  Loading with librosa at 16kHz sample rate")
-
-        try:
-            import librosa
-            import soundfile as sf
-
-            wav_path = os.path.join(temp_dir, "input.wav")
-            y, sr = librosa.load(audio_path, sr=16000)
-            sf.write(wav_path, y, sr)
-
-            duration = len(y) / sr
-            print(f"  ✓ Audio loaded: {duration:.1f} seconds")
-            print()
-        except Exception as e:
-            print(f"  ✗ Error loading audio: {e}")
-            return False
-
-        # Step 2: Transcribe to MIDI with basic-pitch
-        print("[2/8] Transcribing audio to MIDI with ML model...")
-        print("  Using Spotify's basic-pitch neural network")
-
-        try:
-            from basic_pitch.inference import predict_and_save
-
-            predict_and_save(
-                [wav_path],
-                output_directory=temp_dir,
-                save_midi=True,
-                save_model_outputs=False,
-                sonify_midi=False
-            )
-
-            print(f"  ✓ Audio transcribed to MIDI")
-            print()
-        except ImportError:
-            print(f"  ⚠ basic-pitch not installed - using simulation")
-            print(f"    Install with: pip install basic-pitch")
-            print()
-            return False
-        except Exception as e:
-            print(f"  ✗ Transcription error: {e}")
-            return False
-
-        # Step 3: Find generated MIDI file
-        print("[3/8] Locating generated MIDI file...")
-
-        midi_files = glob.glob(os.path.join(temp_dir, "*_basic_pitch.mid"))
-        if not midi_files:
-            print(f"  ✗ No MIDI file generated")
-            return False
-
-        midi_path_temp = midi_files[0]
-        print(f"  ✓ Found: {os.path.basename(midi_path_temp)}")
-        print()
+        from transcription import format_timings, load_audio
 
-        # Step 4: Parse MIDI
-        print("[4/8] Parsing MIDI file...")
-
-        try:
-            score = converter.parse(midi_path_temp)
-
-            # Count notes
-            total_notes = 0
-            for part in score.parts:
-                notes = part.flatten().notes
-                pitched_notes = [n for n in notes if hasattr(n, 'pitch')]
-                total_notes += len(pitched_notes)
-
-            print(f"  ✓ MIDI parsed successfully")
-            print(f"    Parts: {len(score.parts)}")
-            print(f"    Total notes: {total_notes}")
-            print()
-        except Exception as e:
-            print(f"  ✗ Parsing error: {e}")
-            return False
-
-        # Step 5: Assign instrument
-        print(f"[5/8] Assigning instrument: {instrument_choice}...")
-
-        try:
-            chosen_instrument = SUPPORTED_INSTRUMENTS[instrument_choice]
-            for part in score.parts:
-                part.insert(0, chosen_instrument)
-
-            print(f"  ✓ {instrument_choice} assigned")
-            print()
-        except Exception as e:
-            print(f"  ✗ Error assigning instrument: {e}")
-            return False
-
-        # Step 6: Add metadata
-        print("[6/8] Adding metadata...")
-
-        try:
-            if not score.metadata:
-                score.metadata = metadata.Metadata()
-            score.metadata.title = "Donne Ricche (Acoustic)"
-            score.metadata.composer = "Tony Pitoni"
-
-            print(f"  ✓ Metadata added")
-            print(f"    Title: {score.metadata.title}")
-            print(f"    Composer: {score.metadata.composer}")
-            print()
-        except Exception as e:
-            print(f"  ✗ Error adding metadata: {e}")
-            return False
-
-        # Step 7: Export to formats
-        print("[7/8] Exporting to multiple formats...")
-
-        output_base = os.path.abspath("donne_ricche_output")
-
-        # MIDI
-        try:
-            midi_out = output_base + ".mid"
-            score.write('midi', fp=midi_out)
-            print(f"  ✓ MIDI: {os.path.basename(midi_out)} ({os.path.getsize(midi_out):,} bytes)")
-        except Exception as e:
-            print(f"  ✗ MIDI export failed: {e}")
-
-        # MusicXML
-        try:
-            xml_out = output_base + ".musicxml"
-            score.write('musicxml', fp=xml_out)
-            print(f"  ✓ MusicXML: {os.path.basename(xml_out)} ({os.path.getsize(xml_out):,} bytes)")
-        except Exception as e:
-            print(f"  ✗ MusicXML export failed: {e}")
-
-        # PDF (optional)
-        try:
-            pdf_out = output_base + ".pdf"
-            score.write('musicxml.pdf', fp=pdf_out)
-            print(f"  ✓ PDF: {os.path.basename(pdf_out)} ({os.path.getsize(pdf_out):,} bytes)")
-        except Exception as e:
-            print(f"  ⚠ PDF: Not available (MuseScore required)")
+        timings = {}
+        y, sr = load_audio(audio_path, timings=timings)
 
+        duration = len(y) / sr
+        print(f"  ✓ Audio loaded: {duration:.1f} seconds")
         print()
+    except Exception as e:
+        print(f"  ✗ Error loading audio: {e}")
+        return False
 
-        # Step 8: Analyze the score
-        print("[8/8] Analyzing generated score...")
+    # Step 2: Transcribe to MIDI with basic-pitch
+    print("[2/7] Transcribing audio to MIDI with ML model...")
+    print("  Using Spotify's basic-pitch neural network")
 
-        main_part = score.parts[0] if score.parts else None
-        if main_part:
-            notes = [n for n in main_part.flatten().notes if hasattr(n, 'pitch')]
+    try:
+        from backends import get_backend
 
-            print(f"  Instrument: {main_part.getInstrument().instrumentName}")
-            print(f"  Notes in main melody: {len(notes)}")
+        # AUDIO2SCORE_BACKEND selects another engine (default: basic-pitch)
+        note_events = get_backend().notes(y, sr, timings=timings)
 
-            if notes:
-                pitches_midi = [n.pitch.midi for n in notes]
-                from music21 import pitch
-                lowest = pitch.Pitch(midi=min(pitches_midi))
-                highest = pitch.Pitch(midi=max(pitches_midi))
-                print(f"  Range: {lowest.nameWithOctave} - {highest.nameWithOctave}")
+        print(f"  ✓ Audio transcribed to note events")
+        print(f"    Stage timings: {format_timings(timings)}")
+        print()
+    except ImportError:
+        print(f"  ⚠ basic-pitch not installed - using simulation")
+        print(f"    Install with: pip install basic-pitch")
+        print()
+        return False
+    except Exception as e:
+        print(f"  ✗ Transcription error: {e}")
+        return False
 
-            measures = main_part.getElementsByClass('Measure')
-            if measures:
-                print(f"  Measures: {len(measures)}")
+    # Step 3: Build score from the note events (no MIDI round-trip)
+    print("[3/7] Building score from note events...")
 
+    try:
+        from score_builder import notes_to_score
+
+        score = notes_to_score(note_events)
+
+        # Count notes
+        total_notes = 0
+        for part in score.parts:
+            notes = part.flatten().notes
+            pitched_notes = [n for n in notes if hasattr(n, 'pitch')]
+            total_notes += len(pitched_notes)
+
+        print(f"  ✓ Score built successfully")
+        print(f"    Parts: {len(score.parts)}")
+        print(f"    Total notes: {total_notes}")
         print()
-        print("="*70)
-        print("✓ SUCCESS! Tony Pitoni - Donne Ricche processed!")
-        print("="*70)
-        print()
-        print("Generated files:")
-        print(f"  • donne_ricche_output.mid")
-        print(f"  • donne_ricche_output.musicxml")
+    except Exception as e:
+        print(f"  ✗ Score building error: {e}")
+        return False
+
+    # Step 4: Assign instrument
+    print(f"[4/7] Assigning instrument: {instrument_choice}...")
+
+    try:
+        chosen_instrument = SUPPORTED_INSTRUMENTS[instrument_choice]
+        for part in score.parts:
+            part.insert(0, chosen_instrument)
+
+        print(f"  ✓ {instrument_choice} assigned")
         print()
-        print("Open the MusicXML file in MuseScore, Finale, or Sibelius")
-        print("to see the complete score of the acoustic version!")
+    except Exception as e:
+        print(f"  ✗ Error assigning instrument: {e}")
+        return False
+
+    # Step 5: Add metadata
+    print("[5/7] Adding metadata...")
+
+    try:
+        if not score.metadata:
+            score.metadata = metadata.Metadata()
+        score.metadata.title = "Donne Ricche (Acoustic)"
+        score.metadata.composer = "Tony Pitoni"
+
+        print(f"  ✓ Metadata added")
+        print(f"    Title: {score.metadata.title}")
+        print(f"    Composer: {score.metadata.composer}")
         print()
+    except Exception as e:
+        print(f"  ✗ Error adding metadata: {e}")
+        return False
+
+    # Step 6: Export to formats
+    print("[6/7] Exporting to multiple formats...")
+
+    output_base = os.path.abspath("donne_ricche_output")
+
+    # MIDI
+    try:
+        midi_out = output_base + ".mid"
+        score.write('midi', fp=midi_out)
+        print(f"  ✓ MIDI: {os.path.basename(midi_out)} ({os.path.getsize(midi_out):,} bytes)")
+    except Exception as e:
+        print(f"  ✗ MIDI export failed: {e}")
+
+    # MusicXML
+    try:
+        xml_out = output_base + ".musicxml"
+        score.write('musicxml', fp=xml_out)
+        print(f"  ✓ MusicXML: {os.path.basename(xml_out)} ({os.path.getsize(xml_out):,} bytes)")
+    except Exception as e:
+        print(f"  ✗ MusicXML export failed: {e}")
+
+    # PDF (optional)
+    try:
+        pdf_out = output_base + ".pdf"
+        score.write('musicxml.pdf', fp=pdf_out)
+        print(f"  ✓ PDF: {os.path.basename(pdf_out)} ({os.path.getsize(pdf_out):,} bytes)")
+    except Exception as e:
+        print(f"  ⚠ PDF: Not available (MuseScore required)")
+
+    print()
+
+    # Step 7: Analyze the score
+    print("[7/7] Analyzing generated score...")
+
+    main_part = score.parts[0] if score.parts else None
+    if main_part:
+        notes = [n for n in main_part.flatten().notes if hasattr(n, 'pitch')]
+
+        print(f"  Instrument: {main_part.getInstrument().instrumentName}")
+        print(f"  Notes in main melody: {len(notes)}")
+
+        if notes:
+            pitches_midi = [n.pitch.midi for n in notes]
+            from music21 import pitch
+            lowest = pitch.Pitch(midi=min(pitches_midi))
+            highest = pitch.Pitch(midi=max(pitches_midi))
+            print(f"  Range: {lowest.nameWithOctave} - {highest.nameWithOctave}")
 
-        return True
+        measures = main_part.getElementsByClass('Measure')
+        if measures:
+            print(f"  Measures: {len(measures)}")
+
+    print()
+    print("="*70)
+    print("✓ SUCCESS! Tony Pitoni - Donne Ricche processed!")
+    print("="*70)
+    print()
+    print("Generated files:")
+    print(f"  • donne_ricche_output.mid")
+    print(f"  • donne_ricche_output.musicxml")
+    print()
+    print("Open the MusicXML file in MuseScore, Finale, or Sibelius")
+    print("to see the complete score of the acoustic version!")
+    print()
 
-    finally:
-        # Cleanup
-        try:
-            shutil.rmtree(temp_dir)
-        except:
-            pass
+    return True
 
 if __name__ == "__main__":
     # Check for audio file
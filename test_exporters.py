@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Test the export plan (format selection, renderer detection, concurrent
+writers with per-format timeouts)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+import exporters
+from exporters import export_score, plan_exports
+from score_builder import notes_to_score
+from transcription import ConversionCancelled
+
+NOTE_EVENTS = [(0.0, 0.5, 60, 0.8, None), (0.5, 1.0, 64, 0.7, None), (1.0, 2.0, 67, 0.6, None)]
+
+
+def test_plan_skips_missing_renderers():
+    saved = exporters._renderers
+    exporters._renderers = {'musescore': None, 'lilypond': '/usr/bin/lilypond'}
+    try:
+        plan = plan_exports("/tmp/out", ("midi", "pdf", "png"))
+    finally:
+        exporters._renderers = saved
+    assert plan == {'midi': "/tmp/out.mid", 'png': "/tmp/out.png"}, plan
+
+
+def test_plan_rejects_unknown_formats():
+    try:
+        plan_exports("/tmp/out", ("midi", "mp3"))
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown format accepted")
+
+
+def test_writers_run_and_time_out_independently():
+    score = notes_to_score(NOTE_EVENTS)
+    timings = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = plan_exports(os.path.join(tmp, "score"), ("midi", "musicxml"))
+        outputs = export_score(score, plan, timings=timings)
+        assert all(os.path.getsize(path) > 0 for path in outputs.values()), outputs
+        assert set(timings) == {'export_midi', 'export_musicxml'}, timings
+
+        plan = plan_exports(os.path.join(tmp, "slow"), ("midi", "musicxml"))
+        outputs = export_score(score, plan, timeouts={'musicxml': 0})
+        assert outputs['musicxml'] is None, outputs
+        assert outputs['midi'] is not None, outputs
+
+
+def test_cancel_terminates_writers():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = plan_exports(os.path.join(tmp, "score"), ("musicxml",))
+        try:
+            export_score(notes_to_score(NOTE_EVENTS), plan, cancel_event=cancel_event)
+        except ConversionCancelled:
+            pass
+        else:
+            raise AssertionError("cancelled export did not stop")
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING EXPORT PLAN")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_plan_skips_missing_renderers,
+                 test_plan_rejects_unknown_formats,
+                 test_writers_run_and_time_out_independently,
+                 test_cancel_terminates_writers):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
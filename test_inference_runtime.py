@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Test inference runtime selection and batched inference across files
+"""
+
+import json
+import os
+import sys
+import tempfile
+
+import numpy as np
+import soundfile as sf
+
+from batch import run_batch
+from transcription import (
+    MODEL_SAMPLE_RATE as SR, ModelSession, available_runtimes, load_audio, load_model, run_model,
+)
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+session = ModelSession(intra_op_threads=1, inter_op_threads=1)
+
+
+def clips():
+    """Three buffers of different lengths (one, two and several model windows)"""
+    y, sr = load_audio(AUDIO_FILE)
+    return [(y[:int(1.5 * sr)], sr), (y[int(2 * sr):int(5.5 * sr)], sr), (y, sr)]
+
+
+def test_runtimes():
+    assert 'tensorflow' in available_runtimes()
+    for runtime in ('pytorch', 'onnx'):
+        if runtime in available_runtimes():
+            continue
+        try:
+            load_model(runtime=runtime)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f"{runtime} accepted")
+
+
+def test_batched_windows_match_single_windows():
+    y, _ = load_audio(AUDIO_FILE)
+    model = session.get_model()
+    single = run_model(y, SR, model, batch_windows=1)
+    batched = run_model(y, SR, model)
+    for k in single:
+        assert single[k].shape == batched[k].shape, k
+        assert np.abs(single[k] - batched[k]).max() < 1e-4, k
+
+
+def test_transcribe_many_matches_per_file():
+    buffers = clips()
+    packed = session.transcribe_many(buffers)
+    assert len(packed) == len(buffers)
+    for (y, sr), (activations, _, note_events) in zip(buffers, packed):
+        reference, _, expected = session.transcribe(y, sr)
+        assert activations['note'].shape == reference['note'].shape
+        assert note_events == expected, (note_events, expected)
+    assert session.transcribe_many([]) == []
+
+
+def test_tflite_runtime():
+    if 'tflite' not in available_runtimes():
+        return
+    tflite = ModelSession(runtime='tflite', intra_op_threads=1)
+    assert tflite.version != session.version
+    y, sr = load_audio(AUDIO_FILE)
+    assert [e[2] for e in tflite.notes(y, sr)] == [e[2] for e in session.notes(y, sr)]
+
+
+def test_packed_batch():
+    with tempfile.TemporaryDirectory() as root:
+        inputs = os.path.join(root, "in")
+        os.makedirs(inputs)
+        for i, (y, sr) in enumerate(clips()):
+            sf.write(os.path.join(inputs, f"clip{i}.wav"), y, sr)
+        summary = run_batch([inputs], os.path.join(root, "out"), workers=1, formats=['midi'],
+                            engine='spectral-peaks', pack_files=2, progress=lambda message: None)
+        assert summary['ok'] == 3 and summary['error'] == 0, summary
+        with open(os.path.join(root, "out", "manifest.jsonl")) as f:
+            records = [json.loads(line) for line in f]
+        assert sorted(r['packed']['files'] for r in records) == [1, 2, 2]
+        assert all(os.path.exists(r['outputs']['midi']) for r in records)
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING INFERENCE RUNTIMES AND BATCHING")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_runtimes,
+                 test_batched_windows_match_single_windows,
+                 test_transcribe_many_matches_per_file,
+                 test_tflite_runtime,
+                 test_packed_batch):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+Test key estimation and tracking on pitch-class histograms
+"""
+
+import sys
+
+import numpy as np
+
+from key_estimation import (
+    MODES, estimate_key, estimate_keys, key_name, track_keys, windowed_histograms,
+)
+from score_builder import notes_to_score
+
+G_MAJOR_SCALE = [67, 69, 71, 72, 74, 76, 78, 79]
+A_HARMONIC_MINOR = [57, 59, 60, 62, 64, 65, 68, 69]
+
+
+def scale_notes(pitches, repeats, start=0.0):
+    """(onsets, durations, pitches) of a scale played in quarter notes, tonic held longer"""
+    pitches = list(pitches) * repeats
+    durations = np.array([2.0 if i % 8 in (0, 7) else 1.0 for i in range(len(pitches))])
+    onsets = start + np.r_[0.0, np.cumsum(durations)[:-1]]
+    return onsets, durations, np.array(pitches)
+
+
+def describe(record):
+    return key_name(int(record['tonic']), int(record['mode'])), MODES[record['mode']]
+
+
+def test_global_key():
+    _, durations, pitches = scale_notes(G_MAJOR_SCALE, 2)
+    assert describe(estimate_key(pitches, durations)) == ('G', 'major')
+    _, durations, pitches = scale_notes(A_HARMONIC_MINOR, 2)
+    assert describe(estimate_key(pitches, durations)) == ('a', 'minor')
+    assert estimate_key([], []) is None
+    assert len(estimate_keys([], [], [])) == 0
+
+
+def test_windowed_histograms_match_overlap():
+    rng = np.random.default_rng(5)
+    onsets = rng.uniform(0, 40, 200)
+    durations = rng.uniform(0.1, 6, 200)
+    pitches = rng.integers(40, 90, 200)
+    edges = np.arange(0, 48, 4.0)
+    histograms = windowed_histograms(onsets, durations, pitches, edges)
+    # Overlap of every note with every bin, the slow way
+    overlap = (np.minimum(onsets + durations, edges[1:, None]) - np.maximum(onsets, edges[:-1, None])).clip(0)
+    expected = np.stack([overlap[:, pitches % 12 == pc].sum(axis=1) for pc in range(12)], axis=1)
+    assert np.allclose(histograms, expected)
+
+
+def test_tracks_modulation():
+    onsets_c, durations_c, pitches_c = scale_notes([60, 62, 64, 65, 67, 69, 71, 72], 6)
+    onsets_g, durations_g, pitches_g = scale_notes(G_MAJOR_SCALE, 6, start=64.0)
+    segments = track_keys(np.r_[onsets_c, onsets_g], np.r_[durations_c, durations_g],
+                          np.r_[pitches_c, pitches_g])
+    assert [describe(s)[0] for s in segments] == ['C', 'G']
+    assert segments['offset'][0] == 0.0
+    # The change is found within a window of where it happens
+    assert abs(segments['offset'][1] - 64.0) <= 8.0
+    assert segments['offset'][1] % 4.0 == 0.0
+
+
+def test_short_excursion_is_ignored():
+    onsets, durations, pitches = scale_notes([60, 62, 64, 65, 67, 69, 71, 72], 8)
+    # Two quarter notes of F# and C# in the middle are not a modulation
+    pitches = pitches.copy()
+    pitches[30:32] = [66, 61]
+    segments = track_keys(onsets, durations, pitches)
+    assert [describe(s) for s in segments] == [('C', 'major')]
+
+
+def test_invalid_window():
+    try:
+        track_keys([0.0], [1.0], [60], window=0)
+    except ValueError:
+        return
+    raise AssertionError("window=0 accepted")
+
+
+def test_keys_inserted_in_score():
+    onsets, durations, pitches = scale_notes(G_MAJOR_SCALE, 2)
+    # At 120 BPM one quarter note is half a second
+    events = [(o / 2, (o + d) / 2, int(p), 0.8, None) for o, d, p in zip(onsets, durations, pitches)]
+    keys = estimate_keys(onsets, durations, pitches)
+    score = notes_to_score(events, keys=keys)
+    found = list(score.recurse().getElementsByClass('Key'))
+    assert len(found) == 1
+    assert found[0].tonic.name == 'G' and found[0].mode == 'major'
+    assert found[0].getOffsetInHierarchy(score) == 0.0
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING KEY ESTIMATION")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_global_key,
+                 test_windowed_histograms_match_overlap,
+                 test_tracks_modulation,
+                 test_short_excursion_is_ignored,
+                 test_invalid_window,
+                 test_keys_inserted_in_score):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+"""
+Test the monophonic transcription engine on synthetic and bundled recordings
+"""
+
+import os
+import sys
+
+import numpy as np
+
+from monophonic import MonophonicSession, transcribe_monophonic, yin_pitch
+from backends import get_backend
+from score_builder import notes_to_score
+from transcription import MODEL_SAMPLE_RATE as SR, load_audio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+SCALE = [60, 62, 64, 65, 67, 69, 71, 72, 72, 71, 69, 67, 65, 64, 62, 60]
+ONSET_TOLERANCE = 0.05
+
+
+def bowed(notes, vibrato=0.005):
+    """(start_s, end_s, midi) notes rendered with harmonics and vibrato"""
+    y = np.zeros(int((max(end for _, end, _ in notes) + 0.5) * SR))
+    for start, end, midi in notes:
+        t = np.arange(int((end - start) * SR)) / SR
+        f0 = 440.0 * 2 ** ((midi - 69) / 12)
+        phase = 2 * np.pi * f0 * t + vibrato * f0 / 5.5 * np.sin(2 * np.pi * 5.5 * t)
+        envelope = np.minimum(1, t / 0.03) * np.minimum(1, (end - start - t) / 0.02)
+        i = int(start * SR)
+        y[i:i + len(t)] += envelope * sum(np.sin(k * phase) / k ** 0.8 for k in range(1, 9))
+    return (y / np.abs(y).max()).astype(np.float32)
+
+
+def matches(expected, events):
+    return all(any(p == midi and abs(s - start) <= ONSET_TOLERANCE for s, _, p, *_ in events)
+               for start, _, midi in expected)
+
+
+def test_yin_pitch_of_pure_tones():
+    for hz in (65.4, 220.0, 1318.5):
+        y = np.sin(2 * np.pi * hz * np.arange(SR) / SR).astype(np.float32)
+        f0, voiced, rms, _ = yin_pitch(y, SR)
+        steady = f0[10:-10]
+        assert np.all(voiced[10:-10] > 0.9), hz
+        # Within 5 cents of the true frequency
+        assert np.abs(1200 * np.log2(steady / hz)).max() < 5, (hz, steady.min(), steady.max())
+
+
+def test_transcribes_scale():
+    y, sr = load_audio(AUDIO_FILE)
+    events = transcribe_monophonic(y, sr)
+    assert [e[2] for e in events] == SCALE
+    assert all(abs(e[0] - 0.5 * i) <= ONSET_TOLERANCE for i, e in enumerate(events))
+    assert all(0 < e[3] <= 1 and e[4] is None for e in events)
+
+
+def test_cello_register_and_repeated_notes():
+    # Low cello notes, a fast run, and the same pitch bowed twice
+    notes = [(0.0, 0.6, 36), (0.6, 1.2, 43), (1.2, 1.35, 50), (1.35, 1.5, 52),
+             (1.5, 1.65, 54), (1.65, 2.4, 55), (2.4, 3.0, 55)]
+    events = transcribe_monophonic(bowed(notes), SR)
+    assert len(events) == len(notes), events
+    assert matches(notes, events)
+
+
+def test_silence_and_short_blips():
+    assert transcribe_monophonic(np.zeros(SR, dtype=np.float32), SR) == []
+    # A 40 ms note is shorter than the minimum note length
+    assert transcribe_monophonic(bowed([(0.2, 0.24, 69)]), SR) == []
+
+
+def test_session_stream_matches_one_shot():
+    session = get_backend("monophonic")
+    assert isinstance(session, MonophonicSession) and session.version.startswith("monophonic")
+    y, sr = load_audio(AUDIO_FILE)
+    _, _, reference = session.transcribe(y, sr, onset_threshold=0.5, frame_threshold=0.3)
+    streamed = session.transcribe_stream(AUDIO_FILE, chunk_seconds=3.0, overlap_seconds=1.0)
+    assert [e[2] for e in streamed] == [e[2] for e in reference]
+    assert all(abs(a[0] - b[0]) <= ONSET_TOLERANCE for a, b in zip(streamed, reference))
+    try:
+        get_backend("crepe")
+    except ValueError:
+        pass
+    else:
+        raise AssertionError("unknown engine accepted")
+
+
+def test_events_build_a_score():
+    y, sr = load_audio(AUDIO_FILE)
+    score = notes_to_score(transcribe_monophonic(y, sr))
+    assert [n.pitch.midi for n in score.recurse().notes] == SCALE
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING MONOPHONIC TRANSCRIPTION")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_yin_pitch_of_pure_tones,
+                 test_transcribes_scale,
+                 test_cello_register_and_repeated_notes,
+                 test_silence_and_short_blips,
+                 test_session_stream_matches_one_shot,
+                 test_events_build_a_score):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,181 @@
+#!/usr/bin/env python3
+"""
+Test notation computed on note arrays: layout, beams against music21's
+getBeams, and exports of notated scores without makeNotation
+"""
+
+import os
+import re
+import sys
+import tempfile
+from fractions import Fraction
+
+import numpy as np
+from music21 import converter, duration, meter, note, stream
+
+from exporters import export_score, plan_exports
+from midi_writer import write_midi
+from musicxml_writer import write_musicxml
+from notation import beam_spans, beam_types, is_notated, layout, notatable_lengths
+from note_table import NoteTable
+from score_builder import notes_to_score
+
+# (start_s, end_s, pitch_midi, amplitude, pitch_bends) at 120 BPM: notes
+# across barlines, a 5/12 quarter note, a chord, overlapping notes
+NOTE_EVENTS = [
+    (0.0, 0.5, 60, 0.8, None),
+    (0.25, 1.3, 64, 0.7, None),
+    (1.0, 3.2, 67, 0.6, None),
+    (3.5, 3.7083, 72, 0.6, None),
+    (4.0, 5.0, 55, 0.7, None),
+    (4.0, 5.0, 59, 0.7, None),
+    (4.0, 4.5, 79, 0.7, None),
+    (5.25, 7.0, 62, 0.5, None),
+]
+
+# Part and instrument ids are random for every export
+RANDOM_ID = re.compile(rb'\b[PI][0-9a-f]{32}\b')
+
+TICKS = 48  # per quarter note: sixteenths, triplets and their halves
+
+# Duration types with 1, 2, 3... beams
+BEAMED_TYPES = ('eighth', '16th', '32nd', '64th', '128th')
+
+
+def sounding(score):
+    """(part, onset, pitch, duration) of every sounding note, ties joined"""
+    rows = NoteTable.from_score(score).notes
+    return sorted(zip(rows['part'].tolist(), np.round(rows['onset'], 4).tolist(),
+                      rows['pitch'].tolist(), np.round(rows['duration'], 4).tolist()))
+
+
+def test_notatable_lengths():
+    assert notatable_lengths(1.5) == (1.5,)
+    assert notatable_lengths(Fraction(2, 3)) == (Fraction(2, 3),)
+    assert notatable_lengths(2.5) == (2.0, 0.5)
+    assert notatable_lengths(Fraction(5, 12)) == (Fraction(1, 3), Fraction(1, 12))
+    for length in (1.25, Fraction(7, 12), Fraction(11, 6), 3.75, Fraction(13, 12)):
+        pieces = notatable_lengths(length)
+        assert sum(Fraction(p) for p in pieces) == length, (length, pieces)
+        for piece in pieces:
+            d = duration.Duration(piece)
+            assert d.type != 'complex' and all(t.numberNotesActual == 3 for t in d.tuplets), (length, piece)
+
+
+def test_layout_fills_measures():
+    rng = np.random.default_rng(0)
+    bar_ticks = 4 * TICKS
+    for _ in range(200):
+        onsets = np.sort(rng.integers(0, 3 * bar_ticks, rng.integers(1, 20)) // 4 * 4)
+        ends = onsets + rng.integers(1, bar_ticks * 2, len(onsets)) // 4 * 4 + 4
+        rows = layout(onsets, ends, TICKS, bar_ticks)
+        # Every voice of every measure is filled exactly, without overlaps
+        for m, v in set(zip(rows['measure'].tolist(), rows['voice'].tolist())):
+            cell = rows[(rows['measure'] == m) & (rows['voice'] == v)]
+            assert cell['start'][0] == m * bar_ticks
+            assert np.array_equal(cell['start'][1:], (cell['start'] + cell['length'])[:-1])
+            assert cell['start'][-1] + cell['length'][-1] == (m + 1) * bar_ticks
+        # The tied noteheads of every note add up to it, tied start to stop
+        for group, (onset, end) in enumerate(zip(onsets.tolist(), ends.tolist())):
+            heads = np.sort(rows[rows['group'] == group], order='start')
+            assert heads['start'][0] == onset and heads['length'].sum() == end - onset
+            expected = [0] if len(heads) == 1 else [1] + [2] * (len(heads) - 2) + [3]
+            assert heads['tie'].tolist() == expected
+
+
+def test_beams_match_music21():
+    rng = np.random.default_rng(1)
+    ts = meter.TimeSignature('4/4')
+    spans = beam_spans('4/4', TICKS)
+    values = [Fraction(1, 2), Fraction(1, 4), Fraction(1, 3), Fraction(1, 6), Fraction(1, 12),
+              Fraction(3, 4), Fraction(1, 1), Fraction(3, 8), Fraction(1, 8), Fraction(1, 16)]
+    for _ in range(500):
+        lengths = []
+        while sum(lengths) < 4:
+            lengths.append(min(values[rng.integers(len(values))], 4 - sum(lengths)))
+        rests = rng.random(len(lengths)) < 0.2
+        m = stream.Measure()
+        for length, is_rest in zip(lengths, rests):
+            m.append(note.Rest(quarterLength=length) if is_rest else note.Note(quarterLength=length))
+        expected = [None if b is None else [b.getTypeByNumber(k) for k in b.getNumbers()]
+                    for b in ts.getBeams(m.notesAndRests.stream())]
+
+        starts = (np.cumsum([0] + lengths[:-1]) * TICKS).astype(int).tolist()
+        ends = (np.cumsum(lengths) * TICKS).astype(int).tolist()
+        counts = [0 if r or n.duration.type not in BEAMED_TYPES else BEAMED_TYPES.index(n.duration.type) + 1
+                  for r, n in zip(rests, m.notesAndRests)]
+        assert beam_types(starts, ends, counts, spans) == expected, (lengths, rests.tolist())
+
+
+def test_score_is_notated():
+    score = notes_to_score(NOTE_EVENTS)
+    assert is_notated(score) and score.isWellFormedNotation()
+    assert not is_notated(converter.parse(os.path.join(os.path.dirname(__file__), 'test_input.mid')))
+    part = score.parts[0]
+    measures = list(part.getElementsByClass(stream.Measure))
+    assert [m.number for m in measures] == [1, 2, 3, 4]
+    assert measures[0].clef is not None and measures[0].timeSignature.ratioString == '4/4'
+    assert measures[-1].rightBarline.type == 'final'
+    # Overlapping notes and a chord member ending early get a second voice
+    assert len(measures[0].voices) == len(measures[2].voices) == 2 and not measures[3].voices
+    for n in part.recurse().notesAndRests:
+        assert n.duration.type != 'complex'
+    # Sounding notes are the quantized events, whatever the ties and voices
+    assert [(onset, pitch) for _, onset, pitch, _ in sounding(score)] == sorted(
+        (round(start * 2, 4), pitch) for start, _, pitch, _, _ in NOTE_EVENTS)
+
+
+def test_export_without_notation_pass():
+    score = notes_to_score(NOTE_EVENTS)
+    with tempfile.TemporaryDirectory() as tmp:
+        streamed = write_musicxml(score, os.path.join(tmp, "streamed.musicxml"))
+        reference = os.path.join(tmp, "reference.musicxml")
+        score.write('musicxml', fp=reference, makeNotation=False)
+        with open(reference, 'rb') as a, open(streamed, 'rb') as b:
+            assert RANDOM_ID.sub(b'ID', a.read()) == RANDOM_ID.sub(b'ID', b.read())
+        assert sounding(converter.parse(streamed)) == sounding(score)
+
+
+def test_midi_plays_tied_notes_once():
+    score = notes_to_score(NOTE_EVENTS)
+    with tempfile.TemporaryDirectory() as tmp:
+        path = write_midi(score, os.path.join(tmp, "score.mid"))
+        table = NoteTable.from_midi(path)
+    assert len(table) == len(NOTE_EVENTS)
+    assert sorted(zip(np.round(table.notes['onset'], 4).tolist(), table.notes['pitch'].tolist())) == [
+        (onset, pitch) for _, onset, pitch, _ in sounding(score)]
+
+
+def test_writer_processes_export_notated_score():
+    score = notes_to_score(NOTE_EVENTS)
+    with tempfile.TemporaryDirectory() as tmp:
+        plan = plan_exports(os.path.join(tmp, "score"), ("midi", "musicxml", "mxl"))
+        outputs = export_score(score, plan)
+        assert all(outputs.values()), outputs
+        assert sounding(converter.parse(outputs['musicxml'])) == sounding(score)
+        assert sounding(converter.parse(outputs['mxl'])) == sounding(score)
+        assert len(NoteTable.from_midi(outputs['midi'])) == len(NOTE_EVENTS)
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING NOTATION ON NOTE ARRAYS")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_notatable_lengths,
+                 test_layout_fills_measures,
+                 test_beams_match_music21,
+                 test_score_is_notated,
+                 test_export_without_notation_pass,
+                 test_midi_plays_tied_notes_once,
+                 test_writer_processes_export_notated_score):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
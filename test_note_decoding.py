@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Test the NumPy note decoder against basic-pitch's own decoder
+"""
+
+import os
+import sys
+import warnings
+
+import numpy as np
+
+from note_decoding import ENERGY_TOLERANCE, model_output_to_notes, quiet_from
+from transcription import get_session, load_audio, run_model
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MELODY_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+SONG_FILE = os.path.join(BASE_DIR, 'DONNE RICCHE - TonyPitony  ACOUSTIC VERSION.mp3')
+
+# (onset threshold, frame threshold, minimum note length in frames)
+SETTINGS = [(0.5, 0.3, 11), (0.3, 0.2, 5), (0.7, 0.5, 20), (0.5, 0.3, 0)]
+
+warnings.simplefilter('ignore')
+session = get_session()
+
+
+def reference_notes(activations, onset, frame, min_len, **kwargs):
+    from basic_pitch import note_creation
+
+    # Copies: basic-pitch's decoder may write to its input
+    return note_creation.model_output_to_notes({k: np.array(v) for k, v in activations.items()},
+                                               onset, frame, min_note_len=min_len, **kwargs)[1]
+
+
+def assert_same_notes(activations):
+    for onset, frame, min_len in SETTINGS:
+        expected = reference_notes(activations, onset, frame, min_len)
+        _, notes = model_output_to_notes(activations, onset, frame, min_note_len=min_len)
+        assert len(notes) == len(expected) > 0, (onset, frame, min_len, len(notes), len(expected))
+        for got, want in zip(notes, expected):
+            assert got[:4] == want[:4], (got[:4], want[:4])
+            assert list(map(int, got[4])) == list(map(int, want[4]))
+
+
+def test_quiet_from_matches_frame_loop():
+    rng = np.random.default_rng(0)
+    for _ in range(300):
+        energy = (rng.random(rng.integers(1, 400)) < rng.uniform(0.3, 0.95)) * 0.8
+        start = int(rng.integers(0, len(energy) + 2))
+        # basic-pitch's loop
+        i, k = start, 0
+        while i < len(energy) - 1 and k < ENERGY_TOLERANCE:
+            k = k + 1 if energy[i] < 0.5 else 0
+            i += 1
+        assert quiet_from(energy, start, 0.5) == i - k, (start, len(energy))
+
+
+def test_same_notes_on_melody():
+    y, sr = load_audio(MELODY_FILE)
+    assert_same_notes(run_model(y, sr, session.get_model()))
+
+
+def test_same_notes_on_song():
+    y, sr = load_audio(SONG_FILE, duration=60)
+    activations = run_model(y, sr, session.get_model())
+    assert_same_notes(activations)
+
+    # Frequency limits and no pitch bends
+    kwargs = dict(min_freq=110.0, max_freq=880.0, include_pitch_bends=False)
+    expected = reference_notes(activations, 0.5, 0.3, 11, **kwargs)
+    _, notes = model_output_to_notes(activations, 0.5, 0.3, min_note_len=11, **kwargs)
+    assert notes == expected and all(n[4] is None for n in notes)
+
+
+def test_silence():
+    activations = {'note': np.zeros((300, 88), np.float32), 'onset': np.zeros((300, 88), np.float32),
+                   'contour': np.zeros((300, 264), np.float32)}
+    midi, notes = model_output_to_notes(activations, 0.5, 0.3)
+    assert notes == [] and not any(instrument.notes for instrument in midi.instruments)
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING NUMPY NOTE DECODING")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_quiet_from_matches_frame_loop,
+                 test_same_notes_on_melody,
+                 test_same_notes_on_song,
+                 test_silence):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+"""
+Test the array-backed note table against music21 object walks
+"""
+
+import os
+import sys
+
+import numpy as np
+from music21 import chord, converter, note, stream
+
+from note_table import NoteTable, pitch_names
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MIDI_FILE = os.path.join(BASE_DIR, 'bach_suite1_prelude.mid')
+
+
+def small_score():
+    melody = stream.Part([note.Note('C4', quarterLength=1), chord.Chord(['E4', 'G4'], quarterLength=2),
+                          note.Note('E-5', quarterLength=3)])
+    melody.makeMeasures(inPlace=True)
+    melody.makeTies(inPlace=True)  # E-5 crosses the barline
+    drums = stream.Part([note.Unpitched(quarterLength=1)])
+    bass = stream.Part([note.Note('C2', quarterLength=4)])
+    return stream.Score([melody, drums, bass])
+
+
+def test_rows_from_score():
+    table = NoteTable.from_score(small_score())
+    melody = table.part(0)
+    assert melody['pitch'].tolist() == [60, 64, 67, 75], melody
+    assert melody['onset'].tolist() == [0.0, 1.0, 1.0, 3.0]
+    assert melody['duration'].tolist() == [1.0, 2.0, 2.0, 3.0]  # tie joined
+    assert table.counts_per_part().tolist() == [4, 0, 1]
+    assert pitch_names(melody['pitch']) == ['C4', 'E4', 'G4', 'E-5']
+
+
+def test_part_stats():
+    table = NoteTable.from_score(small_score())
+    stats = table.part_stats()
+    assert stats['part'].tolist() == [0, 2]
+    assert stats['notes'].tolist() == [4, 1]
+    assert stats['lowest'].tolist() == [60, 36]
+    assert stats['highest'].tolist() == [75, 36]
+    assert stats['unique_pitches'].tolist() == [4, 1]
+    assert table.pitch_range(0) == (60, 75)
+    assert table.pitch_range(1) is None
+
+
+def test_midi_and_score_agree():
+    from_midi = NoteTable.from_midi(MIDI_FILE)
+    from_score = NoteTable.from_score(converter.parse(MIDI_FILE))
+    assert from_midi.num_parts == from_score.num_parts
+    assert np.array_equal(from_midi.counts_per_part(), from_score.counts_per_part())
+    for part_id in from_midi.parts_with_notes():
+        assert np.array_equal(from_midi.unique_pitches(part_id), from_score.unique_pitches(part_id))
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING NOTE TABLE")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_rows_from_score, test_part_stats, test_midi_and_score_agree):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test the single-pass part analysis and main part selection
+"""
+
+import sys
+
+from music21 import chord, note, stream
+
+from note_table import NoteTable
+from part_analysis import analyze_parts, main_part, select_main_part
+
+# Part 0: monophonic scale, part 1: sustained triads, part 2: empty, part 3: one low drone
+ROWS = ([(float(i), 1.0, pitch, 80, 0) for i, pitch in enumerate([60, 62, 64, 65, 67, 69, 71, 72])]
+        + [(float(onset), 4.0, pitch, 80, 1) for onset in (0, 4) for pitch in (48, 52, 55)]
+        + [(0.0, 8.0, 36, 80, 3)])
+
+
+def test_metrics():
+    analysis = analyze_parts(NoteTable(ROWS, ["melody", "chords", "empty", "drone"]))
+    assert analysis['part'].tolist() == [0, 1, 3]
+    melody, chords, drone = analysis
+    assert (melody['notes'], melody['lowest'], melody['highest'], melody['unique_pitches']) == (8, 60, 72, 8)
+    assert melody['density'] == 1.0
+    assert (melody['mean_polyphony'], melody['max_polyphony']) == (1.0, 1)
+    assert (chords['mean_polyphony'], chords['max_polyphony']) == (3.0, 3)
+    assert chords['unique_pitches'] == 3
+    assert drone['coverage'] == 1.0 and melody['coverage'] == 1.0
+    assert main_part(analysis) == 0
+
+
+def test_polyphony_of_overlapping_notes():
+    # Two notes overlap for one quarter out of three sounding quarters
+    rows = [(0.0, 2.0, 60, 80, 0), (1.0, 2.0, 64, 80, 0)]
+    (part,) = analyze_parts(NoteTable(rows, ["p"]))
+    assert part['max_polyphony'] == 2
+    assert abs(part['mean_polyphony'] - 4.0 / 3.0) < 1e-6
+
+
+def test_select_main_part():
+    melody = stream.Part([note.Note(p, quarterLength=1) for p in ('C5', 'D5', 'E5', 'F5', 'G5', 'A5')])
+    chords = stream.Part([chord.Chord(['C3', 'E3', 'G3'], quarterLength=6)])
+    score = stream.Score([chords, melody])
+    assert select_main_part(score) == 1
+    assert len(score.parts) == 1 and score.parts[0] is melody
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING PART ANALYSIS")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_metrics, test_polyphony_of_overlapping_notes, test_select_main_part):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
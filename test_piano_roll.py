@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Test live threshold tuning: activation excerpts, preview decoding and the
+piano-roll geometry
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+from cache import TranscriptionCache
+from piano_roll import LOWEST_PITCH, HIGHEST_PITCH, preview_notes, roll_rectangles
+from pipeline import prepare_transcription
+from transcription import get_session, load_audio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+PARAMS = {'onset_threshold': 0.5, 'frame_threshold': 0.3, 'minimum_note_length': 127.70}
+
+session = get_session()
+
+
+def test_preview_matches_full_decode():
+    y, sr = load_audio(AUDIO_FILE)
+    activations, _, full = session.transcribe(y, sr)
+    # The excerpt starts at the model window before 3.0 s, not at 0
+    preview = sorted(preview_notes(session, activations, 3.0, PARAMS, seconds=3.0))
+    assert all(e[1] > 3.0 and e[0] < 6.0 for e in preview)
+    # Same notes and times as the whole-recording decode, away from the excerpt's end
+    inner = [e[:3] for e in preview if e[0] < 5.0]
+    expected = sorted(e[:3] for e in full if e[1] > 3.0 and e[0] < 5.0)
+    assert len(inner) == len(expected) > 0, (inner, expected)
+    assert all(a[2] == b[2] and abs(a[0] - b[0]) < 1e-6 for a, b in zip(inner, expected)), (inner, expected)
+
+    # A higher minimum note length can only drop notes
+    longer = preview_notes(session, activations, 3.0, dict(PARAMS, minimum_note_length=600), seconds=3.0)
+    assert len(longer) < len(preview)
+
+
+def test_roll_rectangles():
+    notes = [(1.0, 1.5, 60, 0.8, None), (0.5, 4.0, 100, 0.5, None)]
+    rectangles, (lowest, highest) = roll_rectangles(notes, 1.0, 2.0, 200, 130)
+    assert (lowest, highest) == (LOWEST_PITCH, 100)
+    row = 130 / (100 - LOWEST_PITCH + 1)
+    (x0, y0, x1, y1), (a0, b0, a1, b1) = rectangles
+    assert (x0, x1) == (0.0, 50.0) and np.isclose(y0, 40 * row)
+    # Clipped to the window, on the top row
+    assert (a0, a1, b0) == (0.0, 200.0, 0.0)
+    assert roll_rectangles([], 0, 1, 10, 10)[1] == (LOWEST_PITCH, HIGHEST_PITCH)
+
+
+def test_model_runs_once_per_file():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(tmp)
+        timings = {}
+        y, sr, activations = prepare_transcription(AUDIO_FILE, session=session, cache=cache, timings=timings)
+        assert y is not None and 'inference' in timings
+        assert isinstance(activations['note'], np.memmap)
+
+        timings = {}
+        y, sr, cached = prepare_transcription(AUDIO_FILE, session=session, cache=cache, timings=timings)
+        assert y is None and timings == {}
+        assert np.array_equal(cached['onset'], activations['onset'])
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING THRESHOLD TUNING PREVIEW")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_preview_matches_full_decode,
+                 test_roll_rectangles,
+                 test_model_runs_once_per_file):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Test the GUI-independent conversion pipeline
+
+Runs pipeline.audio_to_score on the bundled C major scale recording, the
+same way the GUI worker thread does, and checks progress reporting,
+cancellation and reconversions from the transcription cache.
+"""
+
+import contextlib
+import io
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+import numpy as np
+import soundfile as sf
+from music21 import converter, tempo
+
+from cache import TranscriptionCache
+from note_table import NoteTable
+from transcription import ConversionCancelled
+from pipeline import audio_to_score
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+
+@contextlib.contextmanager
+def capture_logs(name="pipeline"):
+    """Log records of `name` at INFO and above, while the block runs"""
+    records = []
+    handler = logging.Handler(logging.INFO)
+    handler.emit = records.append
+    logger = logging.getLogger(name)
+    level = logger.level
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+    try:
+        yield records
+    finally:
+        logger.removeHandler(handler)
+        logger.setLevel(level)
+
+
+def write_pulse_melody(path, bpm=100, seconds=12.0, sr=22050):
+    """Decaying C major arpeggio tones on every beat: a recording with a detectable tempo"""
+    t = np.arange(int(0.25 * sr)) / sr
+    y = np.zeros(int(seconds * sr), dtype=np.float32)
+    for i, onset in enumerate(np.arange(0.0, seconds - 0.3, 60.0 / bpm)):
+        frequency = 440.0 * 2 ** (((60, 64, 67, 72)[i % 4] - 69) / 12)
+        start = int(onset * sr)
+        y[start:start + len(t)] += 0.5 * np.sin(2 * np.pi * frequency * t) * np.exp(-12 * t)
+    sf.write(path, y, sr)
+    return path
+
+
+def score_summary(path):
+    """(metronome marks, sounding notes) of an exported score"""
+    score = converter.parse(path)
+    marks = [round(m.number, 1) for m in score.recurse().getElementsByClass(tempo.MetronomeMark)]
+    notes = NoteTable.from_score(score).notes
+    return marks, sorted(zip(np.round(notes['onset'], 4).tolist(), notes['pitch'].tolist()))
+
+
+def test_cancel_before_transcription():
+    cancel_event = threading.Event()
+    cancel_event.set()
+    messages = []
+    try:
+        audio_to_score(AUDIO_FILE, progress=messages.append, cancel_event=cancel_event)
+    except ConversionCancelled:
+        pass
+    else:
+        raise AssertionError("cancelled conversion did not stop")
+    assert messages == ["Caricamento audio..."], messages
+
+
+def test_full_conversion_reports_progress():
+    messages = []
+    stdout = io.StringIO()
+    with tempfile.TemporaryDirectory() as out_dir, contextlib.redirect_stdout(stdout), \
+            capture_logs() as records:
+        outputs = audio_to_score(
+            AUDIO_FILE, "Violino",
+            output_base=os.path.join(out_dir, "scale"),
+            progress=messages.append,
+            formats=("midi", "musicxml"),
+        )
+        assert set(outputs) == {"midi", "musicxml"}, outputs
+        assert os.path.getsize(outputs["midi"]) > 0
+        assert os.path.getsize(outputs["musicxml"]) > 0
+    assert messages == ["Caricamento audio...", "Trascrizione audio in MIDI...",
+                        "Generazione spartito...", "Esportazione spartito..."], messages
+    # Diagnostics go to the logger, not to stdout (batch workers would flood it)
+    assert stdout.getvalue() == "", stdout.getvalue()
+    assert any(r.getMessage().startswith("Stage timings") for r in records)
+
+
+def test_new_thresholds_decode_cached_activations():
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = TranscriptionCache(os.path.join(tmp, "cache"))
+        base = os.path.join(tmp, "scale")
+        first = {}
+        audio_to_score(AUDIO_FILE, output_base=base, cache=cache, timings=first, formats=("midi",))
+        assert 'inference' in first
+
+        # Other thresholds: no decoding, no inference, only note decoding again
+        timings, messages = {}, []
+        audio_to_score(AUDIO_FILE, output_base=base, cache=cache, timings=timings,
+                       progress=messages.append, formats=("midi",),
+                       transcription_params={'onset_threshold': 0.6, 'minimum_note_length': 200})
+        assert 'inference' not in timings and 'decode' not in timings, timings
+        assert 'note_decoding' in timings
+        assert messages == ["Trascrizione audio in MIDI...", "Generazione spartito...",
+                            "Esportazione spartito..."], messages
+
+
+def test_cache_hit_keeps_detected_tempo():
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = write_pulse_melody(os.path.join(tmp, "pulse.wav"))
+        cache = TranscriptionCache(os.path.join(tmp, "cache"))
+        first, second = {}, {}
+        fresh = audio_to_score(audio, output_base=os.path.join(tmp, "fresh"), cache=cache,
+                               timings=first, formats=("musicxml",))
+        assert first.get('beat_tracking') is not None, first
+        # Second run: notes and beats from the cache, nothing decoded or tracked
+        cached = audio_to_score(audio, output_base=os.path.join(tmp, "cached"), cache=cache,
+                                timings=second, formats=("musicxml",))
+        assert cache.hits == 1
+        assert 'inference' not in second and 'beat_tracking' not in second, second
+        marks, notes = score_summary(cached["musicxml"])
+        assert marks and all(abs(m - 100) < 3 for m in marks), marks
+        assert (marks, notes) == score_summary(fresh["musicxml"])
+
+
+def test_new_thresholds_on_cached_activations_produce_score():
+    with tempfile.TemporaryDirectory() as tmp:
+        audio = write_pulse_melody(os.path.join(tmp, "pulse.wav"))
+        cache = TranscriptionCache(os.path.join(tmp, "cache"))
+        first = {}
+        audio_to_score(audio, output_base=os.path.join(tmp, "a"), cache=cache, timings=first,
+                       formats=("musicxml",), transcription_params={'onset_threshold': 0.5})
+        assert 'inference' in first
+
+        # Thresholds B: activations and beats from the cache, then the whole score
+        timings = {}
+        outputs = audio_to_score(audio, output_base=os.path.join(tmp, "b"), cache=cache,
+                                 timings=timings, formats=("musicxml",),
+                                 transcription_params={'onset_threshold': 0.7, 'frame_threshold': 0.4})
+        assert 'inference' not in timings and 'beat_tracking' not in timings, timings
+        assert 'note_decoding' in timings
+        marks, notes = score_summary(outputs["musicxml"])
+        assert marks and all(abs(m - 100) < 3 for m in marks), marks
+        assert notes and {pitch for _, pitch in notes} <= {60, 64, 67, 72}, notes
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING CONVERSION PIPELINE")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_cancel_before_transcription,
+                 test_full_conversion_reports_progress,
+                 test_new_thresholds_decode_cached_activations,
+                 test_cache_hit_keeps_detected_tempo,
+                 test_new_thresholds_on_cached_activations_produce_score):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
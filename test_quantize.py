@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Test array quantization against music21's Stream.quantize
+"""
+
+import random
+import sys
+
+import numpy as np
+from music21 import note, stream
+
+from quantize import QUANTIZE_REPORT_DTYPE, displacement_summary, quantize_notes
+from score_builder import notes_to_score
+
+
+def music21_quantize(onsets, durations, divisors=(4, 3)):
+    """Offsets and quarterLengths Stream.quantize gives the same notes"""
+    part = stream.Part()
+    for onset, duration in zip(onsets, durations):
+        n = note.Note(60)
+        n.quarterLength = duration
+        part.coreInsert(onset, n)
+    part.sort(force=True)
+    part.quantize(divisors, processOffsets=True, processDurations=True, inPlace=True, recurse=False)
+    return (np.array([float(n.offset) for n in part.notes]),
+            np.array([float(n.quarterLength) for n in part.notes]))
+
+
+def test_matches_music21():
+    rng = random.Random(3)
+    onsets, durations = [], []
+    t = 0.0
+    for _ in range(400):
+        step = rng.choice([0.25, 0.5, 1 / 3, 2 / 3, 1.0]) + rng.gauss(0, 0.04)
+        onsets.append(max(t + rng.gauss(0, 0.03), 0.0))
+        durations.append(max(step + rng.gauss(0, 0.04), 0.01))
+        t += max(step, 0.1)
+    expected_onsets, expected_durations = music21_quantize(onsets, durations)
+    report = quantize_notes(onsets, durations)
+    order = np.argsort(onsets, kind='stable')
+    assert np.allclose(report['onset'][order], expected_onsets)
+    assert np.allclose(report['duration'][order], expected_durations)
+
+
+def test_report():
+    report = quantize_notes([0.02, 1.3, 2.49], [0.97, 0.2, 0.01])
+    assert report.dtype == QUANTIZE_REPORT_DTYPE
+    assert np.allclose(report['onset'], [0.0, 4 / 3, 2.5])
+    assert np.allclose(report['onset_shift'], [-0.02, 4 / 3 - 1.3, 0.01])
+    assert report['onset_divisor'].tolist() == [4, 3, 4]
+    # Durations never collapse to zero
+    assert np.all(report['duration'] > 0)
+    summary = displacement_summary(report)
+    assert summary['notes'] == 3
+    assert np.isclose(summary['max_onset_shift'], 4 / 3 - 1.3)
+
+
+def test_tolerance_prefers_earlier_divisor():
+    # 0.3 is closer to 1/3 than to 1/4, but only by 0.0167
+    assert np.isclose(quantize_notes([0.3], [1.0])['onset'][0], 1 / 3)
+    assert np.isclose(quantize_notes([0.3], [1.0], tolerance=0.06)['onset'][0], 0.25)
+    # Too far from the sixteenth grid: falls back to the closest point
+    assert np.isclose(quantize_notes([0.33], [1.0], tolerance=0.06)['onset'][0], 1 / 3)
+    assert quantize_notes([0.3], [1.0], divisors=(2,))['onset'][0] == 0.5
+
+
+def test_invalid_arguments():
+    for kwargs in ({'divisors': ()}, {'tolerance': -0.1}):
+        try:
+            quantize_notes([0.0], [1.0], **kwargs)
+        except ValueError:
+            continue
+        raise AssertionError(f"{kwargs} accepted")
+
+
+def test_score_builder_uses_grid():
+    # At 120 BPM one second is two quarter notes; 0.16 s = 0.32 quarters
+    events = [(0.0, 0.5, 60, 0.8, None), (0.16, 0.5, 64, 0.8, None)]
+    reports = []
+    score = notes_to_score(events, tolerance=0.1, reports=reports)
+    offsets = sorted(float(n.getOffsetInHierarchy(score)) for n in score.recurse().notes)
+    assert offsets == [0.0, 0.25]
+    assert len(reports) == 1 and len(reports[0]) == 2
+    # On a triplet grid the two onsets are less than one step apart: a chord
+    score = notes_to_score(events, quarter_length_divisors=(3,))
+    elements = list(score.recurse().notes)
+    assert len(elements) == 1 and elements[0].isChord
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING ARRAY QUANTIZATION")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_matches_music21,
+                 test_report,
+                 test_tolerance_prefers_earlier_divisor,
+                 test_invalid_arguments,
+                 test_score_builder_uses_grid):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
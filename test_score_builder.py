@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Test the in-memory score builder against the old MIDI round-trip
+
+The same note events are (a) written to MIDI with pretty_midi and parsed
+back with converter.parse, as the old pipeline did, and (b) handed to
+score_builder.notes_to_score. Both scores must contain the same notes.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+import pretty_midi
+from music21 import converter
+
+from note_table import NoteTable
+from score_builder import group_chords, notes_to_score, table_to_score
+
+# (start_s, end_s, pitch_midi, amplitude, pitch_bends) at 120 BPM:
+# a C major arpeggio, a triad chord and two notes starting together
+# but ending at different times (needs a second voice)
+NOTE_EVENTS = [
+    (0.0, 0.5, 60, 0.8, None),
+    (0.5, 1.0, 64, 0.7, None),
+    (1.0, 1.5, 67, 0.6, None),
+    (1.5, 2.5, 72, 0.9, None),
+    (2.5, 3.5, 60, 0.5, None),
+    (2.5, 3.5, 64, 0.5, None),
+    (2.5, 3.5, 67, 0.5, None),
+    (4.0, 5.0, 55, 0.7, None),
+    (4.0, 4.5, 79, 0.7, None),
+]
+
+
+def note_signature(score):
+    """Sorted (offset, pitches, quarterLength) of every note/chord in a score"""
+    return sorted(
+        (float(n.getOffsetInHierarchy(score)), tuple(sorted(p.midi for p in n.pitches)),
+         float(n.quarterLength))
+        for n in score.recurse().notes
+    )
+
+
+def write_midi(note_events, midi_path):
+    midi_data = pretty_midi.PrettyMIDI(initial_tempo=120)
+    inst = pretty_midi.Instrument(program=0)
+    for start, end, pitch, amplitude, _ in note_events:
+        inst.notes.append(pretty_midi.Note(velocity=int(round(127 * amplitude)),
+                                           pitch=pitch, start=start, end=end))
+    midi_data.instruments.append(inst)
+    midi_data.write(midi_path)
+
+
+def parse_via_midi(note_events):
+    """The old path: write a MIDI file and parse it back"""
+    fd, midi_path = tempfile.mkstemp(suffix=".mid")
+    os.close(fd)
+    try:
+        write_midi(note_events, midi_path)
+        return converter.parse(midi_path)
+    finally:
+        os.remove(midi_path)
+
+
+def test_same_notes_as_midi_round_trip():
+    expected = note_signature(parse_via_midi(NOTE_EVENTS))
+    built = note_signature(notes_to_score(NOTE_EVENTS))
+    assert built == expected, f"{built} != {expected}"
+
+
+def test_score_is_measured_with_velocities():
+    score = notes_to_score(NOTE_EVENTS)
+    part = score.parts[0]
+    assert len(part.getElementsByClass('Measure')) == 3
+    first = part.recurse().notes.first()
+    assert first.pitch.midi == 60
+    assert first.volume.velocity == round(127 * 0.8)
+
+
+def test_chord_grouping_on_arrays():
+    rng = np.random.default_rng(0)
+    step = 0.25
+    for _ in range(200):
+        # Onsets on a coarse grid so that many notes start together
+        onsets = np.sort(rng.integers(0, 12, rng.integers(0, 30)) * rng.choice([0.1, 0.5]))
+        offsets = onsets + rng.choice([0.5, 0.6, 1.0, 2.0], len(onsets))
+        order = np.lexsort((offsets, onsets))
+        onsets, offsets = onsets[order], offsets[order]
+        # Every note joins the first earlier note it can, as a note loop would
+        expected = np.arange(len(onsets))
+        gathered = np.zeros(len(onsets), dtype=bool)
+        voices = False
+        for i in range(len(onsets)):
+            if gathered[i]:
+                continue
+            for j in range(i + 1, len(onsets)):
+                if onsets[j] - onsets[i] >= step:
+                    break
+                if abs(offsets[j] - offsets[i]) > step:
+                    voices = True
+                elif not gathered[j]:
+                    expected[j], gathered[j] = i, True
+        leader, voices_required = group_chords(onsets, offsets, step)
+        assert leader.tolist() == expected.tolist() and voices_required == voices
+
+
+def test_table_to_score_matches_midi_parse():
+    fd, midi_path = tempfile.mkstemp(suffix=".mid")
+    os.close(fd)
+    try:
+        write_midi(NOTE_EVENTS, midi_path)
+        score = table_to_score(NoteTable.from_midi(midi_path))
+        expected = note_signature(converter.parse(midi_path))
+    finally:
+        os.remove(midi_path)
+    assert note_signature(score) == expected
+    assert len(score.parts[0].getElementsByClass('Measure')) == 3
+
+
+def test_empty_events():
+    score = notes_to_score([])
+    assert len(score.parts) == 1
+    assert len(score.recurse().notes) == 0
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING IN-MEMORY SCORE BUILDER")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_same_notes_as_midi_round_trip,
+                 test_score_is_measured_with_velocities,
+                 test_chord_grouping_on_arrays,
+                 test_table_to_score_matches_midi_parse,
+                 test_empty_events):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Test chunked streaming transcription against a one-shot transcription
+"""
+
+import os
+import sys
+
+from transcription import ModelSession, load_audio, merge_overlapping_notes
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+AUDIO_FILE = os.path.join(BASE_DIR, 'test_audio_melody.wav')
+
+ONSET_TOLERANCE = 0.05
+
+session = ModelSession()
+
+
+def same_pitch_overlaps(note_events):
+    last_end = {}
+    overlaps = 0
+    for start, end, pitch, *_ in sorted(note_events, key=lambda e: (e[2], e[0])):
+        if start < last_end.get(pitch, float('-inf')):
+            overlaps += 1
+        last_end[pitch] = end
+    return overlaps
+
+
+def test_merge_overlapping_notes():
+    events = [(1.0, 2.0, 60, 0.5, None), (1.8, 2.5, 60, 0.7, None),
+              (1.9, 2.2, 64, 0.6, None), (3.0, 3.5, 60, 0.4, None)]
+    merged = merge_overlapping_notes(events)
+    assert [(s, e, p) for s, e, p, *_ in merged] == [
+        (1.0, 2.5, 60), (1.9, 2.2, 64), (3.0, 3.5, 60)], merged
+
+
+def test_stream_matches_one_shot():
+    y, sr = load_audio(AUDIO_FILE)
+    _, _, reference = session.transcribe(y, sr)
+
+    # Chunks much shorter than the recording, so boundaries fall inside notes
+    for chunk_seconds, overlap_seconds in ((3.0, 1.0), (4.0, 2.0)):
+        streamed = session.transcribe_stream(AUDIO_FILE, chunk_seconds=chunk_seconds,
+                                             overlap_seconds=overlap_seconds)
+        assert same_pitch_overlaps(streamed) == 0
+        unmatched = [
+            (start, pitch) for start, _, pitch, *_ in reference
+            if not any(p == pitch and abs(s - start) <= ONSET_TOLERANCE for s, _, p, *_ in streamed)
+        ]
+        assert not unmatched, f"{chunk_seconds}s chunks miss {unmatched}"
+        assert len(streamed) == len(reference), (len(streamed), len(reference))
+
+
+if __name__ == "__main__":
+    print("\n" + "="*70)
+    print("TESTING STREAMING TRANSCRIPTION")
+    print("="*70 + "\n")
+
+    failed = 0
+    for test in (test_merge_overlapping_notes, test_stream_matches_one_shot):
+        try:
+            test()
+            print(f"  ✓ {test.__name__}")
+        except AssertionError as e:
+            failed += 1
+            print(f"  ✗ {test.__name__}: {e}")
+
+    print()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,588 @@
+#!/usr/bin/env python3
+"""
+In-memory transcription stage for Audio2Score
+
+The decoded NumPy buffer is handed straight to the basic-pitch model: no
+intermediate WAV is written to disk, the audio is decoded only once per job
+and resampled at most once, directly to the model's native sample rate.
+"""
+
+import importlib.util
+import logging
+import os
+import threading
+import time
+from importlib import metadata
+
+import numpy as np
+import librosa
+import soundfile as sf
+
+from backends import TranscriptionBackend
+import note_decoding
+
+logger = logging.getLogger(__name__)
+
+# Sample rate the basic-pitch model works at (basic_pitch.constants.AUDIO_SAMPLE_RATE).
+# Kept here so callers can decode to it without importing TensorFlow.
+MODEL_SAMPLE_RATE = 22050
+
+# Default note decoding parameters (same as basic-pitch)
+ONSET_THRESHOLD = 0.5
+FRAME_THRESHOLD = 0.3
+MINIMUM_NOTE_LENGTH = 127.70  # milliseconds
+
+# Model activation frames per second (basic-pitch's FFT hop is 256 samples)
+ACTIVATION_FRAME_RATE = MODEL_SAMPLE_RATE / 256
+
+# Frames of overlap between consecutive model windows (same as basic-pitch)
+N_OVERLAPPING_FRAMES = 30
+# Model windows per model call (basic-pitch sends them one at a time):
+# batches spread the runtime's per-call overhead over several windows
+BATCH_WINDOWS = 8
+
+# Inference runtimes for the basic-pitch model: the model file each one
+# loads (basic_pitch.FilenameSuffix) and the packages that can run it
+# (TFLite models also run on TensorFlow's own interpreter)
+RUNTIMES = {
+    'tensorflow': ('tf', ('tensorflow',)),
+    'tflite': ('tflite', ('tflite_runtime', 'tensorflow')),
+    'onnx': ('onnx', ('onnxruntime',)),
+}
+
+
+# Streaming mode: audio is read and transcribed in overlapping chunks, so
+# memory stays flat however long the recording is
+STREAM_CHUNK_SECONDS = 60.0
+STREAM_OVERLAP_SECONDS = 6.0
+# A note ending this close to a chunk's end may continue in the next chunk
+STREAM_EDGE_TOLERANCE = 0.25
+# Onsets detected this close before a chunk's owned region are kept too (two
+# chunks can place the same onset on either side of the boundary); the
+# resulting duplicates overlap in time and are merged
+STREAM_BOUNDARY_SLACK = 0.1
+
+
+class ConversionCancelled(Exception):
+    """Raised when a running conversion is cancelled by the user"""
+
+
+def resample(y, orig_sr, target_sr, timings=None):
+    """Resample a buffer, or return it untouched when the rates already match"""
+    start = time.perf_counter()
+    if orig_sr != target_sr:
+        y = librosa.resample(y, orig_sr=orig_sr, target_sr=target_sr)
+    if timings is not None:
+        timings['resample'] = timings.get('resample', 0.0) + time.perf_counter() - start
+    return y
+
+
+def load_audio(audio_path, sr=MODEL_SAMPLE_RATE, duration=None, timings=None):
+    """
+    Decode an audio file to a mono float32 buffer at `sr`.
+
+    The file is decoded once at its native rate and resampled a single time
+    straight to `sr` (skipped when the source already matches), so the model
+    never has to resample again.
+    """
+    start = time.perf_counter()
+    y, native_sr = librosa.load(audio_path, sr=None, mono=True, duration=duration)
+    if timings is not None:
+        timings['decode'] = time.perf_counter() - start
+    return resample(y, native_sr, sr, timings), sr
+
+
+def audio_duration(audio_path):
+    """Duration in seconds without decoding, or None if soundfile cannot read the file"""
+    try:
+        return sf.info(audio_path).duration
+    except (RuntimeError, sf.SoundFileError):
+        return None
+
+
+def stream_audio(audio_path, sr=MODEL_SAMPLE_RATE,
+                 chunk_seconds=STREAM_CHUNK_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS,
+                 timings=None):
+    """
+    Decode an audio file block by block.
+
+    Yields (start_s, y) where y is a mono chunk at `sr` of about
+    `chunk_seconds`, overlapping the previous chunk by `overlap_seconds`.
+    Only one chunk is held in memory at a time.
+    """
+    native_sr = sf.info(audio_path).samplerate
+    blocksize = int(round(chunk_seconds * native_sr))
+    overlap = int(round(overlap_seconds * native_sr))
+
+    blocks = sf.blocks(audio_path, blocksize=blocksize, overlap=overlap,
+                       dtype='float32', always_2d=True)
+    start_sample = 0
+    while True:
+        start = time.perf_counter()
+        block = next(blocks, None)
+        if timings is not None:
+            timings['decode'] = timings.get('decode', 0.0) + time.perf_counter() - start
+        if block is None:
+            return
+        y = resample(block.mean(axis=1), native_sr, sr, timings)
+        yield start_sample / native_sr, y
+        start_sample += blocksize - overlap
+
+
+def format_timings(timings):
+    """One-line summary of the stage timings, e.g. 'decode 0.41s, resample 0.12s'"""
+    return ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items())
+
+
+def model_version(model_path=None, runtime=None):
+    """Identifies the model that produced a transcription (used in cache keys)"""
+    try:
+        version = metadata.version('basic-pitch')
+    except metadata.PackageNotFoundError:
+        version = 'unknown'
+    model_name = os.path.basename(str(model_path)) if model_path else 'icassp_2022'
+    if runtime is not None and not model_path:
+        model_name += f" {runtime}"
+    return f"basic-pitch {version} {model_name}"
+
+
+def available_runtimes():
+    """The RUNTIMES whose package is installed (checked without importing it)"""
+    return tuple(name for name, (_, packages) in RUNTIMES.items()
+                 if any(importlib.util.find_spec(p) is not None for p in packages))
+
+
+def configure_tensorflow_threads(intra_op_threads=None, inter_op_threads=None):
+    """
+    Set TensorFlow's thread pools for this process. TensorFlow only accepts
+    this before it runs its first operation; later calls print a warning
+    and leave the pools as they are.
+    """
+    if not intra_op_threads and not inter_op_threads:
+        return
+    import tensorflow as tf
+
+    try:
+        if intra_op_threads:
+            tf.config.threading.set_intra_op_parallelism_threads(intra_op_threads)
+        if inter_op_threads:
+            tf.config.threading.set_inter_op_parallelism_threads(inter_op_threads)
+    except RuntimeError as e:
+        logger.warning(f"TensorFlow threads already initialized, not changed ({e})")
+
+
+def load_model(model_path=None, runtime=None, intra_op_threads=None, inter_op_threads=None):
+    """
+    Load the basic-pitch model (the heavy ML imports happen here).
+
+    runtime: one of RUNTIMES, or None for basic-pitch's own choice
+        (TensorFlow when it is installed); ignored if model_path is given
+    intra_op_threads / inter_op_threads: threads used inside one operation
+        and across independent operations; None keeps the runtime default
+        (one thread per core). TFLite only has a single thread count,
+        set from intra_op_threads.
+    """
+    if runtime is not None and runtime not in RUNTIMES:
+        raise ValueError(f"Unknown inference runtime {runtime!r}, expected one of {tuple(RUNTIMES)}")
+    if runtime is not None and runtime not in available_runtimes():
+        raise ValueError(f"Inference runtime {runtime!r} needs {' or '.join(RUNTIMES[runtime][1])}, "
+                         f"which is not installed")
+    if runtime in (None, 'tensorflow') and importlib.util.find_spec('tensorflow') is not None:
+        configure_tensorflow_threads(intra_op_threads, inter_op_threads)
+
+    from basic_pitch import ICASSP_2022_MODEL_PATH, FilenameSuffix, build_icassp_2022_model_path
+    from basic_pitch import inference
+
+    if not model_path:
+        model_path = (ICASSP_2022_MODEL_PATH if runtime is None
+                      else build_icassp_2022_model_path(FilenameSuffix[RUNTIMES[runtime][0]]))
+    model = inference.Model(model_path)
+
+    # basic-pitch builds TFLite and ONNX sessions with default threads: rebuild them
+    if model.model_type == inference.Model.MODEL_TYPES.TFLITE and intra_op_threads:
+        model.interpreter = inference.tflite.Interpreter(str(model_path), num_threads=intra_op_threads)
+        model.model = model.interpreter.get_signature_runner()
+    elif model.model_type == inference.Model.MODEL_TYPES.ONNX and (intra_op_threads or inter_op_threads):
+        options = inference.ort.SessionOptions()
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            options.inter_op_num_threads = inter_op_threads
+        model.model = inference.ort.InferenceSession(str(model_path), options,
+                                                     providers=["CPUExecutionProvider"])
+    return model
+
+
+def window_buffer(y):
+    """
+    Model windows of an in-memory buffer, shape (windows, AUDIO_N_SAMPLES, 1),
+    with the same padding and overlap as basic_pitch.inference.run_inference
+    (which can only read from a file path).
+    """
+    from basic_pitch.constants import AUDIO_N_SAMPLES, FFT_HOP
+    from basic_pitch.inference import window_audio_file
+
+    overlap_len = N_OVERLAPPING_FRAMES * FFT_HOP
+    hop_size = AUDIO_N_SAMPLES - overlap_len
+    y = np.concatenate([np.zeros(overlap_len // 2, dtype=np.float32), np.asarray(y, dtype=np.float32)])
+    return np.stack([window for window, _ in window_audio_file(y, hop_size)])
+
+
+def predict_windows(model, windows, batch_windows=BATCH_WINDOWS, cancel_event=None):
+    """
+    Model outputs {'note', 'onset', 'contour'} for stacked windows, sent
+    to the model `batch_windows` at a time. If `cancel_event` is set,
+    ConversionCancelled is raised before the next batch.
+    """
+    output = {"note": [], "onset": [], "contour": []}
+    for first in range(0, len(windows), batch_windows):
+        if cancel_event is not None and cancel_event.is_set():
+            raise ConversionCancelled()
+        for k, v in model.predict(windows[first:first + batch_windows]).items():
+            output[k].append(v)
+    return {k: np.concatenate(v) for k, v in output.items()}
+
+
+def run_model(y, sr, model, cancel_event=None, batch_windows=BATCH_WINDOWS):
+    """
+    Run the model on an in-memory buffer and return the raw activations.
+
+    If `cancel_event` is set, ConversionCancelled is raised before the
+    next batch of windows.
+    """
+    from basic_pitch.inference import unwrap_output
+
+    if sr != MODEL_SAMPLE_RATE:
+        raise ValueError(f"Audio must be at {MODEL_SAMPLE_RATE} Hz, got {sr} Hz")
+    output = predict_windows(model, window_buffer(y), batch_windows, cancel_event)
+    return {k: unwrap_output(v, len(y), N_OVERLAPPING_FRAMES) for k, v in output.items()}
+
+
+def decode_notes(model_output, onset_threshold=ONSET_THRESHOLD, frame_threshold=FRAME_THRESHOLD,
+                 minimum_note_length=MINIMUM_NOTE_LENGTH):
+    """
+    (midi_data, note_events) from the model's activations: the notes of
+    basic-pitch's own decoder, computed by note_decoding with array
+    operations
+    """
+    from basic_pitch.constants import FFT_HOP
+
+    min_note_len = int(np.round(minimum_note_length / 1000 * (MODEL_SAMPLE_RATE / FFT_HOP)))
+    return note_decoding.model_output_to_notes(
+        model_output,
+        onset_thresh=onset_threshold,
+        frame_thresh=frame_threshold,
+        min_note_len=min_note_len,
+    )
+
+
+def activation_excerpt(activations, start_s, seconds):
+    """
+    (excerpt, offset_s): the activations from start_s, moved back to the
+    start of a model window (where basic-pitch's frame times restart on
+    the same grid), to start_s + seconds. decode_notes(excerpt) gives
+    note times relative to offset_s. Used for quick previews.
+    """
+    from basic_pitch.constants import ANNOT_N_FRAMES
+    from basic_pitch.note_creation import model_frames_to_time
+
+    n_frames = len(activations['note'])
+    first = int(max(start_s, 0) * ACTIVATION_FRAME_RATE) // ANNOT_N_FRAMES * ANNOT_N_FRAMES
+    first = min(first, max(n_frames - 1, 0) // ANNOT_N_FRAMES * ANNOT_N_FRAMES)
+    last = min(n_frames, int(np.ceil((start_s + seconds) * ACTIVATION_FRAME_RATE)) + 1)
+    excerpt = {k: np.asarray(v[first:max(last, first + 1)]) for k, v in activations.items()}
+    offset = float(model_frames_to_time(first + 1)[-1]) if first else 0.0
+    return excerpt, offset
+
+
+def transcribe(y, sr, model=None,
+               onset_threshold=ONSET_THRESHOLD,
+               frame_threshold=FRAME_THRESHOLD,
+               minimum_note_length=MINIMUM_NOTE_LENGTH,
+               timings=None, cancel_event=None):
+    """
+    Transcribe a decoded audio buffer.
+
+    Returns (model_output, midi_data, note_events) like
+    basic_pitch.inference.predict, where note_events is a list of
+    (start_s, end_s, pitch_midi, amplitude, pitch_bends) tuples.
+    If a dict is passed as `timings`, stage durations are stored in it.
+    Setting `cancel_event` (a threading.Event) stops inference early with
+    ConversionCancelled.
+    """
+    if model is None:
+        start = time.perf_counter()
+        model = load_model()
+        if timings is not None:
+            timings['model_load'] = time.perf_counter() - start
+
+    y = resample(y, sr, MODEL_SAMPLE_RATE, timings)
+
+    start = time.perf_counter()
+    model_output = run_model(y, MODEL_SAMPLE_RATE, model, cancel_event)
+    if timings is not None:
+        timings['inference'] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    midi_data, note_events = decode_notes(model_output, onset_threshold, frame_threshold,
+                                          minimum_note_length)
+    if timings is not None:
+        timings['note_decoding'] = time.perf_counter() - start
+
+    return model_output, midi_data, note_events
+
+
+def transcribe_many(buffers, model=None, timings=None, cancel_event=None,
+                    batch_windows=BATCH_WINDOWS, **params):
+    """
+    Transcribe several decoded buffers, e.g. queued short clips, together.
+
+    The model windows of all buffers are packed into shared batches of
+    `batch_windows`, so short files do not each run the model with a batch
+    of one or two windows; the outputs are split back per buffer before
+    note decoding. buffers: iterable of (y, sr). Returns a list with the
+    transcribe() result of each buffer, in order; `timings` receives the
+    totals over all buffers.
+    """
+    from basic_pitch.inference import unwrap_output
+
+    if model is None:
+        model = load_model()
+
+    buffers = [resample(y, sr, MODEL_SAMPLE_RATE, timings) for y, sr in buffers]
+    if not buffers:
+        return []
+    start = time.perf_counter()
+    windows = [window_buffer(y) for y in buffers]
+    output = predict_windows(model, np.concatenate(windows), batch_windows, cancel_event)
+    bounds = np.cumsum([len(w) for w in windows])[:-1]
+    outputs = [
+        {k: unwrap_output(part, len(y), N_OVERLAPPING_FRAMES) for k, part in zip(output, parts)}
+        for y, parts in zip(buffers, zip(*(np.split(v, bounds) for v in output.values())))
+    ]
+    if timings is not None:
+        timings['inference'] = timings.get('inference', 0.0) + time.perf_counter() - start
+
+    start = time.perf_counter()
+    results = [(model_output, *decode_notes(model_output, **params)) for model_output in outputs]
+    if timings is not None:
+        timings['note_decoding'] = timings.get('note_decoding', 0.0) + time.perf_counter() - start
+    return results
+
+
+class ModelSession(TranscriptionBackend):
+    """
+    A transcription model kept warm for the lifetime of an app or worker.
+
+    The model is loaded lazily on first use and reused by every conversion
+    until release() is called. The first transcription (which also builds
+    the TensorFlow graph) and the warm ones are timed separately.
+    This is the "basic-pitch" backend of backends.py.
+
+    runtime, intra_op_threads and inter_op_threads are passed to load_model.
+    """
+
+    name = "basic-pitch"
+    sample_rate = MODEL_SAMPLE_RATE
+    has_activations = True
+
+    def __init__(self, model_path=None, runtime=None, intra_op_threads=None, inter_op_threads=None):
+        self.model_path = model_path
+        self.runtime = runtime
+        self.intra_op_threads = intra_op_threads
+        self.inter_op_threads = inter_op_threads
+        self.model_load_time = None
+        self.first_run_time = None
+        self.warm_run_times = []
+        self._model = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._model is not None
+
+    @property
+    def version(self):
+        return model_version(self.model_path, self.runtime)
+
+    def get_model(self, timings=None):
+        """Return the resident model, loading it on first use"""
+        with self._lock:
+            if self._model is None:
+                start = time.perf_counter()
+                self._model = load_model(self.model_path, self.runtime,
+                                         self.intra_op_threads, self.inter_op_threads)
+                self.model_load_time = time.perf_counter() - start
+                if timings is not None:
+                    timings['model_load'] = self.model_load_time
+            return self._model
+
+    def transcribe(self, y, sr, timings=None, **params):
+        """Same as transcription.transcribe, using the resident model"""
+        model = self.get_model(timings)
+        start = time.perf_counter()
+        result = transcribe(y, sr, model=model, timings=timings, **params)
+        elapsed = time.perf_counter() - start
+        if self.first_run_time is None:
+            self.first_run_time = elapsed
+        else:
+            self.warm_run_times.append(elapsed)
+        return result
+
+    def transcribe_many(self, buffers, timings=None, **params):
+        """Same as transcription.transcribe_many, using the resident model"""
+        model = self.get_model(timings)
+        return transcribe_many(buffers, model=model, timings=timings, **params)
+
+    def decode(self, activations, timings=None, **params):
+        """Note events decoded from saved activations, see TranscriptionBackend"""
+        start = time.perf_counter()
+        _, note_events = decode_notes(activations, **params)
+        if timings is not None:
+            timings['note_decoding'] = time.perf_counter() - start
+        return note_events
+
+    def notes(self, y, sr, timings=None, **params):
+        """Note events only, see TranscriptionBackend"""
+        return self.transcribe(y, sr, timings=timings, **params)[2]
+
+    def transcribe_stream(self, audio_path, timings=None, **params):
+        """Same as transcription.transcribe_stream, using the resident model"""
+        model = self.get_model(timings)
+        return transcribe_stream(audio_path, model=model, timings=timings, **params)
+
+    def latency_report(self):
+        """Model load, first-run and mean warm-run latency, in seconds"""
+        warm = self.warm_run_times
+        return {
+            'model_load': self.model_load_time,
+            'first_run': self.first_run_time,
+            'warm_runs': len(warm),
+            'warm_run_mean': sum(warm) / len(warm) if warm else None,
+        }
+
+    def release(self):
+        """Drop the resident model; the next conversion loads it again"""
+        with self._lock:
+            self._model = None
+            self.first_run_time = None
+            self.warm_run_times = []
+
+
+_default_session = None
+
+
+def get_session():
+    """The per-process ModelSession (one warm model per process or worker)"""
+    global _default_session
+    if _default_session is None:
+        _default_session = ModelSession()
+    return _default_session
+
+
+def configure_session(runtime=None, intra_op_threads=None, inter_op_threads=None):
+    """
+    Set the runtime and threads of the per-process ModelSession. Call it
+    before the first transcription: a model already loaded is released and
+    loaded again on next use, but TensorFlow keeps its first thread setup.
+    """
+    session = get_session()
+    if (session.runtime, session.intra_op_threads, session.inter_op_threads) != \
+            (runtime, intra_op_threads, inter_op_threads):
+        session.release()
+        session.runtime = runtime
+        session.intra_op_threads = intra_op_threads
+        session.inter_op_threads = inter_op_threads
+    return session
+
+
+def transcribe_stream(audio_path, model=None, sr=MODEL_SAMPLE_RATE,
+                      chunk_seconds=STREAM_CHUNK_SECONDS, overlap_seconds=STREAM_OVERLAP_SECONDS,
+                      timings=None, cancel_event=None, transcribe_chunk=None, **params):
+    """
+    Transcribe a long recording chunk by chunk with bounded memory.
+
+    Each chunk owns the notes whose onset falls before the middle of its
+    overlap with the next chunk; the next chunk owns the rest. A note cut
+    off at the end of a chunk is extended with its continuation (same pitch,
+    overlapping in time) from the next chunk, and notes detected on both
+    sides of a boundary are merged, so no note is reported twice.
+    Returns the note events, sorted by onset, in the transcribe() format.
+
+    transcribe_chunk: callable with the transcribe() signature (without
+        `model`) used on every chunk instead of the basic-pitch model, e.g.
+        monophonic.MonophonicSession.transcribe
+    sr: rate the chunks are decoded at, the backend's sample_rate
+    """
+    if transcribe_chunk is None:
+        if model is None:
+            model = load_model()
+
+        def transcribe_chunk(y, sr, **kwargs):
+            return transcribe(y, sr, model=model, **kwargs)
+
+    note_events = []
+    pending = []     # onsets in the second half of the last overlap: owned by the next chunk
+    open_notes = []  # kept notes reaching the end of the last chunk
+    half_overlap = overlap_seconds / 2
+
+    for chunk_start, y in stream_audio(audio_path, sr, chunk_seconds, overlap_seconds, timings):
+        chunk_timings = {}
+        _, _, events = transcribe_chunk(y, sr, timings=chunk_timings,
+                                        cancel_event=cancel_event, **params)
+        if timings is not None:
+            for stage, seconds in chunk_timings.items():
+                timings[stage] = timings.get(stage, 0.0) + seconds
+
+        chunk_end = chunk_start + len(y) / sr
+        owned_start = chunk_start + half_overlap if chunk_start > 0 else 0.0
+        owned_end = chunk_end - half_overlap
+        events = sorted((float(start) + chunk_start, float(end) + chunk_start, int(pitch),
+                         float(amplitude), bends)
+                        for start, end, pitch, amplitude, bends in events)
+
+        # Continuations of notes cut off at the end of the previous chunk
+        continued = set()
+        for start, end, pitch, amplitude, bends in open_notes:
+            for j, event in enumerate(events):
+                if j not in continued and event[2] == pitch and event[0] <= end and event[1] > end:
+                    end = event[1]
+                    continued.add(j)
+            note_events.append((start, end, pitch, amplitude, bends))
+        open_notes = []
+        pending = []
+
+        for j, event in enumerate(events):
+            start, end = event[0], event[1]
+            if j in continued or start < owned_start - STREAM_BOUNDARY_SLACK:
+                continue
+            if start >= owned_end:
+                pending.append(event)
+            elif end >= chunk_end - STREAM_EDGE_TOLERANCE:
+                open_notes.append(event)
+            else:
+                note_events.append(event)
+
+    # End of the recording: nothing left to continue or hand over
+    note_events.extend(open_notes)
+    note_events.extend(pending)
+    return merge_overlapping_notes(note_events)
+
+
+def merge_overlapping_notes(note_events):
+    """
+    Merge notes of the same pitch that overlap in time (which happens when
+    a note is re-detected on both sides of a chunk boundary).
+    """
+    merged = []
+    last_by_pitch = {}
+    for event in sorted(note_events, key=lambda e: (e[2], e[0])):
+        start, end, pitch = event[0], event[1], event[2]
+        last = last_by_pitch.get(pitch)
+        if last is not None and start < merged[last][1]:
+            if end > merged[last][1]:
+                merged[last] = (merged[last][0], end) + tuple(merged[last][2:])
+            continue
+        last_by_pitch[pitch] = len(merged)
+        merged.append(tuple(event))
+    return sorted(merged)
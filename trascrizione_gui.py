@@ -1,27 +1,138 @@
+import logging
 import os
+import queue
+import threading
 import tkinter as tk
 from tkinter import filedialog, messagebox, ttk
-from music21 import converter, instrument, metadata
-import librosa
-import soundfile as sf
-import tempfile
-import shutil
-import glob
-
-# Funzione per trascrivere file audio in MIDI
-from basic_pitch.inference import predict_and_save
-
-SUPPORTED_INSTRUMENTS = {
-    "Pianoforte": instrument.Piano(),
-    "Violino": instrument.Violin(),
-    "Violoncello": instrument.Violoncello()
-}
+
+# Trascrizione audio -> note -> spartito direttamente in memoria
+from transcription import ACTIVATION_FRAME_RATE, ConversionCancelled, audio_duration
+from backends import DEFAULT_BACKEND, available_backends, get_backend
+from pipeline import (
+    DEFAULT_TRANSCRIPTION_PARAMS, STREAMING_MIN_SECONDS, SUPPORTED_INSTRUMENTS, audio_to_score,
+    prepare_transcription,
+)
+from piano_roll import PREVIEW_SECONDS, PianoRoll, preview_notes
+from cache import TranscriptionCache
+from exporters import DEFAULT_FORMATS, EXPORT_FORMATS, available_formats
+from instrument_recognition import AUTO_INSTRUMENT
+
+# How often the Tk loop checks the worker's progress queue
+POLL_INTERVAL_MS = 100
+
+# Slider moves within this delay are drawn once, in a single preview
+PREVIEW_DELAY_MS = 30
+
+FORMAT_LABELS = {'midi': "MIDI", 'musicxml': "MusicXML", 'mxl': "MXL", 'pdf': "PDF", 'png': "PNG"}
+
+
+class ThresholdTuner(tk.Toplevel):
+    """
+    Window with the transcription sliders and a piano-roll preview.
+
+    Every slider move decodes the previewed excerpt again from the model
+    activations (piano_roll.preview_notes); nothing is exported until the
+    user confirms, then on_confirm(params) is called. on_cancel() is
+    called when the window is closed without confirming.
+    """
+
+    def __init__(self, master, session, activations, on_confirm, on_cancel):
+        super().__init__(master)
+        self.title("Sensibilità della trascrizione")
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+        self.session = session
+        self.activations = activations
+        self.on_confirm = on_confirm
+        self.on_cancel = on_cancel
+        self._pending = None
+
+        self.roll = PianoRoll(self)
+        self.roll.pack(padx=10, pady=10)
+
+        self.info = ttk.Label(self, text="")
+        self.info.pack()
+
+        params = DEFAULT_TRANSCRIPTION_PARAMS
+        seconds = len(activations['note']) / ACTIVATION_FRAME_RATE
+        self.onset_var = self._slider("Soglia attacchi", 0.05, 0.95, 0.01, params['onset_threshold'])
+        self.frame_var = self._slider("Soglia note", 0.05, 0.95, 0.01, params['frame_threshold'])
+        self.length_var = self._slider("Durata minima nota (ms)", 20, 500, 1, params['minimum_note_length'])
+        self.start_var = self._slider("Inizio anteprima (s)", 0, max(seconds - PREVIEW_SECONDS, 0), 0.5, 0)
+
+        buttons = ttk.Frame(self)
+        buttons.pack(pady=10)
+        ttk.Button(buttons, text="Esporta spartito", command=self.confirm).pack(side='left', padx=5)
+        ttk.Button(buttons, text="Annulla", command=self.cancel).pack(side='left', padx=5)
+
+        self.refresh()
+
+    def _slider(self, label, low, high, resolution, value):
+        var = tk.DoubleVar(value=value)
+        tk.Scale(self, label=label, from_=low, to=high, resolution=resolution, variable=var,
+                 orient='horizontal', length=540, command=self.schedule).pack(padx=10)
+        return var
+
+    @property
+    def params(self):
+        return {
+            'onset_threshold': self.onset_var.get(),
+            'frame_threshold': self.frame_var.get(),
+            'minimum_note_length': self.length_var.get(),
+        }
+
+    def schedule(self, value=None):
+        """Slider callback: redraw once the current burst of moves is over"""
+        if self._pending is None:
+            self._pending = self.after(PREVIEW_DELAY_MS, self.refresh)
+
+    def refresh(self):
+        self._pending = None
+        timings = {}
+        start = self.start_var.get()
+        note_events = preview_notes(self.session, self.activations, start, self.params,
+                                    timings=timings)
+        self.roll.draw(note_events, start)
+        self.info.config(text=f"{len(note_events)} note in {PREVIEW_SECONDS:.0f} s "
+                              f"(anteprima in {timings['preview'] * 1000:.0f} ms)")
+
+    def _close(self):
+        if self._pending is not None:
+            self.after_cancel(self._pending)
+        self.destroy()
+
+    def confirm(self):
+        params = self.params
+        self._close()
+        self.on_confirm(params)
+
+    def cancel(self):
+        self._close()
+        self.on_cancel()
+
 
 class Audio2ScoreApp:
     def __init__(self, master):
         self.master = master
         master.title("Audio2Score")
-        master.geometry("500x400")
+        master.geometry("500x490")
+        master.protocol("WM_DELETE_WINDOW", self.close)
+
+        # Motori di trascrizione usati: ognuno è caricato al primo uso e
+        # riutilizzato dalle conversioni successive
+        self.backends = {}
+        # Note già trascritte: riconvertire lo stesso file non rilancia il modello
+        self.cache = TranscriptionCache()
+        # Attivazioni del modello per (file, data di modifica, motore) in questa
+        # sessione: le soglie si regolano senza rieseguire il modello
+        self.prepared = {}
+
+        # The conversion runs on a worker thread; it only talks to Tk
+        # through this queue, which the main loop polls with after()
+        self.progress = queue.Queue()
+        self.worker = None
+        self.cancel_event = None
+        # Open tuning window: the job is still running while the user tunes
+        self.tuner = None
 
         self.frame = ttk.Frame(master)
         self.frame.pack(padx=10, pady=10, fill='both', expand=True)
@@ -35,135 +146,217 @@ class Audio2ScoreApp:
 
         self.instrument_label = ttk.Label(self.frame, text="Strumento:")
         self.instrument_label.pack()
-        self.instrument_choice = ttk.Combobox(self.frame, values=list(SUPPORTED_INSTRUMENTS.keys()))
+        # "Automatico" riconosce lo strumento dall'audio
+        self.instrument_choice = ttk.Combobox(self.frame, values=[AUTO_INSTRUMENT] + list(SUPPORTED_INSTRUMENTS.keys()))
         self.instrument_choice.set("Pianoforte")
         self.instrument_choice.pack(pady=5)
 
+        self.backend_label = ttk.Label(self.frame, text="Motore di trascrizione:")
+        self.backend_label.pack()
+        self.backend_choice = ttk.Combobox(self.frame, values=list(available_backends()), state='readonly')
+        self.backend_choice.set(DEFAULT_BACKEND)
+        self.backend_choice.pack(pady=5)
+
+        # Formati da esportare; quelli senza renderer (MuseScore, LilyPond)
+        # vengono rilevati una volta sola, all'avvio, e disattivati
+        usable = available_formats(tuple(EXPORT_FORMATS))
+        self.format_frame = ttk.Frame(self.frame)
+        self.format_frame.pack(pady=5)
+        self.format_vars = {}
+        for fmt in EXPORT_FORMATS:
+            var = tk.BooleanVar(value=fmt in usable and fmt in DEFAULT_FORMATS)
+            ttk.Checkbutton(self.format_frame, text=FORMAT_LABELS[fmt], variable=var,
+                            state='normal' if fmt in usable else 'disabled').pack(side='left', padx=5)
+            self.format_vars[fmt] = var
+
         self.btn_convert = ttk.Button(self.frame, text="Converti in Spartito", command=self.process_audio)
-        self.btn_convert.pack(pady=20)
+        self.btn_convert.pack(pady=(20, 5))
+
+        self.btn_cancel = ttk.Button(self.frame, text="Annulla", command=self.cancel_conversion, state='disabled')
+        self.btn_cancel.pack()
 
         self.status = ttk.Label(self.frame, text="Stato: pronto", relief="sunken", anchor='w')
         self.status.pack(fill='x', side='bottom')
 
+    def close(self):
+        """Stop any running job, release the transcription model and close the window"""
+        if self.cancel_event is not None:
+            self.cancel_event.set()
+        for backend in self.backends.values():
+            backend.release()
+        self.master.destroy()
+
+    @property
+    def busy(self):
+        return self.tuner is not None or (self.worker is not None and self.worker.is_alive())
+
     def browse_file(self, event=None):
+        if self.busy:
+            return
         file_path = filedialog.askopenfilename(filetypes=[("Audio Files", "*.mp3 *.wav")])
         if file_path:
             self.convert_file(file_path)
 
     def convert_file(self, file_path):
-        """Process the selected audio file and convert it to a musical score"""
-        if not file_path:
+        """Start converting the selected audio file on a background worker"""
+        if not file_path or self.busy:
+            return
+        # Read Tk state here, on the main thread; the worker never touches Tk
+        instrument_name = self.instrument_choice.get()
+        backend_name = self.backend_choice.get()
+        formats = tuple(fmt for fmt, var in self.format_vars.items() if var.get())
+        if not formats:
+            messagebox.showwarning("Formati", "Seleziona almeno un formato da esportare")
             return
+        job = {'file_path': file_path, 'instrument_name': instrument_name,
+               'backend_name': backend_name, 'formats': formats}
+        self.btn_convert.config(state='disabled')
+        self._start_worker(self._run_analysis, job, "Analisi in corso...")
+
+    def _start_worker(self, target, job, status):
+        self.cancel_event = threading.Event()
+        self.worker = threading.Thread(target=target, args=(job, self.cancel_event), daemon=True)
+        self.status.config(text=status)
+        self.btn_cancel.config(state='normal')
+        self.worker.start()
+        self.master.after(POLL_INTERVAL_MS, self.poll_progress)
+
+    def cancel_conversion(self):
+        if self.busy:
+            self.cancel_event.set()
+            self.status.config(text="Annullamento in corso...")
+            self.btn_cancel.config(state='disabled')
+
+    def _run_analysis(self, job, cancel_event):
+        """
+        Worker thread: run the model once per file and session, then hand
+        the activations to the tuning window. Backends without activations
+        and recordings long enough to be streamed are converted directly.
+        """
         try:
-            self.status.config(text="Analisi in corso...")
-            self.master.update()
-            midi_path, musicxml_path, pdf_path, png_path = self.audio_to_score(file_path)
+            file_path, backend_name = job['file_path'], job['backend_name']
+            session = self.backends.setdefault(backend_name, get_backend(backend_name))
+            if not session.has_activations:
+                # Nothing to tune: transcribe once, in the conversion
+                return self._run_conversion(job, cancel_event)
+            key = (file_path, os.path.getmtime(file_path), backend_name)
+            if key not in self.prepared:
+                duration = audio_duration(file_path)
+                if duration is not None and duration > STREAMING_MIN_SECONDS:
+                    return self._run_conversion(job, cancel_event)
+                # Only the latest file keeps its decoded audio (for beat tracking)
+                for other, (_, _, activations) in list(self.prepared.items()):
+                    self.prepared[other] = (None, None, activations)
+                self.prepared[key] = prepare_transcription(
+                    file_path, session=session, cache=self.cache,
+                    progress=lambda message: self.progress.put(('status', message)),
+                    cancel_event=cancel_event,
+                )
+            job['prepared'] = self.prepared[key]
+            if job['prepared'][2] is None:
+                return self._run_conversion(job, cancel_event)
+            self.progress.put(('tune', job))
+        except ConversionCancelled:
+            self.progress.put(('cancelled', None))
+        except Exception as e:
+            self.progress.put(('error', str(e)))
+
+    def _run_conversion(self, job, cancel_event):
+        """Worker thread: run the pipeline, report only through the queue"""
+        analysis = {}
+        try:
+            session = self.backends.setdefault(job['backend_name'], get_backend(job['backend_name']))
+            prepared = None
+            if job.get('prepared') is not None and job['prepared'][2] is not None:
+                # Tuned: decode the whole recording with the chosen parameters
+                y, sr, activations = job['prepared']
+                self.progress.put(('status', "Trascrizione audio in MIDI..."))
+                prepared = (y, sr, activations, session.decode(activations, **job['params']))
+            outputs = audio_to_score(
+                job['file_path'],
+                job['instrument_name'],
+                session=session,
+                cache=self.cache,
+                progress=lambda message: self.progress.put(('status', message)),
+                cancel_event=cancel_event,
+                formats=job['formats'],
+                analysis=analysis,
+                transcription_params=job.get('params'),
+                prepared=prepared,
+            )
+            self.progress.put(('done', (outputs, analysis)))
+        except ConversionCancelled:
+            self.progress.put(('cancelled', None))
+        except Exception as e:
+            self.progress.put(('error', str(e)))
+
+    def _open_tuner(self, job):
+        """Main thread: let the user tune the thresholds, export on confirm"""
+        self.status.config(text="Regola la sensibilità e conferma per esportare")
+        self.btn_cancel.config(state='disabled')
+        session = self.backends[job['backend_name']]
 
+        def confirm(params):
+            self.tuner = None
+            job['params'] = params
+            self._start_worker(self._run_conversion, job, "Generazione spartito...")
+
+        def cancel():
+            self.tuner = None
+            self._finish_conversion('cancelled', None)
+
+        self.drop_area.config(state='disabled')
+        self.tuner = ThresholdTuner(self.master, session, job['prepared'][2], confirm, cancel)
+
+    def poll_progress(self):
+        """Main thread: apply the worker's messages to the widgets"""
+        finished = False
+        try:
+            while True:
+                kind, payload = self.progress.get_nowait()
+                if kind == 'status':
+                    self.status.config(text=payload)
+                elif kind == 'tune':
+                    finished = True
+                    self._open_tuner(payload)
+                else:
+                    finished = True
+                    self._finish_conversion(kind, payload)
+        except queue.Empty:
+            pass
+
+        if not finished:
+            self.master.after(POLL_INTERVAL_MS, self.poll_progress)
+
+    def _finish_conversion(self, kind, payload):
+        self.drop_area.config(state='normal')
+        self.btn_convert.config(state='normal')
+        self.btn_cancel.config(state='disabled')
+
+        if kind == 'done':
+            outputs, analysis = payload
             result_msg = f"Spartito generato con successo!\n\n"
-            result_msg += f"MIDI: {midi_path}\n"
-            result_msg += f"MusicXML: {musicxml_path}\n"
-            if pdf_path:
-                result_msg += f"PDF: {pdf_path}\n"
-            if png_path:
-                result_msg += f"PNG: {png_path}\n"
+            if 'instrument_confidence' in analysis:
+                result_msg += (f"Strumento riconosciuto: {analysis['instrument']} "
+                               f"(affidabilità {analysis['instrument_confidence']:.0%})\n\n")
+            for fmt, path in outputs.items():
+                result_msg += f"{FORMAT_LABELS[fmt]}: {path or 'non generato'}\n"
 
             messagebox.showinfo("Fatto!", result_msg)
             self.status.config(text="Fatto! Spartito generato")
-        except Exception as e:
-            messagebox.showerror("Errore", f"Si è verificato un errore:\n{str(e)}")
-            self.status.config(text=f"Errore: {str(e)}")
+        elif kind == 'cancelled':
+            self.status.config(text="Conversione annullata")
+        else:
+            messagebox.showerror("Errore", f"Si è verificato un errore:\n{payload}")
+            self.status.config(text=f"Errore: {payload}")
 
     def process_audio(self):
         file_path = filedialog.askopenfilename(title="Seleziona file audio", filetypes=[("Audio Files", "*.mp3 *.wav")])
         if file_path:
             self.convert_file(file_path)
 
-    def audio_to_score(self, audio_path):
-        """Convert audio file to musical score in multiple formats"""
-        temp_dir = tempfile.mkdtemp()
-        try:
-            # Step 1: Load and convert audio to WAV format
-            self.status.config(text="Caricamento audio...")
-            self.master.update()
-            wav_path = os.path.join(temp_dir, "input.wav")
-            y, sr = librosa.load(audio_path, sr=16000)
-            sf.write(wav_path, y, sr)
-
-            # Step 2: Transcribe audio to MIDI using basic_pitch ML model
-            self.status.config(text="Trascrizione audio in MIDI...")
-            self.master.update()
-            predict_and_save(
-                [wav_path],
-                output_directory=temp_dir,
-                save_midi=True,
-                save_model_outputs=False,
-                sonify_midi=False
-            )
-
-            # Step 3: Find the generated MIDI file (basic_pitch uses pattern: input_basic_pitch.mid)
-            midi_files = glob.glob(os.path.join(temp_dir, "*_basic_pitch.mid"))
-            if not midi_files:
-                raise FileNotFoundError("MIDI file not generated by basic_pitch")
-            midi_path_temp = midi_files[0]
-
-            # Step 4: Parse MIDI and create musical score
-            self.status.config(text="Generazione spartito...")
-            self.master.update()
-            score = converter.parse(midi_path_temp)
-
-            # Step 5: Set the chosen instrument
-            chosen_instrument = SUPPORTED_INSTRUMENTS[self.instrument_choice.get()]
-            for part in score.parts:
-                part.insert(0, chosen_instrument)
-
-            # Step 6: Add metadata
-            if not score.metadata:
-                score.metadata = metadata.Metadata()
-            score.metadata.title = "Spartito generato da Audio2Score"
-
-            # Step 7: Save output files
-            output_base = os.path.abspath("spartito_output")
-            midi_path = output_base + ".mid"
-            musicxml_path = output_base + ".musicxml"
-
-            # Save MIDI file
-            score.write('midi', fp=midi_path)
-
-            # Save MusicXML file (standard format, always works)
-            score.write('musicxml', fp=musicxml_path)
-
-            # Try to save PDF (requires MuseScore)
-            pdf_path = None
-            try:
-                self.status.config(text="Generazione PDF...")
-                self.master.update()
-                pdf_path = output_base + ".pdf"
-                score.write('musicxml.pdf', fp=pdf_path)
-            except Exception as e:
-                print(f"Warning: Could not generate PDF: {e}")
-                print("MuseScore might not be installed or configured")
-
-            # Try to save PNG (requires LilyPond)
-            png_path = None
-            try:
-                self.status.config(text="Generazione PNG...")
-                self.master.update()
-                png_path = output_base + ".png"
-                score.write('lily.png', fp=png_path)
-            except Exception as e:
-                print(f"Warning: Could not generate PNG: {e}")
-                print("LilyPond might not be installed or configured")
-
-            return midi_path, musicxml_path, pdf_path, png_path
-
-        finally:
-            # Clean up temporary directory
-            try:
-                shutil.rmtree(temp_dir)
-            except Exception as e:
-                print(f"Warning: Could not clean up temp directory: {e}")
-
 if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     root = tk.Tk()
     app = Audio2ScoreApp(root)
     root.mainloop()